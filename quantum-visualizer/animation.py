@@ -0,0 +1,316 @@
+"""
+animation.py
+Gate-by-gate animations of a circuit's evolution for course material.
+The state after every gate is computed once with the sparse engine. Frames (one Bloch
+sphere per qubit above a state city) are rendered in worker processes: every worker
+builds its figure once (spheres, axes, labels) and for each frame only updates the
+Bloch vectors and the bar heights, so a 200 step animation renders in seconds.
+Output is a GIF, an MP4 (needs ffmpeg on PATH) or a zip of PNG frames.
+
+Usage:
+    python animation.py circuit.qasm --output circuit.gif
+    python animation.py circuit.qasm --output frames.zip --fps 2 --workers 8
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import to_rgba_array
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch
+from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+
+from sparse_sim import SparseStatevector
+from macros import format_macro, MACRO_GATES
+from kernels import bloch_vectors, to_big_endian
+
+
+
+
+FORMATS = ('gif', 'mp4', 'zip')
+# the state city gets one bar pair per basis state
+MAX_ANIMATION_QUBITS = 5
+DEFAULT_FPS = 4
+DEFAULT_DPI = 80
+MAX_ANIMATION_WORKERS = os.cpu_count() or 1
+
+_BAR_WIDTH = 0.35
+_BAR_DEPTH = 0.5
+_REAL_COLORS = ('red', 'darkred')
+_IMAG_COLORS = ('blue', 'darkblue')
+
+# the worker process' figure, built once by _init_worker
+_frame_figure = None
+
+
+
+
+
+def trajectory_frames(num_qubits, gate_sequence):
+    # one frame per step (the initial state, then the state after every gate):
+    # title, (n, 3) Bloch vectors and big-endian amplitudes
+    if not 1 <= num_qubits <= MAX_ANIMATION_QUBITS:
+        raise ValueError(f"Animations support 1 to {MAX_ANIMATION_QUBITS} qubits, got {num_qubits}")
+    # imported here so render workers (which import this module) do not load qiskit
+    from gates import DYNAMIC_GATES
+    dynamic = sorted({name for name, _ in gate_sequence if name in DYNAMIC_GATES})
+    if dynamic:
+        raise ValueError(f"Animations need a circuit without measurements or resets, got {', '.join(dynamic)}")
+
+    state = SparseStatevector(num_qubits)
+    frames = [_frame("Initial state |" + "0" * num_qubits + "⟩", state, num_qubits)]
+    for step, (gate_name, params) in enumerate(gate_sequence, start=1):
+        qubits = tuple(params) if isinstance(params, (tuple, list)) else (params,)
+        state.apply(gate_name, qubits)
+        if gate_name in MACRO_GATES:
+            operands = format_macro(gate_name, qubits)
+        else:
+            operands = ", ".join(f"q{q}" for q in qubits)
+        frames.append(_frame(f"Step {step}/{len(gate_sequence)}: {gate_name}({operands})", state, num_qubits))
+    return frames
+
+
+def _frame(title, state, num_qubits):
+    statevector = state.to_dense()
+    return title, bloch_vectors(statevector, num_qubits), to_big_endian(statevector, num_qubits)
+
+
+
+
+
+class FrameFigure:
+    # the figure of one worker; draw() only moves the artists created here
+    def __init__(self, num_qubits, dpi=DEFAULT_DPI):
+        self.num_qubits = num_qubits
+        self.dpi = dpi
+        self.fig = Figure(figsize=(max(3.2 * num_qubits, 8), 8))
+        FigureCanvasAgg(self.fig)
+        self.title = self.fig.suptitle("", fontsize=14, weight='bold')
+
+        self.vectors = []
+        for qubit in range(num_qubits):
+            ax = self.fig.add_subplot(2, num_qubits, qubit + 1, projection='3d')
+            self.vectors.append(_draw_bloch_sphere(ax, f"Qubit {qubit}"))
+
+        ax = self.fig.add_subplot(2, 1, 2, projection='3d')
+        self.real_bars, self.imag_bars = _draw_state_city_axes(ax, num_qubits)
+
+    def draw(self, title, bloch, amplitudes):
+        self.title.set_text(title)
+        for (line, tip, label), (x, y, z) in zip(self.vectors, bloch):
+            line.set_data_3d([0, x], [0, y], [0, z])
+            tip.set_data_3d([x], [y], [z])
+            label.set_text(f"|r|={np.sqrt(x ** 2 + y ** 2 + z ** 2):.3f}")
+
+        _set_bars(self.real_bars, amplitudes.real, _REAL_COLORS)
+        _set_bars(self.imag_bars, amplitudes.imag, _IMAG_COLORS)
+
+        buffer = io.BytesIO()
+        self.fig.savefig(buffer, format='png', dpi=self.dpi)
+        return buffer.getvalue()
+
+
+def _draw_bloch_sphere(ax, title):
+    # static sphere, great circles and axes (same look as plot_bloch_sphere_custom),
+    # returns the artists of the Bloch vector
+    u = np.linspace(0, 2 * np.pi, 40)
+    v = np.linspace(0, np.pi, 20)
+    ax.plot_surface(np.outer(np.cos(u), np.sin(v)), np.outer(np.sin(u), np.sin(v)),
+                    np.outer(np.ones(np.size(u)), np.cos(v)), color='cyan', alpha=0.1, edgecolor='none')
+
+    theta = np.linspace(0, 2 * np.pi, 100)
+    phi = np.linspace(0, np.pi, 100)
+    ax.plot(np.cos(theta), np.sin(theta), 0, 'gray', alpha=0.3, linewidth=1)
+    ax.plot(np.sin(phi), 0, np.cos(phi), 'gray', alpha=0.3, linewidth=1)
+    ax.plot(0, np.sin(phi), np.cos(phi), 'gray', alpha=0.3, linewidth=1)
+
+    for direction, color, name in (((1.3, 0, 0), 'red', 'X'), ((0, 1.3, 0), 'green', 'Y'),
+                                   ((0, 0, 1.3), 'blue', 'Z')):
+        ax.quiver(0, 0, 0, *direction, color=color, arrow_length_ratio=0.1, linewidth=1.5)
+        ax.text(*(1.1 * np.array(direction)), name, fontsize=10, color=color, weight='bold')
+    ax.text(0, 0, 1.5, '|0⟩', fontsize=9, ha='center')
+    ax.text(0, 0, -1.6, '|1⟩', fontsize=9, ha='center')
+
+    line, = ax.plot([0, 0], [0, 0], [0, 1], color='purple', linewidth=3)
+    tip, = ax.plot([0], [0], [1], 'o', color='purple', markersize=7)
+    label = ax.text2D(0.5, 0.02, "", transform=ax.transAxes, ha='center', fontsize=9, color='purple')
+
+    ax.set_xlim([-1.5, 1.5])
+    ax.set_ylim([-1.5, 1.5])
+    ax.set_zlim([-1.5, 1.5])
+    ax.set_box_aspect([1, 1, 1])
+    ax.set_axis_off()
+    ax.set_title(title, fontsize=11)
+    ax.view_init(elev=20, azim=45)
+    return line, tip, label
+
+
+def _draw_state_city_axes(ax, num_qubits):
+    # axes of plot_state_city_big_endian plus one (initially flat) collection per component
+    dim = 2 ** num_qubits
+    x_pos = np.arange(dim)
+    real_bars = Poly3DCollection(_box_faces(x_pos, 0, np.zeros(dim)))
+    imag_bars = Poly3DCollection(_box_faces(x_pos, 1, np.zeros(dim)))
+    ax.add_collection3d(real_bars)
+    ax.add_collection3d(imag_bars)
+
+    ax.set_xlim([-0.5, dim - 0.5])
+    ax.set_ylim([0, 1.5])
+    ax.set_zlim([-1, 1])
+    ax.set_xticks(x_pos)
+    ax.set_xticklabels([format(i, f'0{num_qubits}b') for i in range(dim)], rotation=45, ha='right', fontsize=8)
+    ax.set_yticks([0.25, 1.25])
+    ax.set_yticklabels(['Real', 'Imag'], fontsize=9)
+    ax.set_xlabel('Basis State (Big-Endian)', fontsize=10, labelpad=8)
+    ax.set_zlabel('Amplitude', fontsize=10)
+    ax.view_init(elev=25, azim=45)
+    ax.legend(handles=[
+        Patch(facecolor='red', alpha=0.8, label='Real (positive)'),
+        Patch(facecolor='darkred', alpha=0.8, label='Real (negative)'),
+        Patch(facecolor='blue', alpha=0.8, label='Imaginary (positive)'),
+        Patch(facecolor='darkblue', alpha=0.8, label='Imaginary (negative)')
+    ], loc='upper right', fontsize=8)
+    return (real_bars, 0), (imag_bars, 1)
+
+
+def _box_faces(x_centers, y_start, heights):
+    # (bars * 6, 4, 3) quads of one box per bar, from z = 0 up (or down) to its height
+    x0 = np.asarray(x_centers, dtype=float) - _BAR_WIDTH / 2
+    x1 = x0 + _BAR_WIDTH
+    y0 = np.full_like(x0, y_start)
+    y1 = y0 + _BAR_DEPTH
+    z0 = np.zeros_like(x0)
+    z1 = np.asarray(heights, dtype=float)
+
+    corners = np.stack([
+        np.stack([x0, y0, z0], -1), np.stack([x1, y0, z0], -1),
+        np.stack([x1, y1, z0], -1), np.stack([x0, y1, z0], -1),
+        np.stack([x0, y0, z1], -1), np.stack([x1, y0, z1], -1),
+        np.stack([x1, y1, z1], -1), np.stack([x0, y1, z1], -1)
+    ], axis=1)
+    faces = np.array([[0, 1, 2, 3], [4, 5, 6, 7], [0, 1, 5, 4],
+                      [2, 3, 7, 6], [1, 2, 6, 5], [0, 3, 7, 4]])
+    return corners[:, faces].reshape(-1, 4, 3)
+
+
+def _set_bars(bars, heights, colors):
+    # new box heights and colors; zero bars stay in the collection, fully transparent
+    collection, y_start = bars
+    collection.set_verts(_box_faces(np.arange(len(heights)), y_start, heights))
+    rgba = to_rgba_array(colors)[(heights < 0).astype(int)]
+    rgba[:, 3] = np.where(np.abs(heights) > 1e-10, 0.8, 0.0)
+    collection.set_facecolor(np.repeat(rgba, 6, axis=0))
+
+
+
+
+
+def _init_worker(num_qubits, dpi):
+    global _frame_figure
+    _frame_figure = FrameFigure(num_qubits, dpi)
+
+
+def _render_frame(frame):
+    return _frame_figure.draw(*frame)
+
+
+def render_frames(num_qubits, frames, dpi=DEFAULT_DPI, workers=MAX_ANIMATION_WORKERS):
+    # PNG bytes of every frame, in order. workers are spawned (not forked) so they do not
+    # inherit the app's threads, and each one gets a contiguous run of frames
+    workers = max(1, min(workers, len(frames)))
+    if workers == 1:
+        _init_worker(num_qubits, dpi)
+        return [_render_frame(frame) for frame in frames]
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(num_qubits, dpi)) as executor:
+        return list(executor.map(_render_frame, frames, chunksize=-(-len(frames) // (4 * workers))))
+
+
+
+
+
+def encode_animation(frames, fmt='gif', fps=DEFAULT_FPS):
+    # PNG frames -> GIF / MP4 / zip of numbered PNGs, as bytes
+    if fmt == 'zip':
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:  # PNGs are compressed already
+            for index, png in enumerate(frames):
+                archive.writestr(f"frame_{index:04d}.png", png)
+        return buffer.getvalue()
+
+    if fmt == 'gif':
+        from PIL import Image  # pillow ships with matplotlib
+        images = [Image.open(io.BytesIO(png)).convert('RGB') for png in frames]
+        buffer = io.BytesIO()
+        images[0].save(buffer, format='GIF', save_all=True, append_images=images[1:],
+                       duration=int(1000 / fps), loop=0)
+        return buffer.getvalue()
+
+    if fmt == 'mp4':
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise RuntimeError("MP4 export needs ffmpeg on PATH (GIF and zip work without it)")
+        # even frame sizes for yuv420p, PNGs piped in, MP4 written to a pipe (fragmented)
+        process = subprocess.run(
+            [ffmpeg, '-loglevel', 'error', '-f', 'image2pipe', '-framerate', str(fps), '-c:v', 'png',
+             '-i', '-', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', '-c:v', 'libx264',
+             '-movflags', 'frag_keyframe+empty_moov', '-f', 'mp4', '-'],
+            input=b''.join(frames), capture_output=True)
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {process.stderr.decode(errors='replace').strip()}")
+        return process.stdout
+
+    raise ValueError(f"Unknown animation format '{fmt}' (expected one of {', '.join(FORMATS)})")
+
+
+def export_animation(num_qubits, gate_sequence, fmt='gif', fps=DEFAULT_FPS, dpi=DEFAULT_DPI,
+                     workers=MAX_ANIMATION_WORKERS):
+    # the whole pipeline: states, frames in worker processes, encoded file as bytes
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown animation format '{fmt}' (expected one of {', '.join(FORMATS)})")
+    frames = trajectory_frames(num_qubits, gate_sequence)
+    return encode_animation(render_frames(num_qubits, frames, dpi=dpi, workers=workers), fmt=fmt, fps=fps)
+
+
+
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Render a gate-by-gate animation of an OpenQASM circuit.")
+    parser.add_argument('qasm', help="OpenQASM 2/3 file")
+    parser.add_argument('--output', required=True, help="output file (.gif, .mp4 or .zip of PNG frames)")
+    parser.add_argument('--fps', type=float, default=DEFAULT_FPS)
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI)
+    parser.add_argument('--workers', type=int, default=MAX_ANIMATION_WORKERS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from qasm import parse_qasm
+
+    args = parse_args(argv)
+    fmt = os.path.splitext(args.output)[1].lstrip('.').lower()
+    with open(args.qasm) as f:
+        num_qubits, gate_sequence = parse_qasm(f)
+
+    data = export_animation(num_qubits, gate_sequence, fmt=fmt, fps=args.fps, dpi=args.dpi,
+                            workers=args.workers)
+    with open(args.output, 'wb') as f:
+        f.write(data)
+    print(f"{len(gate_sequence) + 1} frames written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,30 +6,73 @@ All outputs use BIG-ENDIAN convention (q0 is leftmost bit).
 Includes Bloch sphere visualization for 1-2 qubits and state city for 3 qubits.
 """
 
+import importlib
+import sys
+import threading
+
 import streamlit as st
-import matplotlib.pyplot as plt
+
+# qiskit's compiled extension segfaults building circuits once the thread that first
+# imported it has exited while other threads (simulation and render pools) keep using it.
+# streamlit runs every rerun on a new, short lived script thread, so on the first run
+# qiskit is imported on a daemon thread that stays parked for the life of the process,
+# before any module below imports it (an import error resurfaces on the next import)
+if 'qiskit' not in sys.modules:
+    _qiskit_imported = threading.Event()
+
+    def _import_qiskit():
+        try:
+            importlib.import_module('qiskit')
+        finally:
+            _qiskit_imported.set()
+        threading.Event().wait()
+
+    threading.Thread(target=_import_qiskit, name='qiskit-import', daemon=True).start()
+    _qiskit_imported.wait()
+
 import plotly.graph_objects as go
-from qiskit.visualization import (
-    plot_histogram, 
-    circuit_drawer
-)
+from qiskit.visualization import circuit_drawer
 from qiskit.quantum_info import DensityMatrix #nxt updt
 import numpy as np
+import time
+
+try:
+    import resource
+except ImportError:  # windows: CPU time only, no peak RSS
+    resource = None
 
 #custom modules
-from gates import create_circuit, AVAILABLE_GATES, get_gate_description
+from gates import AVAILABLE_GATES, get_gate_description, is_dynamic
+from circuit_ir import CompactCircuit
 from utils import (
-    run_circuit, 
-    calculate_probabilities, 
-    format_statevector,
-    get_measurement_counts,
+    top_k_amplitudes,
+    count_nonzero_amplitudes,
     format_complex_number,
     get_circuit_stats,
-    get_single_qubit_density_matrices,
     statevector_to_bloch_vector,
-    density_matrix_to_bloch_vector,
-    plot_bloch_sphere_plotly,
-    plot_state_city_big_endian
+    sample_basis_counts,
+    iter_basis_counts
+)
+from jobs import SimulationManager, simulation_task
+from result_store import get_result_store, result_key
+from unitary import get_unitary, big_endian_unitary
+from observables import expectation_values, pauli_correlations, single_qubit_bloch_vectors
+from qasm import parse_qasm, export_qasm, QasmError
+from planner import plan_simulation, format_bytes, MemoryBudgetExceeded, DEFAULT_MEMORY_BUDGET
+from precision import PRECISIONS, DEFAULT_PRECISION
+from animation import export_animation, FORMATS as ANIMATION_FORMATS, MAX_ANIMATION_QUBITS
+from sandbox import circuit_sandbox, MAX_SANDBOX_QUBITS
+from macros import MACRO_GATES, format_macro, marked_label
+from render import (
+    RenderScheduler,
+    build_cached,
+    build_correlation_heatmap,
+    build_circuit_diagram,
+    build_histogram,
+    build_state_city,
+    build_bloch_sphere,
+    render_png,
+    render_plotly
 )
 
 
@@ -39,6 +82,15 @@ from utils import (
 
 
 
+# most likely states listed in the statevector section and probability table
+MAX_LISTED_STATES = 64
+# pause between progressive sampling batches (seconds): each batch samples in about a
+# millisecond, the pause is what lets the user watch the histogram and press "Stop"
+PROGRESSIVE_REDRAW_INTERVAL = 0.25
+
+
+
+
 st.set_page_config(
     page_title="Quantum Circuit Visualizer",
     page_icon="", # if you have a good icon, put in here :)
@@ -48,8 +100,94 @@ st.set_page_config(
 
 
 
+def get_simulation_manager():
+    # background simulation jobs for this session
+    if 'simulation_manager' not in st.session_state:
+        st.session_state.simulation_manager = SimulationManager()
+    return st.session_state.simulation_manager
+
+
+def process_usage():
+    # (cpu seconds, peak rss bytes) of this process; ru_maxrss is KiB on linux, bytes on macos
+    if resource is None:
+        return time.process_time(), None
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return time.process_time(), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def begin_stages():
+    st.session_state.stage_timings = {}
+    st.session_state.stage_usage = {}
+    st.session_state.stage_mark = time.perf_counter()
+    st.session_state.stage_usage_mark = process_usage()
+
+
+def mark_stage(name):
+    # wall time, process CPU time and peak RSS growth since the previous mark, per stage of
+    # main() (read by loadtest.py). CPU includes the simulation / render workers the stage
+    # waits for, so it is per session only with one session per process, as in the load test
+    now = time.perf_counter()
+    cpu, peak_rss = process_usage()
+    start_cpu, start_peak_rss = st.session_state.stage_usage_mark
+    st.session_state.stage_timings[name] = now - st.session_state.stage_mark
+    st.session_state.stage_usage[name] = {
+        'cpu_seconds': cpu - start_cpu,
+        'rss_growth': None if peak_rss is None else peak_rss - start_peak_rss
+    }
+    st.session_state.stage_mark = now
+    st.session_state.stage_usage_mark = (cpu, peak_rss)
+
+
+def wait_for_job(job, placeholder, scheduler=None, poll_interval=0.05):
+    # the st calls in this loop let streamlit stop the script when the user edits
+    # the circuit again; the next rerun then cancels this job. figures finished in the
+    # meantime (the circuit diagram) are drawn while the simulation runs
+    while not job.done():
+        placeholder.progress(job.progress, text=job.stage)
+        if scheduler is not None:
+            scheduler.draw_ready()
+        time.sleep(poll_interval)
+    placeholder.empty()
+
+
+def sample_progressively(statevector, bases, shots, key, title):
+    # counts in growing batches, the histogram (with error bars) redrawn after each one.
+    # the latest counts are kept in session_state: "Stop" reruns the script, which ends
+    # this loop, and that rerun (like any later one) shows the counts sampled so far
+    saved = st.session_state.get('progressive_counts')
+    if saved is not None and saved['key'] != key:
+        saved = None
+    stop_slot, status, chart = st.empty(), st.empty(), st.empty()
+    
+    if saved is None or not saved['done']:
+        if stop_slot.button("⏹️ Stop sampling", key='stop_progressive_sampling') and saved is not None:
+            saved['done'] = True
+        else:
+            for counts in iter_basis_counts(statevector, bases, shots):
+                saved = {'key': key, 'counts': counts, 'done': counts.shots == shots}
+                st.session_state.progressive_counts = saved
+                status.progress(counts.shots / shots, text=f"Sampled {counts.shots} of {shots} shots")
+                render_plotly(chart, build_histogram(counts, title=title, error_bars=True))
+                if not saved['done']:
+                    time.sleep(PROGRESSIVE_REDRAW_INTERVAL)
+            stop_slot.empty()
+            status.empty()
+            return saved['counts']
+        stop_slot.empty()
+    
+    counts = saved['counts']
+    if counts.shots < shots:
+        status.caption(f"Stopped after {counts.shots} of {shots} shots")
+    render_plotly(chart, build_histogram(counts, title=title, error_bars=True))
+    return counts
+
+
+
+
+
 def main():
     """Main application function."""
+    begin_stages()
     
     st.title("Quantum Visualizer")
     st.markdown("""
@@ -62,21 +200,53 @@ def main():
     # sidebar
     st.sidebar.header("Circuit Configuration")
     
+    # init session state for gate sequence (from a shared link if there is one)
+    if 'gate_sequence' not in st.session_state:
+        st.session_state.gate_sequence = []
+        st.session_state.shared_num_qubits = 1
+        token = st.query_params.get('circuit')
+        if token:
+            try:
+                shared = CompactCircuit.from_url_token(token)
+                st.session_state.gate_sequence = shared.to_gate_sequence()
+                st.session_state.shared_num_qubits = shared.num_qubits
+            except ValueError:
+                st.sidebar.warning("Could not load the shared circuit from the link")
+    
+    qubit_options = [1, 2, 3]
+    
+    # bulk import: a new upload is parsed, validated and replaces the circuit in this same rerun
+    uploaded_qasm = st.sidebar.file_uploader(
+        "📂 Import OpenQASM",
+        type=['qasm'],
+        help="OpenQASM 2 or 3 using the supported gates (h, x, y, z, s, t, cx, swap, ccx), "
+             "measure, reset and if (c[k]) x / z"
+    )
+    if uploaded_qasm is not None and st.session_state.get('imported_qasm_id') != uploaded_qasm.file_id:
+        st.session_state.imported_qasm_id = uploaded_qasm.file_id
+        try:
+            imported_qubits, imported_sequence = parse_qasm(uploaded_qasm)
+            if imported_qubits not in qubit_options:
+                raise QasmError(f"The circuit uses {imported_qubits} qubits, this app supports "
+                                f"{qubit_options[0]} to {qubit_options[-1]}")
+            st.session_state.gate_sequence = imported_sequence
+            st.session_state.shared_num_qubits = imported_qubits
+        except (QasmError, UnicodeDecodeError) as e:
+            st.sidebar.error(f"Could not import {uploaded_qasm.name}: {e}")
+    
+    default_qubits = st.session_state.get('shared_num_qubits', 1)
+    
     # selecgt nunber qubit
     num_qubits = st.sidebar.selectbox(
         "Number of Qubits",
-        options=[1, 2, 3],
-        index=0,
+        options=qubit_options,
+        index=qubit_options.index(default_qubits) if default_qubits in qubit_options else 0,
         help="Choose how many qubits to use in the circuit"
     )
     
     st.sidebar.markdown("---")
     st.sidebar.subheader("Build Gate Sequence")
     
-    # init session state for gate sequence
-    if 'gate_sequence' not in st.session_state:
-        st.session_state.gate_sequence = []
-    
     available_gates = AVAILABLE_GATES[num_qubits]
     
     col1, col2 = st.sidebar.columns([2, 1])
@@ -94,8 +264,8 @@ def main():
     # specifics parameters
     gate_params = None
     
-    if selected_gate in ['H', 'X', 'Y', 'Z', 'S', 'T']:
-        # single qubit gates
+    if selected_gate in ['H', 'X', 'Y', 'Z', 'S', 'T', 'Measure', 'Reset']:
+        # single qubit gates (and mid-circuit measurement / reset)
         qubit = st.sidebar.selectbox(
             "Target Qubit",
             options=list(range(num_qubits)),
@@ -160,6 +330,60 @@ def main():
                 format_func=lambda x: f"q{x}"
             )
         gate_params = (control1, control2, target)
+        
+    elif selected_gate in MACRO_GATES:
+        # macros act on the register first..last (MCX leaves a qubit outside it for the target)
+        col_first, col_last = st.sidebar.columns(2)
+        with col_first:
+            first = st.selectbox(
+                "First Qubit",
+                options=list(range(num_qubits - 1)),
+                format_func=lambda x: f"q{x}"
+            )
+        with col_last:
+            last_options = [q for q in range(first + 1, num_qubits)
+                            if selected_gate != 'MCX' or first > 0 or q < num_qubits - 1]
+            last = st.selectbox(
+                "Last Qubit",
+                options=last_options,
+                index=len(last_options) - 1,
+                format_func=lambda x: f"q{x}"
+            )
+        gate_params = (first, last)
+        
+        if selected_gate == 'Oracle':
+            width = last - first + 1
+            marked = st.sidebar.selectbox(
+                "Marked State",
+                options=list(range(2 ** width)),
+                format_func=lambda m: f"|{marked_label(m, width)}⟩ (q{first} leftmost)"
+            )
+            gate_params = (first, last, marked)
+        elif selected_gate == 'MCX':
+            target = st.sidebar.selectbox(
+                "Target",
+                options=[q for q in range(num_qubits) if not first <= q <= last],
+                format_func=lambda x: f"q{x}"
+            )
+            gate_params = (first, last, target)
+        
+    elif selected_gate in ['CondX', 'CondZ']:
+        # classical bit k holds the latest measurement of qubit k
+        col_b, col_t = st.sidebar.columns(2)
+        with col_b:
+            bit = st.selectbox(
+                "If Bit",
+                options=list(range(num_qubits)),
+                format_func=lambda x: f"c{x} (q{x})"
+            )
+        with col_t:
+            target = st.selectbox(
+                "Target",
+                options=list(range(num_qubits)),
+                index=num_qubits - 1,
+                format_func=lambda x: f"q{x}"
+            )
+        gate_params = (bit, target)
     
 
 
@@ -177,7 +401,11 @@ def main():
         for idx, (gate, params) in enumerate(st.session_state.gate_sequence):
             col_info, col_del = st.sidebar.columns([4, 1])
             with col_info:
-                if isinstance(params, tuple):
+                if gate in MACRO_GATES:
+                    params_str = f"({format_macro(gate, params)})"
+                elif gate in ('CondX', 'CondZ'):
+                    params_str = f"(q{params[1]} if c{params[0]}=1)"
+                elif isinstance(params, tuple):
                     params_str = f"({', '.join(f'q{p}' for p in params)})"
                 else:
                     params_str = f"q{params}"
@@ -206,6 +434,34 @@ def main():
         step=100,
         help="Number of times to measure the circuit"
     )
+    precision = st.sidebar.radio(
+        "Precision",
+        list(PRECISIONS),
+        index=list(PRECISIONS).index(DEFAULT_PRECISION),
+        horizontal=True,
+        help="Single precision (complex64) halves the memory of the statevector, enough for plots"
+    )
+    # dynamic circuits (mid-circuit measurement / reset) sample their shots while simulating,
+    # so progressive sampling from a final statevector and the sandbox do not apply
+    dynamic = is_dynamic(st.session_state.gate_sequence)
+    progressive = not dynamic and st.sidebar.toggle(
+        "📈 Progressive sampling",
+        help="Sample the shots in growing batches and redraw the histogram (with error bars) "
+             "after each one; stop as soon as the distribution is clear"
+    )
+    instant_mode = num_qubits <= MAX_SANDBOX_QUBITS and not dynamic and st.sidebar.toggle(
+        "⚡ Instant mode",
+        help="Try gates out in the browser; the server only runs when you commit the sequence"
+    )
+    mark_stage('sidebar')
+    
+    # gates applied in the sandbox are simulated client side, only a commit reruns the app
+    if instant_mode:
+        st.subheader("⚡ Instant Sandbox")
+        committed = circuit_sandbox(num_qubits, st.session_state.gate_sequence)
+        if committed is not None:
+            st.session_state.gate_sequence = committed
+            st.rerun()
     
     # main content area
     if not st.session_state.gate_sequence:
@@ -235,7 +491,77 @@ def main():
 
     # create and run circuit
     try:
-        circuit = create_circuit(num_qubits, st.session_state.gate_sequence)
+        # compact, hashable form of the sequence; the QuantumCircuit is built from it
+        circuit_ir = CompactCircuit.from_gate_sequence(num_qubits, st.session_state.gate_sequence)
+        circuit = circuit_ir.to_circuit()
+        
+        # share link (the whole circuit is encoded in the url)
+        with st.sidebar.expander("🔗 Share Circuit"):
+            st.markdown("Append this to the app URL:")
+            st.code(f"?circuit={circuit_ir.to_url_token()}", language=None)
+        
+        with st.sidebar.expander("📄 Export OpenQASM"):
+            qasm_version = st.radio("Version", [2, 3], horizontal=True, key='qasm_version',
+                                    format_func=lambda v: f"OpenQASM {v}.0")
+            try:
+                qasm_source = export_qasm(num_qubits, circuit_ir.to_gate_sequence(), version=qasm_version)
+                st.download_button("Download .qasm", qasm_source, file_name='circuit.qasm', mime='text/plain')
+                st.code(qasm_source, language=None)
+            except ValueError as e:
+                st.caption(str(e))
+        
+        with st.sidebar.expander("🎞️ Export Animation"):
+            if num_qubits > MAX_ANIMATION_QUBITS:
+                st.caption(f"Animations support up to {MAX_ANIMATION_QUBITS} qubits")
+            elif dynamic:
+                st.caption("Animations need a circuit without measurements or resets")
+            else:
+                st.caption("Bloch spheres and state city after every gate, rendered in worker processes")
+                animation_format = st.radio("Format", ANIMATION_FORMATS, horizontal=True, key='animation_format',
+                                            format_func=lambda f: 'PNG frames (.zip)' if f == 'zip' else f.upper())
+                if st.button("Render animation", use_container_width=True):
+                    try:
+                        with st.spinner(f"Rendering {len(circuit_ir) + 1} frames..."):
+                            data = export_animation(num_qubits, circuit_ir.to_gate_sequence(), fmt=animation_format)
+                        st.session_state.animation = (circuit_ir.fingerprint, animation_format, data)
+                    except RuntimeError as e:
+                        st.error(str(e))
+                
+                # the last rendering stays downloadable until the circuit or format changes
+                rendered = st.session_state.get('animation')
+                if rendered is not None and rendered[:2] == (circuit_ir.fingerprint, animation_format):
+                    st.download_button(f"Download .{animation_format}", rendered[2],
+                                       file_name=f'circuit.{animation_format}',
+                                       mime={'gif': 'image/gif', 'mp4': 'video/mp4'}.get(animation_format,
+                                                                                        'application/zip'))
+        
+        # pick the simulation method from memory / runtime estimates, within this session's budget
+        if 'memory_budget' not in st.session_state:
+            st.session_state.memory_budget = DEFAULT_MEMORY_BUDGET
+        try:
+            plan = plan_simulation(num_qubits, circuit_ir.to_gate_sequence(),
+                                   budget=st.session_state.memory_budget, precision=precision, shots=shots)
+        except MemoryBudgetExceeded as e:
+            st.error(f"This circuit does not fit the session's memory budget. {e}")
+            return
+        
+        with st.sidebar.expander("🧠 Simulation Plan"):
+            st.markdown(f"**Method:** `{plan['method']}` ({plan['precision']} precision)")
+            st.markdown(f"Estimated peak memory {format_bytes(plan['memory_bytes'])} "
+                        f"of {format_bytes(plan['budget'])}, runtime ~{plan['runtime_seconds'] * 1e3:.1f} ms")
+            st.dataframe([
+                {
+                    'Method': c['method'],
+                    'Memory': format_bytes(c['memory_bytes']),
+                    'Runtime (ms)': f"{c['runtime_seconds'] * 1e3:.2f}",
+                    'Skipped because': c['reason']
+                }
+                for c in plan['candidates']
+            ], use_container_width=True, hide_index=True)
+        mark_stage('circuit')
+        
+        # figures are built in the background and filled in as they finish
+        scheduler = RenderScheduler()
         
         # circuit statistics
         stats = get_circuit_stats(circuit)
@@ -255,23 +581,60 @@ def main():
         
         # display circuit diagram
         st.subheader("🔷 Circuit Diagram")
-        fig = circuit.draw(output='mpl', style='iqp')
-        st.pyplot(fig)
-        plt.close()
+        # results and the circuit diagram are shared through the on-disk store (if enabled)
+        store = get_result_store()
+        scheduler.submit(st.empty(), build_cached, render_png, store,
+                         result_key(circuit_ir.fingerprint, figure='circuit_diagram', style='iqp'),
+                         build_circuit_diagram, circuit)
+        
+        # full operator of the circuit (cached per circuit fingerprint)
+        with st.expander("🧮 Circuit Unitary"):
+            if dynamic:
+                st.caption("Measurements and resets are not unitary, so this circuit has no unitary")
+            else:
+                st.caption("Entry (row, column) is ⟨row|U|column⟩, basis states in big-endian order")
+                unitary = big_endian_unitary(get_unitary(circuit_ir, store=store), num_qubits)
+                basis_labels = [f"|{format(i, f'0{num_qubits}b')}⟩" for i in range(2 ** num_qubits)]
+                unitary_data = []
+                for row_label, row in zip(basis_labels, unitary):
+                    entries = {'State': row_label}
+                    for column_label, value in zip(basis_labels, row):
+                        entries[column_label] = format_complex_number(value)
+                    unitary_data.append(entries)
+                st.dataframe(unitary_data, use_container_width=True, hide_index=True)
         
         st.markdown("---")
         
 
 
-        # run simulation
-        with st.spinner("Running quantum simulation..."):
-            results = run_circuit(circuit, shots=shots)
-            statevector = results['statevector']
+        # run simulation in the background (debounced, superseded runs are cancelled)
+        manager = get_simulation_manager()
+        # progressive sampling draws its shots from the statevector, so the job skips them
+        job_key = (circuit_ir.fingerprint, shots, plan['method'], precision, progressive)
+        job = manager.submit(job_key, simulation_task(circuit_ir, shots, store, method=plan['method'],
+                                                      precision=precision, sample_counts=not progressive))
+        wait_for_job(job, st.empty(), scheduler)
+        
+        # only use results computed for the circuit currently on screen
+        results = manager.result(job_key)
+        if results is None:
+            st.info("The circuit changed, updating...")
+            return
+        statevector = results['statevector']
+        mark_stage('simulation')
         
 
         # add bloch sphere / state visualization section
         st.subheader("Quantum State Visualization")
         
+        # after a mid-circuit measurement each shot ends in the state of its own outcomes
+        if 'history' in results:
+            st.info(f"Measurements split the shots into {results['branches']} measurement histories. "
+                    f"The state below is the most common one, classical bits c = {results['history']} "
+                    f"(c0 leftmost)")
+        elif dynamic:
+            st.info("The state below is the final state of one sampled shot")
+        
         if num_qubits == 1:
             # single qubit
             st.markdown("**Interactive Bloch Sphere Representation**")
@@ -288,8 +651,8 @@ def main():
 
             bloch_vec = statevector_to_bloch_vector(statevector)
             
-            fig = plot_bloch_sphere_plotly(bloch_vec, title="Single Qubit State")
-            st.plotly_chart(fig, use_container_width=True)
+            scheduler.submit(st.empty(), build_bloch_sphere, render_plotly,
+                             bloch_vec, title="Single Qubit State")
             
             # bloch vector components
             x, y, z = bloch_vec
@@ -314,16 +677,17 @@ def main():
             
 
 
-            reduced_dms = get_single_qubit_density_matrices(statevector, num_qubits)
+            # <X>, <Y>, <Z> per qubit, straight from the amplitudes (no partial trace)
+            bloch_vectors = single_qubit_bloch_vectors(statevector, num_qubits)
             
             col_bloch1, col_bloch2 = st.columns(2)
             
             with col_bloch1:
                 st.markdown("**Qubit 0 (q0)**")
-                bloch_vec_0 = density_matrix_to_bloch_vector(reduced_dms[0])
+                bloch_vec_0 = bloch_vectors[0]
                 
-                fig0 = plot_bloch_sphere_plotly(bloch_vec_0, title="Qubit 0 State")
-                st.plotly_chart(fig0, use_container_width=True)
+                scheduler.submit(st.empty(), build_bloch_sphere, render_plotly,
+                                 bloch_vec_0, title="Qubit 0 State")
                 
                 r0 = np.sqrt(sum(c**2 for c in bloch_vec_0))
                 if r0 > 0.99:
@@ -337,10 +701,10 @@ def main():
             
             with col_bloch2:
                 st.markdown("**Qubit 1 (q1)**")
-                bloch_vec_1 = density_matrix_to_bloch_vector(reduced_dms[1])
+                bloch_vec_1 = bloch_vectors[1]
                 
-                fig1 = plot_bloch_sphere_plotly(bloch_vec_1, title="Qubit 1 State")
-                st.plotly_chart(fig1, use_container_width=True)
+                scheduler.submit(st.empty(), build_bloch_sphere, render_plotly,
+                                 bloch_vec_1, title="Qubit 1 State")
                 
                 r1 = np.sqrt(sum(c**2 for c in bloch_vec_1))
                 if r1 > 0.99:
@@ -361,15 +725,53 @@ def main():
             - **Blue bars**: Imaginary part (positive = blue, negative = dark blue)
             - **X-axis**: Basis states in big-endian order (q0 q1 q2)
             - **Bar height**: Amplitude magnitude
+            
+            **Click and drag to rotate the city!**
             """)
             
-            fig = plot_state_city_big_endian(statevector, num_qubits, 
-                                             title='3-Qubit State Amplitudes (Big-Endian)')
-            st.pyplot(fig)
-            plt.close()
+            scheduler.submit(st.empty(), build_state_city, render_plotly,
+                             statevector, num_qubits,
+                             title='3-Qubit State Amplitudes (Big-Endian)')
             
             st.info("**Tip:** The visualization shows all 8 basis states with their complex amplitudes.")
         
+        # the diagram and state figures are up before the tables and sampling below
+        scheduler.stream()
+        
+        st.markdown("---")
+        
+        # pauli correlators from the same (cached) statevector, no extra simulation
+        st.subheader("📈 Pauli Correlations")
+        col_corr, col_obs = st.columns(2)
+        
+        with col_corr:
+            if num_qubits >= 2:
+                corr_pauli = st.radio("Pauli", ['Z', 'X', 'Y'], horizontal=True, key='correlation_pauli')
+                connected = st.checkbox("Connected (subtract ⟨P_i⟩⟨P_j⟩)", key='correlation_connected')
+                correlations = pauli_correlations(statevector, num_qubits, corr_pauli, connected=connected)
+                scheduler.submit(st.empty(), build_correlation_heatmap, render_plotly,
+                                 correlations, title=f"⟨{corr_pauli}_i {corr_pauli}_j⟩ (diagonal: ⟨{corr_pauli}_i⟩)",
+                                 pauli=corr_pauli)
+            else:
+                st.info("Correlations need at least 2 qubits.")
+        
+        with col_obs:
+            pauli_input = st.text_input(
+                "Pauli strings (comma separated, q0 first)",
+                value=', '.join(['Z' * num_qubits, 'X' * num_qubits]),
+                key=f'pauli_strings_{num_qubits}'
+            )
+            pauli_strings = [p.strip().upper() for p in pauli_input.split(',') if p.strip()]
+            try:
+                values = expectation_values(statevector, pauli_strings, num_qubits)
+                st.dataframe([
+                    {'Observable': f"⟨{p}⟩", 'Expectation': f"{v:.6f}"}
+                    for p, v in zip(pauli_strings, values)
+                ], use_container_width=True, hide_index=True)
+            except ValueError as e:
+                st.warning(str(e))
+        
+        scheduler.draw_ready()
         st.markdown("---")
         
         # results in columns
@@ -377,11 +779,14 @@ def main():
         
         with col_left:
             st.subheader("Statevector (Big-Endian)")
-            formatted_sv = format_statevector(statevector)
+            # top k by probability, picked without a python object per amplitude
+            top_states = top_k_amplitudes(statevector, k=MAX_LISTED_STATES)
+            # probability > 1e-10
+            non_zero_states = count_nonzero_amplitudes(statevector, threshold=1e-5)
             
             st.markdown("**Quantum State Amplitudes:**")
             st.markdown("*(q0 is leftmost, qN is rightmost)*")
-            for basis_state, amplitude, probability in formatted_sv:
+            for basis_state, amplitude, probability in sorted(top_states, key=lambda x: x[0]):
                 amp_str = format_complex_number(amplitude)
                 st.markdown(
                     f"- `|{basis_state}⟩`: {amp_str} "
@@ -393,10 +798,8 @@ def main():
             st.markdown("**Probability Distribution:**")
 
 
-            probs = calculate_probabilities(statevector)
-            
             prob_data = []
-            for state, prob in sorted(probs.items(), key=lambda x: x[1], reverse=True):
+            for state, _, prob in top_states:
                 if prob > 1e-10:  # 0nly show non zero probabilities
                     prob_data.append({
                         'State': f"|{state}⟩",
@@ -405,30 +808,65 @@ def main():
                     })
             
             st.dataframe(prob_data, use_container_width=True)
+            if non_zero_states > len(prob_data):
+                st.caption(f"Showing the {len(prob_data)} most likely of "
+                           f"{non_zero_states} nonzero states")
         
         with col_right:
             st.subheader("Measurement Results (Big-Endian)")
-            counts = get_measurement_counts(circuit, shots=shots)
+            
+            # measurement basis per qubit; X/Y are sampled from the simulated state after
+            # a local basis rotation, so switching bases never reruns the simulation
+            # (dynamic circuits are measured in Z, their shots come from the simulation itself)
+            bases = 'Z' * num_qubits
+            if not dynamic:
+                st.markdown("**Measurement Basis:**")
+                basis_cols = st.columns(num_qubits)
+                bases = ''
+                for q, basis_col in enumerate(basis_cols):
+                    with basis_col:
+                        bases += st.selectbox(f"q{q}", ['Z', 'X', 'Y'], key=f'measurement_basis_{q}')
+            
+            if bases != 'Z' * num_qubits:
+                st.caption("Outcome 0/1 is |+⟩/|−⟩ for X and |+i⟩/|−i⟩ for Y")
             
             # histogram
-            fig = plot_histogram(counts, figsize=(8, 6), color='#6366f1')
-            st.pyplot(fig)
-            plt.close()
+            title = f"Measurement Results ({bases} basis)"
+            if progressive:
+                counts = sample_progressively(statevector, bases, shots,
+                                              (results['fingerprint'], bases, shots, precision), title)
+            else:
+                if bases == 'Z' * num_qubits:
+                    counts = results['counts']
+                else:
+                    counts = sample_basis_counts(statevector, bases, shots)
+                scheduler.submit(st.empty(), build_histogram, render_plotly, counts, title=title)
             
             # raw counts
             st.markdown("---")
             st.markdown("**Raw Measurement Counts:**")
             st.markdown("*(q0 is leftmost, qN is rightmost)*")
             
+            # counts are index arrays, labels are only built for the listed rows
             counts_data = []
-            for state, count in sorted(counts.items(), key=lambda x: x[1], reverse=True):
+            for state, count in counts.most_common(MAX_LISTED_STATES):
                 counts_data.append({
                     'State': state,
                     'Count': count,
-                    'Frequency': f"{count/shots:.4f}"
+                    'Frequency': f"{count/counts.shots:.4f}"
                 })
             
             st.dataframe(counts_data, use_container_width=True)
+            if len(counts) > len(counts_data):
+                st.caption(f"Showing the {len(counts_data)} most frequent of {len(counts)} outcomes")
+            
+            # shots per mid-circuit measurement outcome (classical bit k measured from qubit k)
+            if 'histories' in results:
+                st.markdown("**Measurement Histories:**")
+                st.dataframe([
+                    {'Classical Bits': f"c = {label}", 'Shots': count}
+                    for label, count in results['histories'].most_common(MAX_LISTED_STATES)
+                ], use_container_width=True, hide_index=True)
         
         # additional analysis
         st.markdown("---")
@@ -444,15 +882,13 @@ def main():
         with col2:
             st.markdown("**Quantum Properties:**")
             if num_qubits > 1:
-                single_qubit_probs = [abs(amp)**2 for amp in statevector]
-                max_prob = max(single_qubit_probs)
+                max_prob = top_states[0][2]
                 if max_prob < 0.99:
                     st.markdown("- State appears to be **entangled**")
                 else:
                     st.markdown("- State appears to be **separable**")
             
             # kalau superposisi
-            non_zero_states = sum(1 for p in probs.values() if p > 1e-10)
             if non_zero_states > 1:
                 st.markdown(f"- **Superposition** of {non_zero_states} states")
             else:
@@ -471,6 +907,12 @@ def main():
             unsafe_allow_html=True
         )
         
+        mark_stage('analysis')
+        
+        # draw the remaining figures (heatmap, histogram) in completion order
+        scheduler.stream()
+        mark_stage('render')
+        
     except Exception as e:
         st.error(f"Error running circuit: {str(e)}")
         st.exception(e)
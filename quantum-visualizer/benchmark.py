@@ -0,0 +1,449 @@
+"""
+benchmark.py
+Reproducible benchmark harness for every stage of the visualizer pipeline.
+Times and profiles memory for circuit construction, simulation, analysis and plotting
+across qubit counts and gate sequence lengths. Results are stored as JSON baselines
+under .benchmarks/ so regressions can be flagged when compared locally.
+--scaling times the threaded dense kernels (kernels.py) on large random statevectors
+for increasing thread counts and reports the speedup over one thread.
+
+Usage:
+    python benchmark.py --save baseline
+    python benchmark.py --compare baseline
+    python benchmark.py --qubits 1 2 3 --lengths 10 100 --stages run_circuit partial_trace
+    python benchmark.py --scaling --qubits 20 24 --threads 1 2 4 8 16 32
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use('Agg')  # no display needed for the plotting stages
+import matplotlib.pyplot as plt
+import numpy as np
+
+from gates import create_circuit, AVAILABLE_GATES
+from circuit_ir import CompactCircuit
+from mps import estimate_bond_dimension
+from sparse_sim import SparseStatevector
+from unitary import compute_unitary
+from observables import pauli_correlations, single_qubit_bloch_vectors
+from kernels import amplitude_probabilities, to_big_endian, reduced_density_matrices
+from utils import (
+    run_circuit,
+    calculate_probabilities,
+    format_statevector,
+    top_k_amplitudes,
+    get_measurement_counts,
+    get_single_qubit_density_matrices,
+    statevector_to_density_matrix,
+    partial_trace,
+    density_matrix_to_bloch_vector,
+    reorder_statevector_to_big_endian,
+    plot_bloch_sphere_plotly,
+    plot_state_city_big_endian,
+    plot_state_city_plotly,
+    plot_histogram_plotly
+)
+
+
+
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.benchmarks')
+
+DEFAULT_QUBITS = [1, 2, 3, 5]
+DEFAULT_LENGTHS = [10, 50, 200]
+DEFAULT_SHOTS = 1024
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.25  # flag anything 25% slower / bigger than the baseline
+DEFAULT_SCALING_QUBITS = [20, 22, 24]
+
+# gate arity, used to pick random operands
+GATE_ARITY = {
+    'H': 1, 'X': 1, 'Y': 1, 'Z': 1, 'S': 1, 'T': 1,
+    'CNOT': 2, 'SWAP': 2, 'Toffoli': 3
+}
+
+
+
+
+
+def random_gate_sequence(num_qubits, length, seed=0):
+    # same (num_qubits, length, seed) always gives the same sequence
+    rng = random.Random(seed * 1_000_003 + num_qubits * 10_007 + length)
+    # primitive gates only, so the sequences (and the baselines) stay what they were
+    gate_set = [g for g in AVAILABLE_GATES[min(num_qubits, max(AVAILABLE_GATES))] if g in GATE_ARITY]
+
+    sequence = []
+    for _ in range(length):
+        gate = rng.choice(gate_set)
+        operands = rng.sample(range(num_qubits), GATE_ARITY[gate])
+        params = operands[0] if len(operands) == 1 else tuple(operands)
+        sequence.append((gate, params))
+
+    return sequence
+
+
+
+
+
+def build_context(num_qubits, length, shots, seed):
+    # everything the stages need as input, computed once outside the timed region
+    gate_sequence = random_gate_sequence(num_qubits, length, seed)
+    circuit = create_circuit(num_qubits, gate_sequence)
+    statevector = np.asarray(run_circuit(circuit, shots=shots)['statevector'])
+    density_matrix = statevector_to_density_matrix(statevector)
+    bloch_vector = density_matrix_to_bloch_vector(partial_trace(density_matrix, 0, num_qubits))
+
+    return {
+        'num_qubits': num_qubits,
+        'length': length,
+        'shots': shots,
+        'gate_sequence': gate_sequence,
+        'circuit_ir': CompactCircuit.from_gate_sequence(num_qubits, gate_sequence),
+        'circuit': circuit,
+        'statevector': statevector,
+        'density_matrix': density_matrix,
+        'bloch_vector': bloch_vector,
+        'counts': get_measurement_counts(circuit, shots=shots)
+    }
+
+
+def _plot_state_city(ctx):
+    fig = plot_state_city_big_endian(ctx['statevector'], ctx['num_qubits'])
+    plt.close(fig)
+
+
+
+
+
+# stage name -> (callable taking the context, depends on gate sequence length)
+# stages that only see the final state are run once per qubit count
+STAGES = {
+    'create_circuit': (
+        lambda ctx: create_circuit(ctx['num_qubits'], ctx['gate_sequence']), True),
+    'CompactCircuit.from_gate_sequence': (
+        lambda ctx: CompactCircuit.from_gate_sequence(ctx['num_qubits'], ctx['gate_sequence']), True),
+    'CompactCircuit.to_circuit': (
+        lambda ctx: ctx['circuit_ir'].to_circuit(), True),
+    'CompactCircuit.relabeled': (
+        lambda ctx: ctx['circuit_ir'].relabeled(), True),
+    'run_circuit': (
+        lambda ctx: run_circuit(ctx['circuit'], shots=ctx['shots']), True),
+    'run_circuit[mps]': (
+        lambda ctx: run_circuit(ctx['circuit'], shots=ctx['shots'], method='matrix_product_state'), True),
+    'estimate_bond_dimension': (
+        lambda ctx: estimate_bond_dimension(ctx['num_qubits'], ctx['gate_sequence']), True),
+    'SparseStatevector.from_gate_sequence': (
+        lambda ctx: SparseStatevector.from_gate_sequence(ctx['num_qubits'], ctx['gate_sequence']), True),
+    'compute_unitary': (
+        lambda ctx: compute_unitary(ctx['circuit_ir']), True),
+    'get_measurement_counts': (
+        lambda ctx: get_measurement_counts(ctx['circuit'], shots=ctx['shots']), True),
+    'calculate_probabilities': (
+        lambda ctx: calculate_probabilities(ctx['statevector']), False),
+    'format_statevector': (
+        lambda ctx: format_statevector(ctx['statevector']), False),
+    'top_k_amplitudes': (
+        lambda ctx: top_k_amplitudes(ctx['statevector']), False),
+    'get_single_qubit_density_matrices': (
+        lambda ctx: get_single_qubit_density_matrices(ctx['statevector'], ctx['num_qubits']), False),
+    'single_qubit_bloch_vectors': (
+        lambda ctx: single_qubit_bloch_vectors(ctx['statevector'], ctx['num_qubits']), False),
+    'pauli_correlations': (
+        lambda ctx: pauli_correlations(ctx['statevector'], ctx['num_qubits'], 'Z'), False),
+    'partial_trace': (
+        lambda ctx: partial_trace(ctx['density_matrix'], 0, ctx['num_qubits']), False),
+    'reorder_statevector_to_big_endian': (
+        lambda ctx: reorder_statevector_to_big_endian(ctx['statevector'], ctx['num_qubits']), False),
+    'plot_bloch_sphere_plotly': (
+        lambda ctx: plot_bloch_sphere_plotly(ctx['bloch_vector']), False),
+    'plot_state_city_big_endian': (_plot_state_city, False),
+    'plot_state_city_plotly': (
+        lambda ctx: plot_state_city_plotly(ctx['statevector'], ctx['num_qubits']), False),
+    'plot_histogram_plotly': (
+        lambda ctx: plot_histogram_plotly(ctx['counts']), False)
+}
+
+
+
+
+
+# threaded kernels timed by --scaling, each called with ctx['threads'] worker threads
+KERNELS = {
+    'amplitude_probabilities': lambda ctx: amplitude_probabilities(ctx['statevector'], ctx['threads']),
+    'to_big_endian': lambda ctx: to_big_endian(ctx['statevector'], ctx['num_qubits'], ctx['threads']),
+    'reduced_density_matrices': (
+        lambda ctx: reduced_density_matrices(ctx['statevector'], ctx['num_qubits'], ctx['threads']))
+}
+
+
+def default_thread_counts():
+    # 1, 2, 4, ... up to the number of cores (which is always included)
+    cores = os.cpu_count() or 1
+    counts = [2 ** i for i in range(cores.bit_length()) if 2 ** i < cores]
+    return counts + [cores]
+
+
+def random_statevector(num_qubits, seed=0):
+    # normalized random state: no simulation needed and no structure the kernels could exploit
+    rng = np.random.default_rng(seed)
+    sv = rng.standard_normal(2 ** num_qubits) + 1j * rng.standard_normal(2 ** num_qubits)
+    return sv / np.linalg.norm(sv)
+
+
+
+
+
+def time_stage(func, ctx, repeat):
+    # one warmup call so imports and backend start-up are not measured
+    func(ctx)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(ctx)
+        timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+def measure_peak_memory(func, ctx):
+    # separate run: tracemalloc slows everything down, so it never overlaps the timings
+    # (only Python/NumPy allocations are seen, not memory allocated inside Aer)
+    tracemalloc.start()
+    try:
+        func(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak
+
+
+def benchmark_key(stage, num_qubits, length):
+    if length is None:
+        return f"{stage}[n={num_qubits}]"
+    return f"{stage}[n={num_qubits},len={length}]"
+
+
+
+
+
+def run_benchmarks(qubits, lengths, stages, shots=DEFAULT_SHOTS, repeat=DEFAULT_REPEAT, seed=0,
+                   verbose=True):
+    results = {}
+
+    for num_qubits in qubits:
+        for length_idx, length in enumerate(lengths):
+            ctx = build_context(num_qubits, length, shots, seed)
+
+            for stage in stages:
+                func, per_length = STAGES[stage]
+                if not per_length and length_idx > 0:
+                    continue
+
+                timings = time_stage(func, ctx, repeat)
+                key = benchmark_key(stage, num_qubits, length if per_length else None)
+                results[key] = {
+                    'stage': stage,
+                    'num_qubits': num_qubits,
+                    'length': length if per_length else None,
+                    'min': min(timings),
+                    'median': statistics.median(timings),
+                    'mean': statistics.mean(timings),
+                    'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+                    'peak_memory': measure_peak_memory(func, ctx)
+                }
+
+                if verbose:
+                    r = results[key]
+                    print(f"{key:<60} median {r['median'] * 1e3:10.3f} ms   "
+                          f"peak {r['peak_memory'] / 1024:10.1f} KiB")
+
+    return results
+
+
+
+
+
+def run_scaling_benchmarks(qubits, threads, repeat=DEFAULT_REPEAT, seed=0, verbose=True):
+    # every kernel at every thread count; speedup and parallel efficiency are relative
+    # to the single threaded run (or the smallest thread count given)
+    results = {}
+
+    for num_qubits in qubits:
+        ctx = {'num_qubits': num_qubits, 'statevector': random_statevector(num_qubits, seed)}
+
+        for kernel, func in KERNELS.items():
+            base = None
+            for count in sorted(threads):
+                ctx['threads'] = count
+                timings = time_stage(func, ctx, repeat)
+                median = statistics.median(timings)
+                base = base or (count, median)
+
+                key = f"{kernel}[n={num_qubits},threads={count}]"
+                results[key] = {
+                    'stage': kernel,
+                    'num_qubits': num_qubits,
+                    'threads': count,
+                    'min': min(timings),
+                    'median': median,
+                    'mean': statistics.mean(timings),
+                    'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+                    'peak_memory': measure_peak_memory(func, ctx),
+                    'speedup': base[1] / median,
+                    'efficiency': base[1] / median * base[0] / count
+                }
+
+                if verbose:
+                    r = results[key]
+                    print(f"{key:<60} median {r['median'] * 1e3:10.3f} ms   "
+                          f"speedup x{r['speedup']:5.2f}   efficiency {r['efficiency']:6.1%}")
+
+    return results
+
+
+
+
+
+def machine_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__
+    }
+
+
+def baseline_path(name):
+    return os.path.join(BENCHMARK_DIR, f"{name}.json")
+
+
+def save_baseline(name, results, settings):
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    payload = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': machine_info(),
+        'settings': settings,
+        'results': results
+    }
+    with open(baseline_path(name), 'w') as f:
+        json.dump(payload, f, indent=2)
+
+    return baseline_path(name)
+
+
+def load_baseline(name):
+    with open(baseline_path(name)) as f:
+        return json.load(f)
+
+
+
+
+
+def compare_results(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    # a stage regresses when its median time or its peak memory grew past the tolerance
+    rows = []
+    for key, now in current.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+
+        time_ratio = now['median'] / before['median'] if before['median'] > 0 else 1.0
+        memory_ratio = (now['peak_memory'] / before['peak_memory']
+                        if before['peak_memory'] > 0 else 1.0)
+        rows.append({
+            'key': key,
+            'time_ratio': time_ratio,
+            'memory_ratio': memory_ratio,
+            'regressed': time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance
+        })
+
+    return rows
+
+
+def print_comparison(rows):
+    for row in rows:
+        flag = 'REGRESSION' if row['regressed'] else ''
+        print(f"{row['key']:<60} time x{row['time_ratio']:6.2f}   "
+              f"memory x{row['memory_ratio']:6.2f}   {flag}")
+
+    regressions = [row for row in rows if row['regressed']]
+    print(f"\n{len(rows)} benchmarks compared, {len(regressions)} regressions")
+    return regressions
+
+
+
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the quantum visualizer pipeline.")
+    parser.add_argument('--qubits', type=int, nargs='+',
+                        help=f"qubit counts (default {DEFAULT_QUBITS}, {DEFAULT_SCALING_QUBITS} with --scaling)")
+    parser.add_argument('--lengths', type=int, nargs='+', default=DEFAULT_LENGTHS,
+                        help="gate sequence lengths")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--shots', type=int, default=DEFAULT_SHOTS)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', metavar='NAME', help="store results as a named baseline")
+    parser.add_argument('--compare', metavar='NAME', help="compare against a stored baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--scaling', action='store_true',
+                        help="time the threaded kernels against the thread count instead of the stages")
+    parser.add_argument('--threads', type=int, nargs='+', help="thread counts for --scaling")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.scaling:
+        qubits = args.qubits or DEFAULT_SCALING_QUBITS
+        threads = args.threads or default_thread_counts()
+        settings = {
+            'scaling': True,
+            'qubits': qubits,
+            'threads': threads,
+            'repeat': args.repeat,
+            'seed': args.seed
+        }
+        results = run_scaling_benchmarks(qubits, threads, repeat=args.repeat, seed=args.seed)
+    else:
+        qubits = args.qubits or DEFAULT_QUBITS
+        settings = {
+            'qubits': qubits,
+            'lengths': args.lengths,
+            'stages': args.stages,
+            'shots': args.shots,
+            'repeat': args.repeat,
+            'seed': args.seed
+        }
+        results = run_benchmarks(qubits, args.lengths, args.stages,
+                                 shots=args.shots, repeat=args.repeat, seed=args.seed)
+
+    if args.save:
+        path = save_baseline(args.save, results, settings)
+        print(f"\nBaseline saved to {path}")
+
+    if args.compare:
+        baseline = load_baseline(args.compare)
+        print(f"\nComparing against '{args.compare}' ({baseline['created']})")
+        regressions = print_comparison(compare_results(baseline['results'], results, args.tolerance))
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+circuit_ir.py
+Compact, hashable representation of a gate sequence.
+Gates are stored as interned opcodes with packed qubit operands in a NumPy structured
+array, with a stable content hash computed once. Circuits serialize to bytes (caching,
+storage) and URL safe tokens (sharing), and are turned into a QuantumCircuit only when needed.
+Macro gates (macros.py) keep their register bounds and marked value / target in the
+same three operand slots, and a conditioned gate (CondX / CondZ) its classical bit and
+target qubit.
+"""
+
+import base64
+import hashlib
+import struct
+import zlib
+
+import numpy as np
+from qiskit import QuantumCircuit
+import qiskit_aer  # noqa: F401  (registers QuantumCircuit.save_statevector)
+
+from gates import (
+    apply_hadamard,
+    apply_pauli_x,
+    apply_pauli_y,
+    apply_pauli_z,
+    apply_s_gate,
+    apply_t_gate,
+    apply_cnot,
+    apply_swap,
+    apply_toffoli,
+    apply_qft,
+    apply_inverse_qft,
+    apply_diffuser,
+    apply_oracle,
+    apply_mcx,
+    apply_mcz,
+    apply_measure,
+    apply_reset,
+    apply_conditional_x,
+    apply_conditional_z,
+    DYNAMIC_GATES
+)
+from macros import MACRO_GATES, validate_macro
+
+
+
+
+# interned opcodes: position in this tuple is the opcode, never reorder (it is serialized)
+GATE_NAMES = ('H', 'X', 'Y', 'Z', 'S', 'T', 'CNOT', 'SWAP', 'Toffoli') + MACRO_GATES + DYNAMIC_GATES
+OPCODES = {name: opcode for opcode, name in enumerate(GATE_NAMES)}
+# operand slots per gate (for macros: first, last and the marked value / target,
+# for conditioned gates: bit, target)
+GATE_ARITY = np.array([1, 1, 1, 1, 1, 1, 2, 2, 3, 2, 2, 2, 3, 3, 2, 1, 1, 2, 2], dtype=np.uint8)
+MACRO_OPCODES = np.array([OPCODES[name] for name in MACRO_GATES], dtype=np.uint8)
+DYNAMIC_OPCODES = np.array([OPCODES[name] for name in DYNAMIC_GATES], dtype=np.uint8)
+
+# dispatch table indexed by opcode (replaces the string if/elif chain)
+_APPLY = (
+    apply_hadamard, apply_pauli_x, apply_pauli_y, apply_pauli_z, apply_s_gate, apply_t_gate,
+    apply_cnot, apply_swap, apply_toffoli,
+    apply_qft, apply_inverse_qft, apply_diffuser, apply_oracle, apply_mcx, apply_mcz,
+    apply_measure, apply_reset, apply_conditional_x, apply_conditional_z
+)
+
+MAX_OPERANDS = 3
+NO_QUBIT = 0xFF  # padding for unused operand slots
+GATE_DTYPE = np.dtype([('op', np.uint8), ('qubits', np.uint8, (MAX_OPERANDS,))])
+
+_MAGIC = b'QVC1'
+_HEADER = struct.Struct('<4sBI')  # magic, num_qubits, num_gates
+
+
+
+
+
+class CompactCircuit:
+    __slots__ = ('num_qubits', 'gates', 'fingerprint', '_hash')
+
+    def __init__(self, num_qubits, gates):
+        gates = np.ascontiguousarray(gates, dtype=GATE_DTYPE)
+        gates.setflags(write=False)  # immutable, so the hash below stays valid
+
+        self.num_qubits = int(num_qubits)
+        self.gates = gates
+        digest = hashlib.blake2b(self.to_bytes(), digest_size=16).digest()
+        self.fingerprint = digest.hex()
+        self._hash = int.from_bytes(digest[:8], 'little', signed=True)
+
+    @classmethod
+    def from_gate_sequence(cls, num_qubits, gate_sequence):
+        gates = np.zeros(len(gate_sequence), dtype=GATE_DTYPE)
+        gates['qubits'] = NO_QUBIT
+        count = 0
+
+        for gate_name, params in gate_sequence:
+            if gate_name not in OPCODES:
+                raise ValueError(f"Unknown gate '{gate_name}'")
+            opcode = OPCODES[gate_name]
+            operands = tuple(params) if isinstance(params, (tuple, list)) else (params,)
+
+            if gate_name in MACRO_GATES:
+                # register bounds and marked value / target, checked per macro
+                validate_macro(gate_name, operands, num_qubits)
+            else:
+                if len(operands) != GATE_ARITY[opcode]:
+                    raise ValueError(f"{gate_name} takes {GATE_ARITY[opcode]} qubit(s), got {operands}")
+                # multi qubit gates wider than the circuit are skipped, same as create_circuit
+                if len(operands) > num_qubits:
+                    continue
+                if any(not 0 <= q < num_qubits for q in operands):
+                    raise ValueError(f"{gate_name} on {operands} is out of range for {num_qubits} qubit(s)")
+                # a conditioned gate may target the qubit its bit was measured from
+                if gate_name not in ('CondX', 'CondZ') and len(set(operands)) != len(operands):
+                    raise ValueError(f"{gate_name} needs distinct qubits, got {operands}")
+
+            gates['op'][count] = opcode
+            gates['qubits'][count, :len(operands)] = operands
+            count += 1
+
+        return cls(num_qubits, gates[:count])
+
+    def to_gate_sequence(self):
+        sequence = []
+        for opcode, qubits in zip(self.gates['op'].tolist(), self.gates['qubits'].tolist()):
+            operands = qubits[:GATE_ARITY[opcode]]
+            params = operands[0] if len(operands) == 1 else tuple(operands)
+            sequence.append((GATE_NAMES[opcode], params))
+        return sequence
+
+    def has_macros(self):
+        return bool(np.isin(self.gates['op'], MACRO_OPCODES).any())
+
+    def is_dynamic(self):
+        # any measurement, reset or classically conditioned gate
+        return bool(np.isin(self.gates['op'], DYNAMIC_OPCODES).any())
+
+    def relabeled(self):
+        # (circuit without SWAPs, layout) with layout[q] the qubit that holds logical qubit q.
+        # a SWAP only exchanges two entries of the map and later gates act on the mapped
+        # qubits, so no amplitudes move until the layout is resolved once at the end.
+        # macro registers are qubit ranges a layout would scatter and classical bits are tied
+        # to the qubit they were measured from, so those circuits keep their SWAPs
+        if self.has_macros():
+            raise ValueError("Circuits with macro gates can not be relabeled")
+        if self.is_dynamic():
+            raise ValueError("Circuits with measurements or resets can not be relabeled")
+        layout = list(range(self.num_qubits))
+        gates = self.gates.copy()
+        is_swap = gates['op'] == OPCODES['SWAP']
+
+        for position, (opcode, qubits) in enumerate(zip(self.gates['op'].tolist(),
+                                                        self.gates['qubits'].tolist())):
+            if opcode == OPCODES['SWAP']:
+                first, second = qubits[:2]
+                layout[first], layout[second] = layout[second], layout[first]
+            else:
+                arity = GATE_ARITY[opcode]
+                gates['qubits'][position, :arity] = [layout[q] for q in qubits[:arity]]
+
+        return CompactCircuit(self.num_qubits, gates[~is_swap]), tuple(layout)
+
+    def to_circuit(self, save_statevector=True):
+        circuit = QuantumCircuit(self.num_qubits)
+        for opcode, qubits in zip(self.gates['op'].tolist(), self.gates['qubits'].tolist()):
+            _APPLY[opcode](circuit, *qubits[:GATE_ARITY[opcode]])
+
+        if save_statevector:
+            circuit.save_statevector()
+        return circuit
+
+    # serialization
+    def to_bytes(self):
+        return _HEADER.pack(_MAGIC, self.num_qubits, len(self.gates)) + self.gates.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < _HEADER.size:
+            raise ValueError("Circuit data is truncated")
+        magic, num_qubits, num_gates = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("Not a serialized circuit")
+        if len(data) != _HEADER.size + num_gates * GATE_DTYPE.itemsize:
+            raise ValueError("Circuit data is truncated")
+
+        if not 1 <= num_qubits < NO_QUBIT:
+            raise ValueError(f"Circuit data has an invalid qubit count {num_qubits}")
+
+        gates = np.frombuffer(data, dtype=GATE_DTYPE, offset=_HEADER.size)
+        if np.any(gates['op'] >= len(GATE_NAMES)):
+            raise ValueError("Circuit data contains unknown gates")
+        # operands get the same checks as a gate sequence (range, distinct qubits, macro
+        # registers, padding), so a crafted token never reaches a simulator
+        circuit = cls(num_qubits, gates)
+        if circuit != cls.from_gate_sequence(num_qubits, circuit.to_gate_sequence()):
+            raise ValueError("Circuit data contains invalid operands")
+        return circuit
+
+    def to_url_token(self):
+        compressed = zlib.compress(self.to_bytes(), 9)
+        return base64.urlsafe_b64encode(compressed).decode('ascii').rstrip('=')
+
+    @classmethod
+    def from_url_token(cls, token):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            data = zlib.decompress(base64.urlsafe_b64decode(padded.encode('ascii')))
+        except (ValueError, zlib.error) as e:
+            raise ValueError(f"Invalid circuit token: {e}") from e
+        return cls.from_bytes(data)
+
+    # cheap comparisons
+    def common_prefix_length(self, other):
+        # number of leading gates two circuits share (one vectorized compare)
+        n = min(len(self.gates), len(other.gates))
+        mismatch = np.flatnonzero(self.gates[:n] != other.gates[:n])
+        return int(mismatch[0]) if len(mismatch) else n
+
+    def gate_counts(self):
+        counts = np.bincount(self.gates['op'], minlength=len(GATE_NAMES))
+        return {GATE_NAMES[op]: int(c) for op, c in enumerate(counts) if c}
+
+    def __len__(self):
+        return len(self.gates)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactCircuit):
+            return NotImplemented
+        return (self.fingerprint == other.fingerprint and self.num_qubits == other.num_qubits
+                and np.array_equal(self.gates, other.gates))
+
+    def __repr__(self):
+        return f"CompactCircuit(num_qubits={self.num_qubits}, gates={len(self)}, id={self.fingerprint[:12]})"
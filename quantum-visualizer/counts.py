@@ -0,0 +1,197 @@
+"""
+counts.py
+Array backed measurement counts.
+Outcomes are kept as a sorted integer array of big-endian basis indices (q0 is the most
+significant bit, so index order is label order) with a matching array of counts.
+Normalization, top-k, marginals and merging are vectorized; bitstring labels are only
+built for the entries actually displayed. Counts is a read only Mapping from labels to
+counts, so code written for qiskit style dicts keeps working.
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+
+
+
+
+# dense arrays (one entry per basis state) are only built up to this width
+MAX_DENSE_COUNT_QUBITS = 26
+
+
+
+
+
+def reverse_bits(indices, num_qubits):
+    # vectorized little endian <-> big endian basis index conversion
+    indices = np.asarray(indices, dtype=np.int64)
+    reversed_indices = np.zeros_like(indices)
+    for q in range(num_qubits):
+        reversed_indices |= ((indices >> q) & 1) << (num_qubits - 1 - q)
+    return reversed_indices
+
+
+def gather_bits(indices, source_bits):
+    # bit b of each result is bit source_bits[b] of the index (any qubit permutation;
+    # source_bits = n-1, ..., 0 is reverse_bits)
+    indices = np.asarray(indices, dtype=np.int64)
+    gathered = np.zeros_like(indices)
+    for bit, source in enumerate(source_bits):
+        gathered |= ((indices >> source) & 1) << bit
+    return gathered
+
+
+def _combine(indices, counts):
+    # sorted unique indices with the counts of duplicates summed, zero counts dropped
+    unique_indices, inverse = np.unique(indices, return_inverse=True)
+    summed = np.bincount(inverse.reshape(-1), weights=counts, minlength=len(unique_indices)).astype(np.int64)
+    keep = summed > 0
+    return unique_indices[keep], summed[keep]
+
+
+
+
+
+class Counts(Mapping):
+    def __init__(self, num_qubits, indices=(), counts=()):
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        counts = np.asarray(counts, dtype=np.int64).reshape(-1)
+        if len(indices) != len(counts):
+            raise ValueError("indices and counts must have the same length")
+        if len(indices) and (indices.min() < 0 or indices.max() >= 2 ** num_qubits):
+            raise ValueError(f"Basis index out of range for {num_qubits} qubit(s)")
+
+        self.num_qubits = int(num_qubits)
+        self.indices, self.counts = _combine(indices, counts)
+        self.indices.setflags(write=False)
+        self.counts.setflags(write=False)
+        self._labels = None
+
+    # constructors
+    @classmethod
+    def from_dict(cls, counts, num_qubits=None):
+        # big-endian bitstring labels -> Counts
+        if isinstance(counts, Counts):
+            return counts
+        labels = list(counts.keys())
+        if num_qubits is None:
+            if not labels:
+                raise ValueError("num_qubits is required for empty counts")
+            num_qubits = len(labels[0])
+        indices = np.fromiter((int(label, 2) for label in labels), dtype=np.int64, count=len(labels))
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(labels))
+        return cls(num_qubits, indices, values)
+
+    @classmethod
+    def from_qiskit(cls, counts, num_qubits):
+        # qiskit's raw counts (result.data()['counts'], hex keys of little-endian indices)
+        # or result.get_counts() bitstrings, converted without reversing any strings
+        keys = list(counts.keys())
+        base = 16 if keys and keys[0].startswith('0x') else 2
+        little_endian = np.fromiter((int(key.replace(' ', ''), base) for key in keys),
+                                    dtype=np.int64, count=len(keys))
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(keys))
+        return cls(num_qubits, reverse_bits(little_endian, num_qubits), values)
+
+    @classmethod
+    def from_samples(cls, num_qubits, indices):
+        # one big-endian index per shot
+        return cls(num_qubits, indices, np.ones(len(indices), dtype=np.int64))
+
+    @classmethod
+    def from_dense(cls, dense):
+        dense = np.asarray(dense, dtype=np.int64)
+        indices = np.flatnonzero(dense)
+        return cls(int(np.log2(len(dense))), indices, dense[indices])
+
+    # array views
+    @property
+    def shots(self):
+        return int(self.counts.sum())
+
+    def probabilities(self):
+        # aligned with self.indices
+        return self.counts / max(self.shots, 1)
+
+    def to_dense(self):
+        if self.num_qubits > MAX_DENSE_COUNT_QUBITS:
+            raise ValueError(f"A dense array for {self.num_qubits} qubits would not fit in memory")
+        dense = np.zeros(2 ** self.num_qubits, dtype=np.int64)
+        dense[self.indices] = self.counts
+        return dense
+
+    # vectorized operations
+    def top_k(self, k):
+        # Counts with the k most frequent outcomes (argpartition, no full sort)
+        if k >= len(self.counts):
+            return self
+        top = np.argpartition(self.counts, -k)[-k:]
+        return Counts(self.num_qubits, self.indices[top], self.counts[top])
+
+    def most_common(self, k=None):
+        # [(label, count)] by descending count, labels built for these entries only
+        order = np.argsort(-self.counts, kind='stable')
+        if k is not None:
+            order = order[:k]
+        return [(self.label(i), c) for i, c in zip(self.indices[order].tolist(), self.counts[order].tolist())]
+
+    def marginal(self, qubits):
+        # counts over a subset of qubits, in the given order (the first becomes the leftmost bit)
+        qubits = list(qubits)
+        if any(not 0 <= q < self.num_qubits for q in qubits):
+            raise ValueError(f"Qubits {qubits} are out of range for {self.num_qubits} qubit(s)")
+
+        width = len(qubits)
+        marginal_indices = np.zeros_like(self.indices)
+        for position, qubit in enumerate(qubits):
+            bit = (self.indices >> (self.num_qubits - 1 - qubit)) & 1
+            marginal_indices |= bit << (width - 1 - position)
+        return Counts(width, marginal_indices, self.counts)
+
+    def merge(self, *others):
+        # counts of several runs of the same circuit added together
+        for other in others:
+            if other.num_qubits != self.num_qubits:
+                raise ValueError("Can only merge counts over the same number of qubits")
+        return Counts(
+            self.num_qubits,
+            np.concatenate([self.indices] + [o.indices for o in others]),
+            np.concatenate([self.counts] + [o.counts for o in others])
+        )
+
+    def __add__(self, other):
+        if not isinstance(other, Counts):
+            return NotImplemented
+        return self.merge(other)
+
+    # labels (display only)
+    def label(self, index):
+        return format(index, f'0{self.num_qubits}b')
+
+    def labels(self):
+        if self._labels is None:
+            self._labels = [self.label(i) for i in self.indices.tolist()]
+        return self._labels
+
+    def to_dict(self):
+        return dict(zip(self.labels(), self.counts.tolist()))
+
+    # Mapping interface (label -> count)
+    def __getitem__(self, label):
+        try:
+            index = int(label, 2)
+        except (TypeError, ValueError):
+            raise KeyError(label) from None
+        position = np.searchsorted(self.indices, index)
+        if len(label) != self.num_qubits or position == len(self.indices) or self.indices[position] != index:
+            raise KeyError(label)
+        return int(self.counts[position])
+
+    def __iter__(self):
+        return iter(self.labels())
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __repr__(self):
+        return f"Counts(num_qubits={self.num_qubits}, outcomes={len(self)}, shots={self.shots})"
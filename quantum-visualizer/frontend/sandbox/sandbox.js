@@ -0,0 +1,516 @@
+// sandbox.js
+// Client side statevector simulator for the circuit sandbox component.
+// Mirrors sparse_sim.py: qubit q is bit q of the basis index (qiskit's little-endian
+// order), labels are shown big-endian (q0 leftmost) like the rest of the app.
+// Macro gates (macros.py) act on the register first..last; at sandbox sizes (3 qubits)
+// a direct DFT per register is as fast as an FFT.
+// Speaks the Streamlit component protocol directly, so no build step is needed.
+
+"use strict";
+
+const GATE_OPERANDS = {
+  H: ["qubit"], X: ["qubit"], Y: ["qubit"], Z: ["qubit"], S: ["qubit"], T: ["qubit"],
+  CNOT: ["control", "target"],
+  SWAP: ["qubit 1", "qubit 2"],
+  Toffoli: ["control 1", "control 2", "target"],
+  QFT: ["first", "last"],
+  IQFT: ["first", "last"],
+  Diffuser: ["first", "last"],
+  Oracle: ["first", "last", "marked"],
+  MCX: ["first", "last", "target"],
+  MCZ: ["first", "last"]
+};
+const MACRO_GATES = ["QFT", "IQFT", "Diffuser", "Oracle", "MCX", "MCZ"];
+
+const SQRT1_2 = Math.SQRT1_2;
+const SPHERE_SIZE = 180;
+const VIEW_ELEVATION = 20 * Math.PI / 180;
+const VIEW_AZIMUTH = 45 * Math.PI / 180;
+
+let numQubits = 1;
+let availableGates = [];
+let committedSequence = [];   // last sequence the server knows about
+let sequence = [];            // committed sequence plus the gates tried out here
+let state = null;
+let selectedGate = null;
+let lastArgs = null;
+
+
+// ---------------------------------------------------------------------------------
+// streamlit component protocol (what streamlit-component-lib does)
+function sendMessage(type, data) {
+  window.parent.postMessage(Object.assign({ isStreamlitMessage: true, type: type }, data), "*");
+}
+
+function setFrameHeight() {
+  sendMessage("streamlit:setFrameHeight", { height: document.body.scrollHeight + 10 });
+}
+
+window.addEventListener("message", function (event) {
+  if (event.data && event.data.type === "streamlit:render") {
+    onRender(event.data.args);
+  }
+});
+
+
+// ---------------------------------------------------------------------------------
+// simulator
+function initialState(n) {
+  const re = new Float64Array(1 << n);
+  const im = new Float64Array(1 << n);
+  re[0] = 1;
+  return { re: re, im: im };
+}
+
+function swapAmplitudes(s, i, j) {
+  let t = s.re[i]; s.re[i] = s.re[j]; s.re[j] = t;
+  t = s.im[i]; s.im[i] = s.im[j]; s.im[j] = t;
+}
+
+function forEachRegister(s, first, last, transform) {
+  // calls transform(indices) once per value of the qubits outside first..last, with the
+  // basis indices of the 2^width register values (register value k is indices[k])
+  const width = last - first + 1;
+  const registerMask = ((1 << width) - 1) << first;
+  for (let base = 0; base < s.re.length; base++) {
+    if (base & registerMask) continue;
+    const indices = [];
+    for (let k = 0; k < (1 << width); k++) indices.push(base | (k << first));
+    transform(indices);
+  }
+}
+
+function applyMacro(s, gate, operands) {
+  const first = operands[0], last = operands[1];
+  const re = s.re, im = s.im;
+  if (gate === "MCX") {
+    const controls = ((1 << (last - first + 1)) - 1) << first;
+    const target = 1 << operands[2];
+    for (let i = 0; i < re.length; i++) {
+      if ((i & controls) === controls && !(i & target)) swapAmplitudes(s, i, i | target);
+    }
+    return;
+  }
+  forEachRegister(s, first, last, function (indices) {
+    const size = indices.length;
+    const r = indices.map(function (i) { return re[i]; });
+    const v = indices.map(function (i) { return im[i]; });
+    if (gate === "QFT" || gate === "IQFT") {
+      // amplitude y = sum_x a_x e^(+-2 pi i xy / size) / sqrt(size)
+      const sign = gate === "QFT" ? 1 : -1;
+      const norm = 1 / Math.sqrt(size);
+      for (let y = 0; y < size; y++) {
+        let sr = 0, si = 0;
+        for (let x = 0; x < size; x++) {
+          const angle = sign * 2 * Math.PI * x * y / size;
+          const c = Math.cos(angle), sn = Math.sin(angle);
+          sr += r[x] * c - v[x] * sn;
+          si += r[x] * sn + v[x] * c;
+        }
+        re[indices[y]] = sr * norm;
+        im[indices[y]] = si * norm;
+      }
+    } else if (gate === "Diffuser") {
+      // 2|s><s| - I: reflect every amplitude about the register mean
+      const mr = r.reduce(function (a, b) { return a + b; }, 0) / size;
+      const mi = v.reduce(function (a, b) { return a + b; }, 0) / size;
+      indices.forEach(function (i, k) { re[i] = 2 * mr - r[k]; im[i] = 2 * mi - v[k]; });
+    } else if (gate === "Oracle" || gate === "MCZ") {
+      const flipped = indices[gate === "Oracle" ? operands[2] : size - 1];
+      re[flipped] = -re[flipped];
+      im[flipped] = -im[flipped];
+    } else {
+      throw new Error("Unknown gate " + gate);
+    }
+  });
+}
+
+function applyGate(s, gate, qubits) {
+  if (MACRO_GATES.indexOf(gate) >= 0) {
+    applyMacro(s, gate, qubits);
+    return;
+  }
+  const dim = s.re.length;
+  const re = s.re;
+  const im = s.im;
+  const m = 1 << qubits[0];
+
+  switch (gate) {
+    case "H":
+      for (let i = 0; i < dim; i++) {
+        if (i & m) continue;
+        const j = i | m;
+        const r0 = re[i], i0 = im[i], r1 = re[j], i1 = im[j];
+        re[i] = (r0 + r1) * SQRT1_2; im[i] = (i0 + i1) * SQRT1_2;
+        re[j] = (r0 - r1) * SQRT1_2; im[j] = (i0 - i1) * SQRT1_2;
+      }
+      break;
+    case "X":
+      for (let i = 0; i < dim; i++) {
+        if (!(i & m)) swapAmplitudes(s, i, i | m);
+      }
+      break;
+    case "Y":
+      // Y|0> = i|1>, Y|1> = -i|0>
+      for (let i = 0; i < dim; i++) {
+        if (i & m) continue;
+        const j = i | m;
+        const r0 = re[i], i0 = im[i], r1 = re[j], i1 = im[j];
+        re[i] = i1; im[i] = -r1;
+        re[j] = -i0; im[j] = r0;
+      }
+      break;
+    case "Z":
+    case "S":
+    case "T": {
+      // phase on the |1> component
+      const c = { Z: -1, S: 0, T: SQRT1_2 }[gate];
+      const sn = { Z: 0, S: 1, T: SQRT1_2 }[gate];
+      for (let i = 0; i < dim; i++) {
+        if (!(i & m)) continue;
+        const r = re[i], v = im[i];
+        re[i] = r * c - v * sn;
+        im[i] = r * sn + v * c;
+      }
+      break;
+    }
+    case "CNOT":
+    case "Toffoli": {
+      const controls = qubits.slice(0, -1).reduce((mask, q) => mask | (1 << q), 0);
+      const target = 1 << qubits[qubits.length - 1];
+      for (let i = 0; i < dim; i++) {
+        if ((i & controls) === controls && !(i & target)) swapAmplitudes(s, i, i | target);
+      }
+      break;
+    }
+    case "SWAP": {
+      const m2 = 1 << qubits[1];
+      for (let i = 0; i < dim; i++) {
+        if ((i & m) && !(i & m2)) swapAmplitudes(s, i, i ^ m ^ m2);
+      }
+      break;
+    }
+    default:
+      throw new Error("Unknown gate " + gate);
+  }
+}
+
+function simulate(n, gates) {
+  const s = initialState(n);
+  gates.forEach(function (g) { applyGate(s, g[0], operandsOf(g)); });
+  return s;
+}
+
+function operandsOf(g) {
+  return Array.isArray(g[1]) ? g[1] : [g[1]];
+}
+
+function blochVector(s, qubit) {
+  // from rho_01 = sum_{bit q = 0} psi_i conj(psi_i|m): x = 2 Re, y = -2 Im, z = P0 - P1
+  const m = 1 << qubit;
+  let x = 0, y = 0, z = 0;
+  for (let i = 0; i < s.re.length; i++) {
+    const p = s.re[i] * s.re[i] + s.im[i] * s.im[i];
+    if (i & m) {
+      z -= p;
+      continue;
+    }
+    z += p;
+    const j = i | m;
+    x += 2 * (s.re[i] * s.re[j] + s.im[i] * s.im[j]);
+    y -= 2 * (s.im[i] * s.re[j] - s.re[i] * s.im[j]);
+  }
+  return [x, y, z];
+}
+
+function bigEndianLabel(index, n) {
+  return index.toString(2).padStart(n, "0").split("").reverse().join("");
+}
+
+
+// ---------------------------------------------------------------------------------
+// drawing
+function project(x, y, z) {
+  // same view as the app's spheres (elevation 20, azimuth 45): screen right, up
+  const ca = Math.cos(VIEW_AZIMUTH), sa = Math.sin(VIEW_AZIMUTH);
+  const ce = Math.cos(VIEW_ELEVATION), se = Math.sin(VIEW_ELEVATION);
+  return [-x * sa + y * ca, -(x * ca + y * sa) * se + z * ce];
+}
+
+function drawPath(ctx, points, toScreen) {
+  ctx.beginPath();
+  points.forEach(function (p, k) {
+    const xy = toScreen(p);
+    if (k === 0) ctx.moveTo(xy[0], xy[1]); else ctx.lineTo(xy[0], xy[1]);
+  });
+  ctx.stroke();
+}
+
+function drawSphere(canvas, vector) {
+  const ctx = canvas.getContext("2d");
+  const size = canvas.width;
+  const radius = size * 0.33;
+  const center = size / 2;
+  const toScreen = function (p) {
+    const uv = project(p[0], p[1], p[2]);
+    return [center + radius * uv[0], center - radius * uv[1]];
+  };
+  ctx.clearRect(0, 0, size, size);
+
+  ctx.fillStyle = "rgba(0, 255, 255, 0.08)";
+  ctx.strokeStyle = "rgba(128, 128, 128, 0.5)";
+  ctx.beginPath();
+  ctx.arc(center, center, radius, 0, 2 * Math.PI);
+  ctx.fill();
+  ctx.stroke();
+
+  const circle = [];
+  const meridianXZ = [];
+  const meridianYZ = [];
+  for (let k = 0; k <= 64; k++) {
+    const t = 2 * Math.PI * k / 64;
+    circle.push([Math.cos(t), Math.sin(t), 0]);
+    meridianXZ.push([Math.sin(t), 0, Math.cos(t)]);
+    meridianYZ.push([0, Math.sin(t), Math.cos(t)]);
+  }
+  ctx.strokeStyle = "rgba(128, 128, 128, 0.3)";
+  [circle, meridianXZ, meridianYZ].forEach(function (path) { drawPath(ctx, path, toScreen); });
+
+  ctx.font = "bold 12px sans-serif";
+  [[[1.3, 0, 0], "red", "X"], [[0, 1.3, 0], "green", "Y"], [[0, 0, 1.3], "blue", "Z"]].forEach(function (axis) {
+    ctx.strokeStyle = axis[1];
+    ctx.fillStyle = axis[1];
+    drawPath(ctx, [[0, 0, 0], axis[0]], toScreen);
+    const end = toScreen(axis[0].map(function (c) { return c * 1.1; }));
+    ctx.fillText(axis[2], end[0] - 4, end[1] + 4);
+  });
+  ctx.fillStyle = "#31333f";
+  ctx.font = "12px sans-serif";
+  let label = toScreen([0, 0, 1.45]);
+  ctx.fillText("|0⟩", label[0] - 8, label[1]);
+  label = toScreen([0, 0, -1.55]);
+  ctx.fillText("|1⟩", label[0] - 8, label[1] + 8);
+
+  const length = Math.hypot(vector[0], vector[1], vector[2]);
+  if (length > 0.01) {
+    ctx.strokeStyle = "purple";
+    ctx.fillStyle = "purple";
+    ctx.lineWidth = 3;
+    drawPath(ctx, [[0, 0, 0], vector], toScreen);
+    ctx.lineWidth = 1;
+    const tip = toScreen(vector);
+    ctx.beginPath();
+    ctx.arc(tip[0], tip[1], 4, 0, 2 * Math.PI);
+    ctx.fill();
+  }
+  return length;
+}
+
+
+// ---------------------------------------------------------------------------------
+// ui
+function element(tag, attributes, text) {
+  const node = document.createElement(tag);
+  Object.keys(attributes || {}).forEach(function (name) { node.setAttribute(name, attributes[name]); });
+  if (text !== undefined) node.textContent = text;
+  return node;
+}
+
+function registerLabel(value, width) {
+  // big-endian over the register, its first qubit leftmost (like macros.marked_label)
+  let bits = "";
+  for (let k = 0; k < width; k++) bits += (value >> k) & 1;
+  return bits;
+}
+
+function formatGate(g) {
+  const operands = operandsOf(g);
+  if (MACRO_GATES.indexOf(g[0]) >= 0) {
+    let text = g[0] + " q" + operands[0] + "..q" + operands[1];
+    if (g[0] === "Oracle") text += ", |" + registerLabel(operands[2], operands[1] - operands[0] + 1) + "⟩";
+    if (g[0] === "MCX") text += " → q" + operands[2];
+    return text;
+  }
+  return g[0] + " " + operands.map(function (q) { return "q" + q; }).join(", ");
+}
+
+function operandError(gate, operands) {
+  // same rules as circuit_ir / macros.validate_macro, checked before the gate is applied
+  if (MACRO_GATES.indexOf(gate) < 0) {
+    return new Set(operands).size !== operands.length ? gate + " needs distinct qubits" : "";
+  }
+  const first = operands[0], last = operands[1];
+  if (first >= last) return gate + " needs a register of 2 or more qubits (first before last)";
+  if (gate === "MCX" && operands[2] >= first && operands[2] <= last) {
+    return "The MCX target must be outside the register";
+  }
+  if (gate === "Oracle" && operands[2] >= (1 << (last - first + 1))) {
+    return "The marked value does not fit the register";
+  }
+  return "";
+}
+
+function renderGateButtons() {
+  const container = document.getElementById("gates");
+  container.innerHTML = "";
+  availableGates.forEach(function (gate) {
+    const button = element("button", gate === selectedGate ? { class: "selected" } : {}, gate);
+    button.onclick = function () {
+      selectedGate = gate;
+      renderGateButtons();
+      renderOperandSelects();
+    };
+    container.appendChild(button);
+  });
+}
+
+function renderOperandSelects() {
+  const container = document.getElementById("operands");
+  container.innerHTML = "";
+  GATE_OPERANDS[selectedGate].forEach(function (name, position) {
+    const select = element("select", { "data-operand": position, title: name });
+    if (name === "marked") {
+      container.appendChild(select);
+      return;
+    }
+    for (let q = 0; q < numQubits; q++) {
+      select.appendChild(element("option", { value: q }, name + ": q" + q));
+    }
+    // distinct defaults (control q0, target q1, ...)
+    select.value = Math.min(position, numQubits - 1);
+    select.onchange = renderMarkedOptions;
+    container.appendChild(select);
+  });
+  renderMarkedOptions();
+}
+
+function renderMarkedOptions() {
+  // the oracle's marked values depend on the register width
+  const select = document.querySelector('#operands select[title="marked"]');
+  if (!select) return;
+  const operands = selectedOperands();
+  const width = Math.max(operands[1] - operands[0] + 1, 1);
+  const previous = Number(select.value) || 0;
+  select.innerHTML = "";
+  for (let value = 0; value < (1 << width); value++) {
+    select.appendChild(element("option", { value: value }, "marked: |" + registerLabel(value, width) + "⟩"));
+  }
+  select.value = Math.min(previous, (1 << width) - 1);
+}
+
+function selectedOperands() {
+  return Array.from(document.querySelectorAll("#operands select")).map(function (s) { return Number(s.value); });
+}
+
+function renderState() {
+  const sequenceBox = document.getElementById("sequence");
+  sequenceBox.innerHTML = "";
+  sequence.forEach(function (g, k) {
+    sequenceBox.appendChild(element("span", { class: k < committedSequence.length ? "chip" : "chip pending" },
+      (k + 1) + ". " + formatGate(g)));
+  });
+
+  const pending = !sameSequence(sequence, committedSequence);
+  document.getElementById("commit").disabled = !pending;
+  document.getElementById("reset").disabled = !pending;
+  document.getElementById("undo").disabled = sequence.length === 0;
+  document.getElementById("status").textContent = pending
+    ? "Simulated in the browser, commit to run the full analysis on the server"
+    : "In sync with the server";
+
+  const spheres = document.getElementById("spheres");
+  spheres.innerHTML = "";
+  for (let q = 0; q < numQubits; q++) {
+    const box = element("div", { class: "sphere" });
+    const canvas = element("canvas", { width: SPHERE_SIZE, height: SPHERE_SIZE });
+    const vector = blochVector(state, q);
+    const length = drawSphere(canvas, vector);
+    box.appendChild(element("div", {}, "Qubit " + q + " (|r|=" + length.toFixed(3) + ")"));
+    box.appendChild(canvas);
+    box.appendChild(element("div", {}, vector.map(function (c, k) {
+      return "XYZ"[k] + ": " + c.toFixed(3);
+    }).join("  ")));
+    spheres.appendChild(box);
+  }
+
+  const probabilities = document.getElementById("probabilities");
+  probabilities.innerHTML = "";
+  const rows = [];
+  for (let i = 0; i < state.re.length; i++) {
+    rows.push([bigEndianLabel(i, numQubits), state.re[i] * state.re[i] + state.im[i] * state.im[i]]);
+  }
+  rows.sort(function (a, b) { return a[0] < b[0] ? -1 : 1; });
+  rows.forEach(function (row) {
+    const line = element("div", { class: "probability" });
+    line.appendChild(element("span", {}, "|" + row[0] + "⟩"));
+    const track = element("div");
+    track.appendChild(element("div", { class: "bar", style: "width: " + (100 * row[1]).toFixed(2) + "%" }));
+    line.appendChild(track);
+    line.appendChild(element("span", {}, (100 * row[1]).toFixed(1) + "%"));
+    probabilities.appendChild(line);
+  });
+
+  setFrameHeight();
+}
+
+function sameSequence(a, b) {
+  return JSON.stringify(a) === JSON.stringify(b);
+}
+
+function showError(message) {
+  document.getElementById("error").textContent = message || "";
+}
+
+document.getElementById("apply").onclick = function () {
+  const operands = selectedOperands();
+  const error = operandError(selectedGate, operands);
+  if (error) {
+    showError(error);
+    return;
+  }
+  showError();
+  const gate = [selectedGate, operands.length === 1 ? operands[0] : operands];
+  sequence.push(gate);
+  applyGate(state, gate[0], operands);
+  renderState();
+};
+
+document.getElementById("undo").onclick = function () {
+  sequence.pop();
+  state = simulate(numQubits, sequence);
+  renderState();
+};
+
+document.getElementById("reset").onclick = function () {
+  sequence = committedSequence.slice();
+  state = simulate(numQubits, sequence);
+  renderState();
+};
+
+document.getElementById("commit").onclick = function () {
+  // the only message that reaches the server (and reruns the app)
+  sendMessage("streamlit:setComponentValue", {
+    value: { commit: Date.now(), gate_sequence: sequence },
+    dataType: "json"
+  });
+};
+
+function onRender(args) {
+  // every app rerun renders again; only a new circuit from the server resets local edits
+  const key = JSON.stringify([args.num_qubits, args.gates, args.gate_sequence]);
+  if (key === lastArgs) return;
+  lastArgs = key;
+
+  numQubits = args.num_qubits;
+  availableGates = args.gates;
+  committedSequence = args.gate_sequence;
+  sequence = committedSequence.slice();
+  state = simulate(numQubits, sequence);
+  if (availableGates.indexOf(selectedGate) < 0) selectedGate = availableGates[0];
+
+  renderGateButtons();
+  renderOperandSelects();
+  renderState();
+}
+
+sendMessage("streamlit:componentReady", { apiVersion: 1 });
@@ -2,9 +2,18 @@
 gates.py
 Defines quantum gate operations and circuit building functions.
 Supports 1, 2, and 3 qubit circuits with various gate operations.
+Macro gates (see macros.py) are appended as single boxes and only expanded into
+primitive gates for Aer (expand_macros).
+Mid-circuit measurement, reset and classically conditioned X / Z make a circuit dynamic;
+qubit k is always measured into classical bit k of a register 'c' added on first use.
 """
 
-from qiskit import QuantumCircuit
+from math import pi
+
+from qiskit import QuantumCircuit, ClassicalRegister
+from qiskit.circuit import Gate
+
+from macros import marked_label
 
 
 
@@ -51,17 +60,148 @@ def apply_t_gate(circuit, qubit):
 
 
 
+# macro gates, each on the register first..last
+class MacroGate(Gate):
+    # one box in the circuit diagram; the primitive gates behind it are only built
+    # when something asks for the definition (expand_macros, transpile). the oracle's
+    # name carries the marked value, so circuit fingerprints tell oracles apart
+    def __init__(self, macro, width, marked=None):
+        name, label = macro.lower(), _MACRO_LABELS.get(macro)
+        if macro == 'Oracle':
+            bits = marked_label(marked, width)
+            name, label = f"oracle_{bits}", f"Oracle |{bits}⟩"
+        super().__init__(name, width, [], label=label)
+        self.macro = macro
+        self.marked = marked
+
+    def _define(self):
+        arguments = (self.marked,) if self.macro == 'Oracle' else ()
+        self.definition = _MACRO_DEFINITIONS[self.macro](self.num_qubits, *arguments)
+
+
+def _qft_definition(width):
+    # textbook QFT (qubit 0 is the least significant bit), the final swaps included
+    definition = QuantumCircuit(width, name='QFT')
+    for j in reversed(range(width)):
+        definition.h(j)
+        for k in reversed(range(j)):
+            definition.cp(pi / 2 ** (j - k), k, j)
+    for k in range(width // 2):
+        definition.swap(k, width - 1 - k)
+    return definition
+
+
+def _diffuser_definition(width):
+    # H X (I - 2|1..1><1..1|) X H = I - 2|s><s|, the global phase makes it 2|s><s| - I
+    definition = QuantumCircuit(width, name='Diffuser', global_phase=pi)
+    definition.h(range(width))
+    definition.x(range(width))
+    definition.mcp(pi, list(range(width - 1)), width - 1)
+    definition.x(range(width))
+    definition.h(range(width))
+    return definition
+
+
+def _oracle_definition(width, marked):
+    # phase flip of the marked value: map it to |1..1>, flip, map back
+    definition = QuantumCircuit(width, name='Oracle')
+    zeros = [k for k in range(width) if not (int(marked) >> k) & 1]
+    if zeros:
+        definition.x(zeros)
+    definition.mcp(pi, list(range(width - 1)), width - 1)
+    if zeros:
+        definition.x(zeros)
+    return definition
+
+
+_MACRO_LABELS = {'QFT': 'QFT', 'IQFT': 'QFT†', 'Diffuser': 'Diffuser'}
+_MACRO_DEFINITIONS = {
+    'QFT': _qft_definition,
+    'IQFT': lambda width: _qft_definition(width).inverse(),
+    'Diffuser': _diffuser_definition,
+    'Oracle': _oracle_definition
+}
+
+
+def apply_qft(circuit, first, last):
+    circuit.append(MacroGate('QFT', last - first + 1), range(first, last + 1))
+
+
+def apply_inverse_qft(circuit, first, last):
+    circuit.append(MacroGate('IQFT', last - first + 1), range(first, last + 1))
+
+
+def apply_diffuser(circuit, first, last):
+    circuit.append(MacroGate('Diffuser', last - first + 1), range(first, last + 1))
+
+
+def apply_oracle(circuit, first, last, marked):
+    circuit.append(MacroGate('Oracle', last - first + 1, marked), range(first, last + 1))
+
+
+def apply_mcx(circuit, first, last, target):
+    # qiskit's own multi-controlled gates already draw as one gate and aer runs them natively
+    circuit.mcx(list(range(first, last + 1)), target)
+
+
+def apply_mcz(circuit, first, last):
+    circuit.mcp(pi, list(range(first, last)), last)
+
+
+def _classical_bits(circuit):
+    # one classical bit per qubit, bit k holding the latest measurement of qubit k
+    if not circuit.num_clbits:
+        circuit.add_register(ClassicalRegister(circuit.num_qubits, 'c'))
+    return circuit.clbits
+
+
+def apply_measure(circuit, qubit):
+    circuit.measure(qubit, _classical_bits(circuit)[qubit])
+
+
+def apply_reset(circuit, qubit):
+    circuit.reset(qubit)
+
+
+def apply_conditional_x(circuit, bit, target):
+    # X on target if the latest measurement of qubit `bit` gave 1
+    with circuit.if_test((_classical_bits(circuit)[bit], 1)):
+        circuit.x(target)
+
+
+def apply_conditional_z(circuit, bit, target):
+    with circuit.if_test((_classical_bits(circuit)[bit], 1)):
+        circuit.z(target)
+
+
+def expand_macros(circuit):
+    # the circuit with its macro boxes replaced by primitive gates (aer has no QFT & co.)
+    if not any(isinstance(instruction.operation, MacroGate) for instruction in circuit.data):
+        return circuit
+    return circuit.decompose(gates_to_decompose=[MacroGate])
+
+
+
+
+
 
 
 
 
 # gate availability based on qubit count (defined before create_circuit)
 AVAILABLE_GATES = {
-    1: ['H', 'X', 'Y', 'Z', 'S', 'T'],
-    2: ['H', 'X', 'Y', 'Z', 'S', 'T', 'CNOT', 'SWAP'],
-    3: ['H', 'X', 'Y', 'Z', 'S', 'T', 'CNOT', 'SWAP', 'Toffoli']
+    1: ['H', 'X', 'Y', 'Z', 'S', 'T', 'Measure', 'Reset'],
+    2: ['H', 'X', 'Y', 'Z', 'S', 'T', 'CNOT', 'SWAP', 'QFT', 'IQFT', 'Diffuser', 'Oracle', 'MCZ',
+        'Measure', 'Reset', 'CondX', 'CondZ'],
+    3: ['H', 'X', 'Y', 'Z', 'S', 'T', 'CNOT', 'SWAP', 'Toffoli', 'QFT', 'IQFT', 'Diffuser', 'Oracle', 'MCX', 'MCZ',
+        'Measure', 'Reset', 'CondX', 'CondZ']
 }
 
+# non-unitary entries: Measure / Reset take a qubit, CondX / CondZ (bit, target) where bit
+# is the qubit whose latest measurement controls the gate. circuits with any of them are
+# simulated as measurement trajectories (trajectories.py) instead of one statevector
+DYNAMIC_GATES = ('Measure', 'Reset', 'CondX', 'CondZ')
+
 
 
 
@@ -95,6 +235,26 @@ def create_circuit(num_qubits, gate_sequence):
         elif gate_name == 'Toffoli' and num_qubits >= 3:
             control1, control2, target = gate_info[1]
             apply_toffoli(circuit, control1, control2, target)
+        elif gate_name == 'QFT' and num_qubits >= 2:
+            apply_qft(circuit, *gate_info[1])
+        elif gate_name == 'IQFT' and num_qubits >= 2:
+            apply_inverse_qft(circuit, *gate_info[1])
+        elif gate_name == 'Diffuser' and num_qubits >= 2:
+            apply_diffuser(circuit, *gate_info[1])
+        elif gate_name == 'Oracle' and num_qubits >= 2:
+            apply_oracle(circuit, *gate_info[1])
+        elif gate_name == 'MCX' and num_qubits >= 3:
+            apply_mcx(circuit, *gate_info[1])
+        elif gate_name == 'MCZ' and num_qubits >= 2:
+            apply_mcz(circuit, *gate_info[1])
+        elif gate_name == 'Measure':
+            apply_measure(circuit, gate_info[1])
+        elif gate_name == 'Reset':
+            apply_reset(circuit, gate_info[1])
+        elif gate_name == 'CondX' and num_qubits >= 2:
+            apply_conditional_x(circuit, *gate_info[1])
+        elif gate_name == 'CondZ' and num_qubits >= 2:
+            apply_conditional_z(circuit, *gate_info[1])
     
     # sv
     circuit.save_statevector()
@@ -102,6 +262,20 @@ def create_circuit(num_qubits, gate_sequence):
     return circuit
 
 
+def count_dynamic_operations(gates):
+    # (measurements + resets, conditioned gates) in a gate_sequence or QuantumCircuit.
+    # each measurement or reset can split the shots into two measurement histories
+    if isinstance(gates, QuantumCircuit):
+        names = [instruction.operation.name for instruction in gates.data]
+        return names.count('measure') + names.count('reset'), names.count('if_else')
+    names = [gate_name for gate_name, _ in gates]
+    return names.count('Measure') + names.count('Reset'), names.count('CondX') + names.count('CondZ')
+
+
+def is_dynamic(gates):
+    return any(count_dynamic_operations(gates))
+
+
 
 
 
@@ -115,6 +289,16 @@ def get_gate_description(gate_name):
         'T': 'T Gate - π/8 phase gate',
         'CNOT': 'CNOT - Controlled-NOT gate',
         'SWAP': 'SWAP - Exchange two qubits',
-        'Toffoli': 'Toffoli - Controlled-Controlled-NOT (CCNOT)'
+        'Toffoli': 'Toffoli - Controlled-Controlled-NOT (CCNOT)',
+        'QFT': 'QFT - Quantum Fourier transform of a qubit range',
+        'IQFT': 'IQFT - Inverse quantum Fourier transform of a qubit range',
+        'Diffuser': 'Diffuser - Grover diffusion (reflection about the uniform superposition)',
+        'Oracle': 'Oracle - Phase flip of one marked value of a qubit range',
+        'MCX': 'MCX - Multi-controlled NOT, controlled by a qubit range',
+        'MCZ': 'MCZ - Multi-controlled Z, phase flip when a qubit range is all ones',
+        'Measure': 'Measure - Mid-circuit measurement, collapses the qubit',
+        'Reset': 'Reset - Returns the qubit to |0⟩',
+        'CondX': 'CondX - X gate applied when an earlier measurement of a qubit gave 1',
+        'CondZ': 'CondZ - Z gate applied when an earlier measurement of a qubit gave 1'
     }
     return descriptions.get(gate_name, 'Unknown gate')
\ No newline at end of file
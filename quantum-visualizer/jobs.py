@@ -0,0 +1,236 @@
+"""
+jobs.py
+Background simulation jobs for app.py.
+Simulations run on a shared worker pool behind a per-session job handle. Rapid edits
+are debounced, jobs for an outdated circuit are cancelled, and results are only handed
+out if they still match the current circuit fingerprint.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils import run_circuit, get_measurement_counts
+from sparse_sim import SparseStatevector
+from trajectories import run_trajectories
+from precision import DEFAULT_PRECISION
+from result_store import result_key
+from kernels import resolve_layout
+
+
+
+
+MAX_SIMULATION_WORKERS = max(2, os.cpu_count() or 1)
+# an edit arriving within this many seconds of the previous one delays its simulation
+DEFAULT_DEBOUNCE = 0.3
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def get_simulation_executor():
+    # bounded pool shared by every session, so many users can not start unbounded work
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_SIMULATION_WORKERS,
+                                           thread_name_prefix='simulation')
+    return _executor
+
+
+
+
+
+class SimulationJob:
+    def __init__(self, key, task, delay=0.0):
+        self.key = key
+        self.progress = 0.0
+        self.stage = "Queued"
+        self.future = None
+        self._task = task
+        self._delay = delay
+        self._cancel = threading.Event()
+
+    def start(self, executor):
+        self.future = executor.submit(self._run)
+        return self
+
+    def _run(self):
+        # debounce: a newer edit cancels this job before any work is done
+        if self._cancel.wait(self._delay):
+            raise JobCancelled()
+        return self._task(self)
+
+    def report(self, progress, stage):
+        # called by the task between stages, doubles as the cancellation point
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.progress = progress
+        self.stage = stage
+
+    def cancel(self):
+        self._cancel.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def failed(self):
+        # finished with an error (cancellation is checked separately)
+        return self.done() and not self.future.cancelled() and self.future.exception() is not None
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+
+
+
+
+class SimulationManager:
+    # one per session: the job for the circuit currently on screen
+    def __init__(self, executor=None, debounce=DEFAULT_DEBOUNCE):
+        self._executor = executor or get_simulation_executor()
+        self._debounce = debounce
+        self._lock = threading.Lock()
+        self._last_submit = None
+        self.current = None
+
+    def submit(self, key, task):
+        with self._lock:
+            # reruns that did not change the circuit reuse the running / finished job; a job
+            # that failed is retried, so a transient error does not stick to the circuit
+            if (self.current is not None and self.current.key == key and not self.current.cancelled
+                    and not self.current.failed()):
+                return self.current
+
+            if self.current is not None and not self.current.done():
+                self.current.cancel()
+
+            now = time.monotonic()
+            recent_edit = self._last_submit is not None and now - self._last_submit < self._debounce
+            self._last_submit = now
+
+            self.current = SimulationJob(key, task, self._debounce if recent_edit else 0.0)
+            return self.current.start(self._executor)
+
+    def result(self, key, timeout=None):
+        # None if the circuit changed since the job for `key` was submitted
+        with self._lock:
+            job = self.current
+        if job is None or job.key != key:
+            return None
+        return job.result(timeout)
+
+    def cancel(self):
+        with self._lock:
+            if self.current is not None:
+                self.current.cancel()
+            self.current = None
+
+
+
+
+
+# methods where a SWAP moves amplitudes around, so lazy_swaps relabels instead
+LAZY_SWAP_METHODS = ('statevector', 'sparse')
+
+
+def simulation_task(circuit_ir, shots, store=None, method='statevector', precision=DEFAULT_PRECISION,
+                    lazy_swaps=True, sample_counts=True):
+    # statevector + counts for one circuit, reporting progress between the stages.
+    # with a ResultStore, circuits any process simulated before are read back from disk.
+    # method is the planner's choice: 'sparse' runs the sparse engine, 'trajectories' the
+    # measurement history engine for dynamic circuits (always with counts; the statevector
+    # and 'history' are those of the most common measurement history), anything else aer.
+    # lazy_swaps simulates the circuit with its SWAPs folded into a qubit layout and
+    # resolves the layout with one permutation at the end. without sample_counts the
+    # counts stage is skipped ('counts' is None) for callers sampling progressively
+    def task(job):
+        simulated, layout = circuit_ir, None
+        if (lazy_swaps and method in LAZY_SWAP_METHODS and 'SWAP' in circuit_ir.gate_counts()
+                and not circuit_ir.has_macros() and not circuit_ir.is_dynamic()):
+            simulated, layout = circuit_ir.relabeled()
+
+        extra = {}
+        if method == 'trajectories':
+            job.report(0.3, "Simulating measurement histories")
+            trajectories = run_trajectories(simulated, shots, precision=precision)
+            statevector, counts = trajectories.pop('statevector'), trajectories.pop('counts')
+            extra = trajectories
+        elif method == 'sparse':
+            statevector, counts = _sparse_results(job, simulated, shots, store, precision, sample_counts)
+        else:
+            job.report(0.1, "Building circuit")
+            circuit = simulated.to_circuit()
+
+            job.report(0.3, "Simulating statevector")
+            results = run_circuit(circuit, shots=shots, method=method, store=store, precision=precision)
+
+            counts = None
+            if sample_counts:
+                job.report(0.7, "Sampling measurements")
+                counts = get_measurement_counts(circuit, shots=shots, method=method, store=store,
+                                                precision=precision)
+            statevector = np.asarray(results['statevector'])
+
+        if layout is not None:
+            job.report(0.9, "Resolving qubit layout")
+            statevector = resolve_layout(statevector, layout)
+            # counts only need the occupied outcomes relabeled (q0 takes qubit layout[0], ...)
+            if counts is not None:
+                counts = counts.marginal(layout)
+
+        job.report(1.0, "Done")
+        return {
+            'fingerprint': circuit_ir.fingerprint,
+            'statevector': statevector,
+            'counts': counts,
+            **extra
+        }
+
+    return task
+
+
+def _sparse_results(job, circuit_ir, shots, store, precision, sample_counts):
+    # sparse engine run, stored under the same kind of keys as run_circuit /
+    # get_measurement_counts so other sessions and processes read it back from disk
+    state_key = counts_key = None
+    statevector = counts = None
+    if store is not None:
+        state_key = result_key(circuit_ir.fingerprint, method='sparse', data='statevector', precision=precision)
+        counts_key = result_key(circuit_ir.fingerprint, method='sparse', shots=shots, data='counts',
+                                precision=precision)
+        statevector = store.get_array(state_key)
+        if sample_counts:
+            counts = store.get_counts(counts_key)
+    if statevector is not None and (counts is not None or not sample_counts):
+        return statevector, counts
+
+    job.report(0.3, "Simulating sparse statevector")
+    state = SparseStatevector.from_gate_sequence(circuit_ir.num_qubits, circuit_ir.to_gate_sequence(),
+                                                 precision=precision)
+    if statevector is None:
+        statevector = state.to_dense()
+        if state_key is not None:
+            store.put_array(state_key, statevector)
+    if sample_counts and counts is None:
+        job.report(0.7, "Sampling measurements")
+        counts = state.sample_counts(shots)
+        if counts_key is not None:
+            store.put_counts(counts_key, counts)
+    return statevector, counts
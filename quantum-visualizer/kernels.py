@@ -0,0 +1,161 @@
+"""
+kernels.py
+Thread-parallel passes over dense statevectors.
+The amplitude array is split into contiguous blocks that worker threads process
+independently. Every per-block operation is a NumPy ufunc, gather, reduction or BLAS
+dot, all of which release the GIL, so 20+ qubit statevectors use every core. Arrays
+below PARALLEL_THRESHOLD are handled in one call on the calling thread, where the
+pool would only add overhead.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from counts import gather_bits
+
+
+
+
+# worker threads per kernel call, configurable per deployment (0 / unset = all cores)
+KERNEL_THREADS_ENV = 'QUBITLAB_KERNEL_THREADS'
+DEFAULT_KERNEL_THREADS = int(os.environ.get(KERNEL_THREADS_ENV, 0) or 0) or (os.cpu_count() or 1)
+
+# amplitudes below which an array is not split (2^16: dispatch costs more than it saves)
+PARALLEL_THRESHOLD = 2 ** 16
+# largest block, keeps the per-block temporaries small (2^18 complex128 = 4 MiB)
+MAX_BLOCK = 2 ** 18
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+
+
+
+def get_kernel_executor(threads=DEFAULT_KERNEL_THREADS):
+    # one pool per thread count and process, shared by every session
+    with _executors_lock:
+        if threads not in _executors:
+            _executors[threads] = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='kernel')
+    return _executors[threads]
+
+
+def num_blocks(size, threads=DEFAULT_KERNEL_THREADS):
+    # power of two number of equal blocks: at least one per thread, none above MAX_BLOCK
+    if threads <= 1 or size < PARALLEL_THRESHOLD:
+        return 1
+    blocks = 1
+    while blocks < size and (blocks < threads or size // blocks > MAX_BLOCK):
+        blocks *= 2
+    return blocks
+
+
+def _run_blocks(func, size, threads):
+    # func(start, stop) for every block, in block order
+    blocks = num_blocks(size, threads)
+    if blocks == 1:
+        return [func(0, size)]
+    step = size // blocks
+    return list(get_kernel_executor(threads).map(lambda start: func(start, start + step),
+                                                 range(0, size, step)))
+
+
+
+
+
+def amplitude_probabilities(statevector, threads=DEFAULT_KERNEL_THREADS):
+    # |amplitude|^2 in the statevector's precision (float32 for complex64)
+    sv = np.asarray(statevector)
+    out = np.empty(len(sv), dtype=sv.real.dtype)
+
+    def block(start, stop):
+        np.abs(sv[start:stop], out=out[start:stop])
+        np.square(out[start:stop], out=out[start:stop])
+
+    _run_blocks(block, len(sv), threads)
+    return out
+
+
+def to_big_endian(statevector, num_qubits, threads=DEFAULT_KERNEL_THREADS):
+    # qiskit's little-endian order -> big-endian
+    return _gather(np.asarray(statevector), range(num_qubits - 1, -1, -1), threads)
+
+
+def resolve_layout(statevector, layout, big_endian=False, threads=DEFAULT_KERNEL_THREADS):
+    # state with logical qubit q stored at qubit layout[q] (CompactCircuit.relabeled) ->
+    # logical little-endian order, or big-endian with both relabelings in one gather
+    source_bits = list(layout)[::-1] if big_endian else list(layout)
+    return _gather(np.asarray(statevector), source_bits, threads)
+
+
+def _gather(sv, source_bits, threads):
+    # out[j] = sv[i] where bit b of j is stored at bit source_bits[b] of i. every block
+    # gathers its own output slice, so no two threads write the same entry
+    source_bits = list(source_bits)
+    inverse = [0] * len(source_bits)
+    for bit, source in enumerate(source_bits):
+        inverse[source] = bit
+    out = np.empty_like(sv)
+
+    def block(start, stop):
+        # mode='clip' writes into out directly ('raise' buffers it), the indices are in range
+        np.take(sv, gather_bits(np.arange(start, stop), inverse), out=out[start:stop], mode='clip')
+
+    _run_blocks(block, len(sv), threads)
+    return out
+
+
+def reduced_density_matrices(statevector, num_qubits, threads=DEFAULT_KERNEL_THREADS):
+    # (n, 2, 2) single qubit reduced density matrices, entry q for qiskit's qubit q,
+    # straight from the statevector (no 4^n density matrix), in the statevector's precision
+    sv = np.asarray(statevector)
+    return _reduce(sv, num_qubits, threads).astype(np.result_type(sv, np.complex64), copy=False)
+
+
+def bloch_vectors(statevector, num_qubits, threads=DEFAULT_KERNEL_THREADS):
+    # (n, 3) Bloch vectors from the reduced density matrices: rho_01 = (x - iy) / 2
+    rho = _reduce(np.asarray(statevector), num_qubits, threads)
+    return np.stack([2 * rho[:, 0, 1].real, -2 * rho[:, 0, 1].imag,
+                     (rho[:, 0, 0] - rho[:, 1, 1]).real], axis=1)
+
+
+def _reduce(sv, num_qubits, threads):
+    # reduced density matrices summed in double precision. qubits below the block size
+    # pair amplitudes inside a block, the others pair whole blocks with one dot product
+    blocks = num_blocks(len(sv), threads)
+    size = len(sv) // blocks
+    local_qubits = num_qubits - (blocks.bit_length() - 1)
+
+    def block(start, stop):
+        amplitudes = sv[start:stop]
+        weights = np.abs(amplitudes) ** 2
+        local = np.zeros((local_qubits, 2, 2), dtype=np.complex128)
+        for q in range(local_qubits):
+            pairs = amplitudes.reshape(-1, 2, 2 ** q)
+            pair_weights = weights.reshape(-1, 2, 2 ** q)
+            local[q, 0, 0] = pair_weights[:, 0].sum()
+            local[q, 1, 1] = pair_weights[:, 1].sum()
+            local[q, 0, 1] = (pairs[:, 0] * pairs[:, 1].conj()).sum()
+
+        # <partner|block> for the block qubits that are 0 here, partner has that bit set
+        index = start // size
+        cross = np.zeros(num_qubits - local_qubits, dtype=np.complex128)
+        for bit in range(num_qubits - local_qubits):
+            if not index >> bit & 1:
+                partner = (index | 1 << bit) * size
+                cross[bit] = np.vdot(sv[partner:partner + size], amplitudes)
+        return local, weights.sum(), cross
+
+    results = _run_blocks(block, len(sv), threads)
+
+    rho = np.zeros((num_qubits, 2, 2), dtype=np.complex128)
+    for index, (local, norm, cross) in enumerate(results):
+        rho[:local_qubits] += local
+        for bit in range(num_qubits - local_qubits):
+            rho[local_qubits + bit, index >> bit & 1, index >> bit & 1] += norm
+            rho[local_qubits + bit, 0, 1] += cross[bit]
+    rho[:, 1, 0] = rho[:, 0, 1].conj()
+    return rho
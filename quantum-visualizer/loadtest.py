@@ -0,0 +1,346 @@
+"""
+loadtest.py
+Multi-session load test for the Streamlit app.
+Simulates concurrent users, each a headless AppTest session of app.py walking through a
+realistic session: open the page, choose the number of qubits, add gates, drag the
+shots slider and delete gates again. AppTest swaps process wide streamlit state (the
+Runtime singleton, config options) on every run, so each user gets its own process.
+Reports p50/p95/p99 rerun latency per action and per stage of app.main (the
+stage_timings it records), CPU time and peak RSS growth per stage (stage_usage), plus
+CPU time and peak RSS of every session process.
+
+Usage:
+    python loadtest.py --users 8
+    python loadtest.py --users 32 --gates 10 --save users32
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import random
+import sys
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # windows: CPU time from time.process_time, no RSS
+    resource = None
+
+
+
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.benchmarks')
+
+DEFAULT_USERS = 8
+DEFAULT_GATES = 6
+DEFAULT_TIMEOUT = 120  # seconds per rerun
+PERCENTILES = (50, 95, 99)
+
+# stages recorded by app.main, in page order
+STAGES = ('sidebar', 'circuit', 'simulation', 'analysis', 'render')
+
+SINGLE_QUBIT_GATES = ['H', 'X', 'Y', 'Z', 'S', 'T']
+# widget labels of the operand selectboxes per multi qubit gate
+OPERAND_LABELS = {
+    'CNOT': ('Control', 'Target'),
+    'SWAP': ('Qubit 1', 'Qubit 2'),
+    'Toffoli': ('Ctrl 1', 'Ctrl 2', 'Target')
+}
+# think time between actions (seconds), a real user does not click continuously
+DEFAULT_THINK_TIME = (0.0, 0.2)
+
+
+
+
+
+def session_script(rng, num_gates):
+    # list of (action, argument) for one user. qubits are chosen before any gate is added
+    num_qubits = rng.choice([1, 2, 3])
+    script = [('load', None), ('choose_qubits', num_qubits)]
+
+    # every widget change is a rerun: pick the gate, then its operands one by one (the
+    # options of later operands depend on the earlier ones), then click add
+    for _ in range(num_gates):
+        gates = SINGLE_QUBIT_GATES + [g for g, labels in OPERAND_LABELS.items() if len(labels) <= num_qubits]
+        gate = rng.choice(gates)
+        labels = OPERAND_LABELS.get(gate, ("Target Qubit",))
+        script.append(('select_gate', gate))
+        for label, qubit in zip(labels, rng.sample(range(num_qubits), len(labels))):
+            script.append(('select_operand', (label, qubit)))
+        script.append(('add_gate', None))
+
+    # dragging the slider fires a rerun for every value it is released on
+    shots = 1024
+    for _ in range(rng.randint(2, 5)):
+        shots = min(10000, max(100, shots + rng.choice([-1, 1]) * rng.randint(1, 20) * 100))
+        script.append(('drag_shots', shots))
+
+    for _ in range(rng.randint(1, max(1, num_gates // 2))):
+        script.append(('delete_gate', None))
+    return script
+
+
+def _widget(widgets, label):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"No widget labelled '{label}' on the page")
+
+
+def perform(at, action, argument, rng):
+    # set the widgets for one user action; the caller times the rerun that follows
+    if action == 'load':
+        return at
+    if action == 'choose_qubits':
+        return _widget(at.sidebar.selectbox, "Number of Qubits").set_value(argument)
+    if action == 'select_gate':
+        return _widget(at.sidebar.selectbox, "Select Gate").set_value(argument)
+    if action == 'select_operand':
+        label, qubit = argument
+        return _widget(at.sidebar.selectbox, label).set_value(qubit)
+    if action == 'add_gate':
+        return _widget(at.sidebar.button, "➕ Add Gate").click()
+    if action == 'drag_shots':
+        return _widget(at.sidebar.slider, "Measurement Shots").set_value(argument)
+    if action == 'delete_gate':
+        delete_buttons = [b for b in at.sidebar.button if (b.key or '').startswith('del_')]
+        if not delete_buttons:
+            return None
+        return rng.choice(delete_buttons).click()
+    raise ValueError(f"Unknown action '{action}'")
+
+
+
+
+
+def run_user(user_id, num_gates, seed, think_time, samples, errors):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed * 1_000_003 + user_id)
+    at = AppTest.from_file(APP_PATH, default_timeout=DEFAULT_TIMEOUT)
+
+    for action, argument in session_script(rng, num_gates):
+        try:
+            target = perform(at, action, argument, rng)
+            if target is None:
+                continue
+            start = time.perf_counter()
+            target.run()
+            latency = time.perf_counter() - start
+        except Exception as e:
+            errors.append(f"user {user_id} {action}: {type(e).__name__}: {e}")
+            return
+
+        # uncaught exceptions and errors the app shows (st.error) both end the session
+        failure = at.exception or at.error
+        if failure:
+            errors.append(f"user {user_id} {action}: {failure[0].value}")
+            return
+        stages = dict(at.session_state['stage_timings']) if 'stage_timings' in at.session_state else {}
+        usage = dict(at.session_state['stage_usage']) if 'stage_usage' in at.session_state else {}
+        samples.append({'action': action, 'latency': latency, 'stages': stages, 'usage': usage})
+        time.sleep(rng.uniform(*think_time))
+
+
+def _process_usage():
+    # (cpu seconds, peak rss bytes) of this process so far
+    if resource is None:
+        return time.process_time(), None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is in KiB on linux and in bytes on macos
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss * scale
+
+
+def run_worker(user_id, num_gates, seed, think_time, queue):
+    # one session process, reports its samples and resource usage through the queue
+    os.chdir(os.path.dirname(APP_PATH))
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+    samples, errors = [], []
+    cpu_start, _ = _process_usage()
+    start = time.perf_counter()
+
+    run_user(user_id, num_gates, seed, think_time, samples, errors)
+
+    cpu_end, peak_rss = _process_usage()
+    queue.put({
+        'user': user_id,
+        'pid': os.getpid(),
+        'wall_seconds': time.perf_counter() - start,
+        'cpu_seconds': cpu_end - cpu_start,
+        'peak_rss': peak_rss,
+        'samples': samples,
+        'errors': errors
+    })
+
+
+
+
+
+def run_loadtest(users=DEFAULT_USERS, num_gates=DEFAULT_GATES, seed=0, think_time=DEFAULT_THINK_TIME):
+    # every user starts at once in a fresh (spawned) process
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    workers = [
+        context.Process(target=run_worker, args=(user_id, num_gates, seed, think_time, queue))
+        for user_id in range(users)
+    ]
+    for worker in workers:
+        worker.start()
+
+    # drain the queue before joining, a worker with a full pipe never exits. a worker that
+    # died (e.g. a crash in a compiled extension) is reported instead of waited for
+    reports = []
+    while len(reports) < len(workers):
+        try:
+            reports.append(queue.get(timeout=1))
+        except queue_module.Empty:
+            done = {report['user'] for report in reports}
+            for user_id, worker in enumerate(workers):
+                if user_id not in done and worker.exitcode not in (None, 0):
+                    reports.append({'user': user_id, 'pid': worker.pid, 'wall_seconds': None,
+                                    'cpu_seconds': None, 'peak_rss': None, 'samples': [],
+                                    'errors': [f"user {user_id}: process exited with code {worker.exitcode}"]})
+    for worker in workers:
+        worker.join()
+    return sorted(reports, key=lambda report: report['user'])
+
+
+def percentiles(values):
+    if not values:
+        return {f'p{p}': None for p in PERCENTILES}
+    return {f'p{p}': float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+def _total_rss_growth(values):
+    values = [v for v in values if v is not None]
+    return sum(values) if values else None
+
+
+def summarize(reports):
+    samples = [sample for report in reports for sample in report['samples']]
+    actions = sorted({sample['action'] for sample in samples})
+    return {
+        'reruns': len(samples),
+        'errors': [error for report in reports for error in report['errors']],
+        'latency': percentiles([s['latency'] for s in samples]),
+        'actions': {
+            action: {'count': sum(s['action'] == action for s in samples),
+                     **percentiles([s['latency'] for s in samples if s['action'] == action])}
+            for action in actions
+        },
+        # reruns that return early (no gates yet) only record the first stages
+        'stages': {
+            stage: percentiles([s['stages'][stage] for s in samples if stage in s['stages']])
+            for stage in STAGES
+        },
+        # CPU seconds per rerun, and how much each stage raised its process's peak RSS
+        # over the whole run (peak growth only happens the first time a stage allocates)
+        'stage_cpu': {
+            stage: percentiles([s['usage'][stage]['cpu_seconds'] for s in samples if stage in s['usage']])
+            for stage in STAGES
+        },
+        'stage_rss_growth': {
+            stage: _total_rss_growth([s['usage'][stage]['rss_growth'] for s in samples if stage in s['usage']])
+            for stage in STAGES
+        },
+        'processes': [
+            {key: report[key] for key in ('user', 'pid', 'wall_seconds', 'cpu_seconds', 'peak_rss')}
+            for report in reports
+        ]
+    }
+
+
+
+
+
+def _format_ms(seconds):
+    return '-' if seconds is None else f"{seconds * 1e3:.1f}"
+
+
+def _format_row(name, stats):
+    cells = ''.join(f"{_format_ms(stats['p' + str(p)]):>12}" for p in PERCENTILES)
+    return f"{name:<24}{cells}"
+
+
+def print_summary(summary):
+    header = f"{'':<24}" + ''.join(f"{'p' + str(p) + ' (ms)':>12}" for p in PERCENTILES)
+    print(f"{summary['reruns']} reruns, {len(summary['errors'])} failed sessions\n")
+
+    print(header)
+    print(_format_row('all reruns', summary['latency']))
+    for action, stats in summary['actions'].items():
+        print(_format_row(f"{action} ({stats['count']})", stats))
+
+    print(f"\n{'app.main stage':<24}" + header[24:])
+    for stage, stats in summary['stages'].items():
+        print(_format_row(stage, stats))
+
+    print(f"\n{'stage cpu time':<24}" + header[24:] + f"{'rss growth':>14}")
+    for stage, stats in summary['stage_cpu'].items():
+        growth = summary['stage_rss_growth'][stage]
+        rss = '-' if growth is None else f"{growth / 1024 ** 2:.0f} MiB"
+        print(_format_row(stage, stats) + f"{rss:>14}")
+
+    print(f"\n{'session process':<24}{'wall (s)':>12}{'cpu (s)':>12}{'cpu %':>8}{'peak rss':>14}")
+    for p in summary['processes']:
+        name = f"user {p['user']} (pid {p['pid']})"
+        if p['wall_seconds'] is None:
+            print(f"{name:<24}{'crashed':>12}")
+            continue
+        rss = '-' if p['peak_rss'] is None else f"{p['peak_rss'] / 1024 ** 2:.0f} MiB"
+        utilization = 100 * p['cpu_seconds'] / max(p['wall_seconds'], 1e-9)
+        print(f"{name:<24}{p['wall_seconds']:>12.1f}{p['cpu_seconds']:>12.1f}{utilization:>8.0f}{rss:>14}")
+
+    for error in summary['errors']:
+        print(f"ERROR {error}")
+
+
+def save_results(name, summary, settings):
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    path = os.path.join(BENCHMARK_DIR, f"loadtest_{name}.json")
+    with open(path, 'w') as f:
+        json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'settings': settings,
+                   'summary': summary}, f, indent=2)
+    return path
+
+
+
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the visualizer with concurrent sessions.")
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS, help="concurrent sessions")
+    parser.add_argument('--gates', type=int, default=DEFAULT_GATES, help="gates added per session")
+    parser.add_argument('--think-time', type=float, nargs=2, default=DEFAULT_THINK_TIME,
+                        metavar=('MIN', 'MAX'), help="seconds between actions")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', metavar='NAME', help="store the summary under .benchmarks/")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings = {
+        'users': args.users,
+        'gates': args.gates,
+        'think_time': args.think_time,
+        'seed': args.seed
+    }
+
+    reports = run_loadtest(args.users, args.gates, args.seed, tuple(args.think_time))
+    summary = summarize(reports)
+    print_summary(summary)
+
+    if args.save:
+        print(f"\nResults saved to {save_results(args.save, summary, settings)}")
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+macros.py
+Macro gates on a register of consecutive qubits: QFT / inverse QFT, Grover diffuser,
+phase oracle for one marked value, and multi-controlled X / Z.
+A macro is a single gate_sequence entry and a single box in the circuit diagram, and
+is simulated by one kernel on the dense statevector (an FFT for the QFT, a reflection
+about the register mean for the diffuser, a sign flip or a swap of two slices for the
+rest) instead of the long list of primitive gates it expands to. The qiskit gates and
+their expansion (needed by Aer only) live in gates.py.
+"""
+
+import numpy as np
+
+
+
+
+# operands of each macro: the register is qubits first..last (qubit first is the least
+# significant bit of the register value), followed by the marked register value (Oracle)
+# or the target qubit (MCX, controlled by the whole register)
+MACRO_OPERANDS = {
+    'QFT': ('first', 'last'),
+    'IQFT': ('first', 'last'),
+    'Diffuser': ('first', 'last'),
+    'Oracle': ('first', 'last', 'marked'),
+    'MCX': ('first', 'last', 'target'),
+    'MCZ': ('first', 'last')
+}
+MACRO_GATES = tuple(MACRO_OPERANDS)
+
+# macros that spread a basis state over the whole register (everything else maps basis
+# states to basis states and keeps a sparse state sparse)
+BRANCHING_MACROS = ('QFT', 'IQFT', 'Diffuser')
+
+# the marked value is stored in one operand byte of the compact circuit
+MAX_ORACLE_QUBITS = 8
+
+
+
+
+
+def register_width(operands):
+    first, last = operands[:2]
+    return last - first + 1
+
+
+def macro_qubits(gate_name, operands):
+    # every qubit the macro acts on (the register, then the target for MCX)
+    first, last = operands[:2]
+    qubits = list(range(first, last + 1))
+    if gate_name == 'MCX':
+        qubits.append(operands[2])
+    return qubits
+
+
+def validate_macro(gate_name, operands, num_qubits):
+    if len(operands) != len(MACRO_OPERANDS[gate_name]):
+        raise ValueError(f"{gate_name} takes ({', '.join(MACRO_OPERANDS[gate_name])}), got {operands}")
+    first, last = operands[:2]
+    if not 0 <= first < last < num_qubits:
+        raise ValueError(f"{gate_name} needs a register of 2 or more qubits within {num_qubits}, "
+                         f"got q{first}..q{last}")
+    if gate_name == 'Oracle':
+        width = register_width(operands)
+        if width > MAX_ORACLE_QUBITS:
+            raise ValueError(f"Oracle registers are limited to {MAX_ORACLE_QUBITS} qubits, got {width}")
+        if not 0 <= operands[2] < 2 ** width:
+            raise ValueError(f"Marked value {operands[2]} does not fit a {width}-qubit register")
+    if gate_name == 'MCX' and not (0 <= operands[2] < num_qubits and not first <= operands[2] <= last):
+        raise ValueError(f"MCX target q{operands[2]} must be a qubit outside the register q{first}..q{last}")
+
+
+def marked_label(marked, width):
+    # big-endian like every other label in the app: the register's first qubit leftmost
+    return ''.join(str((marked >> k) & 1) for k in range(width))
+
+
+def format_macro(gate_name, operands):
+    # operands as shown in the sidebar and animation titles, e.g. 'q0..q2, |101⟩'
+    first, last = operands[:2]
+    register = f"q{first}..q{last}"
+    if gate_name == 'Oracle':
+        return f"{register}, |{marked_label(operands[2], register_width(operands))}⟩"
+    if gate_name == 'MCX':
+        return f"{register} → q{operands[2]}"
+    return register
+
+
+def expanded_size(gate_name, width):
+    # primitive gates the macro stands for on a width-qubit register (at most, for the
+    # oracle), which is what a gate by gate simulator runs
+    if gate_name in ('QFT', 'IQFT'):
+        return width * (width + 1) // 2 + width // 2
+    if gate_name == 'Diffuser':
+        return 4 * width + 1
+    if gate_name == 'Oracle':
+        return 2 * width + 1
+    return 1
+
+
+
+
+
+def _register_view(state, num_qubits, first, last):
+    # (2^(n-1-last), 2^width, 2^first, *batch) view of a C-contiguous little-endian state
+    view = state.reshape((2 ** (num_qubits - 1 - last), 2 ** (last - first + 1), 2 ** first) + state.shape[1:])
+    if not np.shares_memory(view, state):
+        raise ValueError("Macro kernels need a C-contiguous state")
+    return view
+
+
+def _select(num_qubits, fixed):
+    # index tuple into the (2,)*n view; qubit q is axis n - 1 - q
+    index = [slice(None)] * num_qubits
+    for qubit, value in fixed.items():
+        index[num_qubits - 1 - qubit] = value
+    return tuple(index)
+
+
+def apply_macro(state, num_qubits, gate_name, operands):
+    # in place on state, shape (2^n,) or (2^n, batch) in qiskit's little-endian order.
+    # one pass over the state per kernel (w passes inside the FFT of a w-qubit QFT)
+    first, last = operands[:2]
+    register = _register_view(state, num_qubits, first, last)
+
+    if gate_name == 'QFT':
+        # QFT|x> = sum_y e^(2 pi i xy / 2^w) |y> / sqrt(2^w), numpy's inverse DFT
+        register[...] = np.fft.ifft(register, axis=1, norm='ortho')
+    elif gate_name == 'IQFT':
+        register[...] = np.fft.fft(register, axis=1, norm='ortho')
+    elif gate_name == 'Diffuser':
+        # 2|s><s| - I on the register: reflect every amplitude about the register mean
+        register[...] = 2 * register.mean(axis=1, keepdims=True) - register
+    elif gate_name == 'Oracle':
+        register[:, operands[2]] *= -1
+    elif gate_name == 'MCZ':
+        register[:, -1] *= -1
+    elif gate_name == 'MCX':
+        tensor = state.reshape((2,) * num_qubits + state.shape[1:])
+        controls = {q: 1 for q in range(first, last + 1)}
+        zero = _select(num_qubits, {**controls, operands[2]: 0})
+        one = _select(num_qubits, {**controls, operands[2]: 1})
+        saved = tensor[zero].copy()
+        tensor[zero] = tensor[one]
+        tensor[one] = saved
+    else:
+        raise ValueError(f"Unknown macro gate '{gate_name}'")
+    return state
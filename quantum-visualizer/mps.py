@@ -0,0 +1,153 @@
+"""
+mps.py
+Matrix product state (MPS) support for wide, low entanglement circuits.
+Estimates the bond dimension a gate sequence can build up, picks between dense
+statevector and MPS simulation from that estimate, and extracts per-qubit reduced
+states and Bloch vectors directly from the MPS tensors (never 2^n amplitudes).
+"""
+
+import numpy as np
+from qiskit import QuantumCircuit
+
+from macros import macro_qubits, MACRO_GATES
+
+
+
+
+# below this many qubits dense simulation is cheap enough that MPS never pays off
+MPS_MIN_QUBITS = 14
+# largest estimated bond dimension still simulated as an MPS
+MPS_MAX_BOND = 64
+
+# gate names from gate_sequence -> qiskit instruction names
+_SEQUENCE_NAMES = {
+    'H': 'h', 'X': 'x', 'Y': 'y', 'Z': 'z', 'S': 's', 'T': 't',
+    'CNOT': 'cx', 'SWAP': 'swap', 'Toffoli': 'ccx',
+    'QFT': 'qft', 'IQFT': 'iqft', 'Diffuser': 'diffuser', 'Oracle': 'oracle', 'MCX': 'mcx', 'MCZ': 'mcz',
+    'Measure': 'measure', 'Reset': 'reset', 'CondX': 'x', 'CondZ': 'z'
+}
+# conditioned gates count as the gate they apply (to their target, the last operand)
+_CONDITIONED = ('CondX', 'CondZ')
+
+# single qubit gates mapping basis states to basis states (up to a phase)
+_BASIS_PRESERVING = {'id', 'x', 'y', 'z', 's', 'sdg', 't', 'tdg', 'p', 'rz', 'u1'}
+# controlled gates: a definite (classical) control can not entangle anything
+_CONTROLLED = {'cx', 'cy', 'cz', 'ch', 'cp', 'ccx', 'ccz', 'mcx', 'mcz', 'mcphase', 'oracle'}
+# macros that can entangle their whole register (the Schmidt rank of every cut inside it
+# can reach its maximum)
+_REGISTER_WIDE = {'qft', 'iqft', 'diffuser'}
+_IGNORED = {'barrier', 'measure', 'reset', 'delay'}
+
+
+
+
+
+def normalized_gates(gates):
+    # accepts a gate_sequence (list of (name, params)) or a QuantumCircuit
+    if isinstance(gates, QuantumCircuit):
+        for instruction in gates.data:
+            name = instruction.operation.name
+            if name in _IGNORED or name.startswith('save_'):
+                continue
+            if name == 'if_else':
+                # the gates inside the conditioned block, on the outer circuit's qubits
+                block = instruction.operation.blocks[0]
+                outer = [gates.find_bit(q).index for q in instruction.qubits]
+                for inner in block.data:
+                    yield inner.operation.name, [outer[block.find_bit(q).index] for q in inner.qubits]
+                continue
+            # macro boxes (gates.MacroGate) by their sequence name, e.g. oracle_101 -> oracle
+            name = _SEQUENCE_NAMES.get(getattr(instruction.operation, 'macro', None), name)
+            yield name, [gates.find_bit(q).index for q in instruction.qubits]
+    else:
+        for gate_name, params in gates:
+            name = _SEQUENCE_NAMES.get(gate_name, gate_name.lower())
+            if name in _IGNORED:
+                continue
+            if gate_name in MACRO_GATES:
+                qubits = macro_qubits(gate_name, params)
+            elif gate_name in _CONDITIONED:
+                qubits = [params[1]]
+            else:
+                qubits = list(params) if isinstance(params, (tuple, list)) else [params]
+            yield name, qubits
+
+
+def estimate_bond_dimension(num_qubits, gates):
+    # cheap upper bound on the MPS bond dimension (qubits in index order along the chain).
+    # tracks log2 of the Schmidt rank across every cut; a gate between qubits a < b
+    # can raise every cut between them by its operator Schmidt rank (1 bit for
+    # controlled gates, 2 bits otherwise). qubits never put in superposition act
+    # as classical bits and gates controlled only by them entangle nothing
+    if num_qubits < 2:
+        return 1
+
+    cuts = np.arange(1, num_qubits)
+    cut_capacity = np.minimum(cuts, num_qubits - cuts)
+    cut_bits = np.zeros(num_qubits - 1, dtype=np.int64)
+    superposed = np.zeros(num_qubits, dtype=bool)
+
+    for name, qubits in normalized_gates(gates):
+        if len(qubits) == 1:
+            if name not in _BASIS_PRESERVING:
+                superposed[qubits[0]] = True
+            continue
+
+        low, high = min(qubits), max(qubits)
+        if name == 'swap':
+            a, b = qubits
+            if superposed[a] or superposed[b]:
+                cut_bits[low:high] += 2
+            superposed[a], superposed[b] = superposed[b], superposed[a]
+        elif name in _REGISTER_WIDE:
+            cut_bits[low:high] = cut_capacity[low:high]
+            superposed[qubits] = True
+        elif name in _CONTROLLED:
+            controls, target = qubits[:-1], qubits[-1]
+            if not superposed[controls].any():
+                continue
+            cut_bits[low:high] += 1
+            superposed[target] = True
+        else:
+            cut_bits[low:high] += 2
+            superposed[qubits] = True
+
+        np.minimum(cut_bits, cut_capacity, out=cut_bits)
+
+    return 2 ** int(cut_bits.max())
+
+
+def choose_simulation_method(num_qubits, gates, max_bond=MPS_MAX_BOND, min_qubits=MPS_MIN_QUBITS):
+    if num_qubits >= min_qubits and estimate_bond_dimension(num_qubits, gates) <= max_bond:
+        return 'matrix_product_state'
+    return 'statevector'
+
+
+
+
+
+def mps_single_qubit_density_matrices(mps):
+    # mps is aer's saved matrix_product_state: (gammas, lambdas) in Vidal form,
+    # gammas[i] = (G0, G1) with G_s of shape (chi_left, chi_right), lambdas[i] the
+    # Schmidt values between qubit i and i + 1.
+    # rho_i[s, t] = sum_ab lambda_left[a]^2 G_s[a, b] conj(G_t[a, b]) lambda_right[b]^2
+    gammas, lambdas = mps
+    num_qubits = len(gammas)
+
+    reduced_dms = []
+    for i in range(num_qubits):
+        gamma = np.stack([np.asarray(g) for g in gammas[i]])
+        left = np.abs(lambdas[i - 1]) ** 2 if i > 0 else np.ones(gamma.shape[1])
+        right = np.abs(lambdas[i]) ** 2 if i < num_qubits - 1 else np.ones(gamma.shape[2])
+        reduced_dms.append(np.einsum('a,sab,tab,b->st', left, gamma, gamma.conj(), right))
+
+    return reduced_dms
+
+
+def mps_bloch_vectors(mps):
+    # (num_qubits, 3) array of Bloch vectors, one per qubit
+    rho = np.array(mps_single_qubit_density_matrices(mps))
+    x = 2 * np.real(rho[:, 1, 0])
+    y = 2 * np.imag(rho[:, 1, 0])
+    z = np.real(rho[:, 0, 0] - rho[:, 1, 1])
+    return np.stack([x, y, z], axis=1)
@@ -0,0 +1,234 @@
+"""
+planner.py
+Memory budget planner for simulations and state analysis.
+Before anything runs, the planner estimates peak memory and runtime of every simulation
+method (dense statevector, sparse statevector, stabilizer, matrix product state, density
+matrix) from the gate list alone, drops the methods that can not produce the requested
+outputs or do not fit the budget, and picks the cheapest remaining one. Analysis helpers
+that build 2^n x 2^n matrices are checked against the same budget. Amplitude sizes follow
+the precision setting (single precision halves every dense estimate).
+The sparse engine is only planned while the state can stay below its fill threshold:
+superposed states go to aer, mostly classical ones (X, CNOT, Toffoli, phases) stay sparse.
+Dynamic circuits (mid-circuit measurement, reset) are costed per shot for Aer, which
+simulates them shot by shot, and per measurement history for the trajectory engine.
+"""
+
+import os
+
+from mps import estimate_bond_dimension, normalized_gates, MPS_MAX_BOND
+from sparse_sim import MAX_SPARSE_QUBITS, MAX_DENSE_QUBITS, DEFAULT_FILL_THRESHOLD
+from macros import expanded_size, MACRO_GATES, BRANCHING_MACROS
+from precision import amplitude_bytes, DEFAULT_PRECISION
+from gates import count_dynamic_operations
+
+
+
+
+# per session memory budget (MiB), configurable per deployment
+MEMORY_BUDGET_ENV = 'QUBITLAB_MEMORY_BUDGET_MB'
+DEFAULT_MEMORY_BUDGET = int(os.environ.get(MEMORY_BUDGET_ENV, 512)) * 1024 ** 2
+
+METHODS = ('statevector', 'sparse', 'stabilizer', 'matrix_product_state', 'density_matrix', 'trajectories')
+# shots assumed when the caller does not say (dynamic circuits cost more per shot)
+DEFAULT_SHOTS = 1024
+
+# what each method can hand back: amplitudes (a dense array), a state usable for per-qubit
+# analysis (statevector or MPS), measurement counts, the density matrix
+METHOD_OUTPUTS = {
+    'statevector': {'amplitudes', 'state', 'counts'},
+    'sparse': {'amplitudes', 'state', 'counts'},
+    'stabilizer': {'counts'},
+    'matrix_product_state': {'state', 'counts'},
+    'density_matrix': {'state', 'counts', 'density_matrix'},
+    # the state of the most common measurement history
+    'trajectories': {'amplitudes', 'state', 'counts'}
+}
+
+# rough single core throughputs, only used to rank methods against each other
+_DENSE_OPS_PER_SECOND = 2e8       # amplitude updates per second (aer)
+_SPARSE_OPS_PER_SECOND = 2e7      # nonzero entries per second (numpy, incl. sorting)
+_MPS_FLOPS_PER_SECOND = 1e9
+_STABILIZER_OPS_PER_SECOND = 1e8  # tableau bit updates per second
+_TRAJECTORY_OPS_PER_SECOND = 5e7  # amplitude updates per second (numpy tensordot)
+# python dispatch of one gate in the sparse engine (~10 us measured), in nonzero entries
+_SPARSE_DISPATCH_OPS = 200
+# fixed cost of starting a run (aer job setup, python dispatch), measured on 2-5 qubit
+# circuits: two aer runs (statevector and counts) ~1-2 ms, the sparse engine ~0.1 ms
+_OVERHEAD_SECONDS = {
+    'statevector': 1e-3,
+    'sparse': 1e-4,
+    'stabilizer': 1.5e-3,
+    'matrix_product_state': 2e-3,
+    'density_matrix': 1e-3,
+    'trajectories': 5e-4
+}
+
+_INDEX_BYTES = 8
+_CLIFFORD = {'id', 'h', 'x', 'y', 'z', 's', 'sdg', 'cx', 'cy', 'cz', 'swap'}
+# single qubit gates that never branch a basis state into a superposition
+_NON_BRANCHING = {'id', 'x', 'y', 'z', 's', 'sdg', 't', 'tdg', 'p', 'rz', 'u1'}
+# normalized (lowercase) macro names -> macros.py names
+_MACRO_NAMES = {name.lower(): name for name in MACRO_GATES}
+
+
+
+
+
+class MemoryBudgetExceeded(ValueError):
+    pass
+
+
+def density_matrix_bytes(num_qubits, precision=DEFAULT_PRECISION):
+    return amplitude_bytes(precision) * 4 ** num_qubits
+
+
+def statevector_bytes(num_qubits, precision=DEFAULT_PRECISION):
+    return amplitude_bytes(precision) * 2 ** num_qubits
+
+
+def check_memory(required_bytes, budget=DEFAULT_MEMORY_BUDGET, what="This operation"):
+    # guard for analysis helpers: raise before allocating instead of exhausting the server
+    if budget is not None and required_bytes > budget:
+        raise MemoryBudgetExceeded(
+            f"{what} needs about {format_bytes(required_bytes)}, "
+            f"over the memory budget of {format_bytes(budget)}"
+        )
+
+
+def format_bytes(num_bytes):
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if num_bytes < 1024 or unit == 'TiB':
+            return f"{num_bytes:.0f} {unit}" if unit == 'B' else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+def _gate_profile(num_qubits, gates):
+    # one pass over the gates: count, clifford only, number of branching gates, and for
+    # macros the primitive gates aer runs instead (the sparse engine runs one kernel) and
+    # whether one needs the dense array
+    num_gates = 0
+    expanded_gates = 0
+    clifford = True
+    branching = 0
+    needs_dense = False
+    for name, qubits in normalized_gates(gates):
+        num_gates += 1
+        clifford = clifford and name in _CLIFFORD
+        macro = _MACRO_NAMES.get(name)
+        if macro is not None:
+            expanded_gates += expanded_size(macro, len(qubits))
+            if macro in BRANCHING_MACROS:
+                branching += len(qubits)
+                needs_dense = True
+            continue
+        expanded_gates += 1
+        if len(qubits) == 1 and name not in _NON_BRANCHING:
+            branching += 1
+    return num_gates, expanded_gates, clifford, branching, needs_dense
+
+
+
+
+
+def estimate_methods(num_qubits, gates, dense_amplitudes=False, precision=DEFAULT_PRECISION,
+                     shots=DEFAULT_SHOTS):
+    # memory / runtime estimate for every method, without simulating anything.
+    # dense_amplitudes adds the dense array methods without one have to build at the end
+    num_gates, expanded_gates, clifford, branching, needs_dense = _gate_profile(num_qubits, gates)
+    splits, conditioned = count_dynamic_operations(gates)
+    dynamic = bool(splits or conditioned)
+    amplitude = amplitude_bytes(precision)
+    dim = 2 ** num_qubits
+    estimates = []
+    # aer runs a dynamic circuit once per shot, the other engines once
+    runs = shots if dynamic else 1
+
+    def add(method, memory_bytes, operations, throughput, supported=True, note=""):
+        estimates.append({
+            'method': method,
+            'memory_bytes': int(memory_bytes),
+            'runtime_seconds': _OVERHEAD_SECONDS[method] + operations / throughput,
+            'supported': supported,
+            'note': note
+        })
+
+    # aer's state plus the copy handed back to python
+    add('statevector', 2 * statevector_bytes(num_qubits, precision), max(expanded_gates, 1) * dim * runs,
+        _DENSE_OPS_PER_SECOND)
+
+    # each branching gate can at most double the occupied basis states
+    nonzero = 2 ** min(branching, num_qubits)
+    # past the fill threshold the sparse engine is a dense simulator, aer is the one for that
+    fills = not needs_dense and nonzero > DEFAULT_FILL_THRESHOLD * dim
+    # index + amplitude, doubled while H combines duplicates
+    # QFT / diffuser macros switch to the dense array, one kernel pass each
+    add('sparse', 2 * (_INDEX_BYTES + amplitude) * nonzero
+        + (statevector_bytes(num_qubits, precision) if dense_amplitudes or needs_dense else 0),
+        max(num_gates, 1) * (nonzero + _SPARSE_DISPATCH_OPS), _SPARSE_OPS_PER_SECOND,
+        supported=num_qubits <= (MAX_DENSE_QUBITS if needs_dense else MAX_SPARSE_QUBITS) and not dynamic and not fills,
+        note="circuit has measurements or resets" if dynamic
+        else f"up to {nonzero} of {dim} amplitudes nonzero, the state is not sparse" if fills
+        else f"up to {nonzero} nonzero amplitudes" if not needs_dense or num_qubits <= MAX_DENSE_QUBITS
+        else "QFT / diffuser macros need the dense array")
+
+    # tableau of 2n x 2n bits, each gate touches O(n) of them
+    add('stabilizer', (2 * num_qubits) ** 2 // 8 + 1024, max(expanded_gates, 1) * num_qubits * runs,
+        _STABILIZER_OPS_PER_SECOND, supported=clifford,
+        note="" if clifford else "circuit contains non-Clifford gates (T, Toffoli)")
+
+    bond = estimate_bond_dimension(num_qubits, gates)
+    add('matrix_product_state', 2 * num_qubits * bond ** 2 * amplitude,
+        max(expanded_gates, 1) * bond ** 3 * runs, _MPS_FLOPS_PER_SECOND, supported=bond <= MPS_MAX_BOND,
+        note=f"bond dimension up to {bond}")
+
+    add('density_matrix', 2 * density_matrix_bytes(num_qubits, precision), max(expanded_gates, 1) * dim ** 2 * runs,
+        _DENSE_OPS_PER_SECOND)
+
+    # every measurement or reset can split each measurement history in two, but there are
+    # never more histories than shots. all histories are updated together, gate by gate
+    histories = min(2 ** min(splits, 62), shots)
+    add('trajectories', 2 * histories * statevector_bytes(num_qubits, precision),
+        (max(num_gates, 1) + splits) * dim * histories, _TRAJECTORY_OPS_PER_SECOND,
+        supported=dynamic and num_qubits <= MAX_DENSE_QUBITS,
+        note=f"up to {histories} measurement histories" if dynamic
+        else "only for circuits with measurements or resets")
+
+    return estimates
+
+
+def plan_simulation(num_qubits, gates, budget=DEFAULT_MEMORY_BUDGET, needs=('amplitudes', 'counts'),
+                    methods=METHODS, precision=DEFAULT_PRECISION, shots=DEFAULT_SHOTS):
+    # cheapest (estimated runtime, then memory) method that produces `needs` within budget.
+    # every candidate is returned with the reason it was or was not chosen
+    candidates = []
+    for estimate in estimate_methods(num_qubits, gates, dense_amplitudes='amplitudes' in needs,
+                                     precision=precision, shots=shots):
+        missing = set(needs) - METHOD_OUTPUTS[estimate['method']]
+        if estimate['method'] not in methods:
+            reason = "not available here"
+        elif missing:
+            reason = f"can not provide {', '.join(sorted(missing))}"
+        elif not estimate['supported']:
+            reason = estimate['note']
+        elif budget is not None and estimate['memory_bytes'] > budget:
+            reason = f"over the {format_bytes(budget)} budget"
+        else:
+            reason = ""
+        candidates.append({**estimate, 'viable': not reason, 'reason': reason})
+
+    viable = [c for c in candidates if c['viable']]
+    if not viable:
+        raise MemoryBudgetExceeded(
+            f"No simulation method can run this {num_qubits}-qubit circuit: "
+            + "; ".join(f"{c['method']}: {c['reason']}" for c in candidates)
+        )
+
+    chosen = min(viable, key=lambda c: (c['runtime_seconds'], c['memory_bytes']))
+    return {
+        'method': chosen['method'],
+        'memory_bytes': chosen['memory_bytes'],
+        'runtime_seconds': chosen['runtime_seconds'],
+        'budget': budget,
+        'precision': precision,
+        'candidates': candidates
+    }
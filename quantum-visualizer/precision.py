@@ -0,0 +1,57 @@
+"""
+precision.py
+Floating point precision of simulated amplitudes.
+'double' keeps statevectors, density matrices and cached arrays as complex128,
+'single' as complex64: half the memory and bandwidth, so the same memory budget
+fits one more qubit. Single precision amplitudes carry a relative error around 1e-7
+(Bloch vector components and probabilities stay within ~1e-6 of double precision
+for the circuits the app builds), far below what a plot shows, but amplitudes that
+should cancel leave small residues, so "is this amplitude zero" depends on it too.
+"""
+
+import numpy as np
+
+
+
+
+DEFAULT_PRECISION = 'double'
+
+# precision name (also aer's 'precision' option) -> amplitude dtype
+PRECISIONS = {
+    'double': np.dtype(np.complex128),
+    'single': np.dtype(np.complex64)
+}
+
+# amplitudes at or below this magnitude are treated as zero
+ZERO_TOLERANCE = {
+    'double': 1e-10,
+    'single': 1e-6
+}
+
+
+
+
+
+def complex_dtype(precision=DEFAULT_PRECISION):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}' (expected one of {', '.join(PRECISIONS)})")
+    return PRECISIONS[precision]
+
+
+def amplitude_bytes(precision=DEFAULT_PRECISION):
+    return complex_dtype(precision).itemsize
+
+
+def precision_of(array):
+    # 'single' for complex64 / float32 data, 'double' for everything else
+    return 'single' if np.asarray(array).dtype in (np.complex64, np.float32) else 'double'
+
+
+def as_precision(array, precision=DEFAULT_PRECISION):
+    # array with the precision's dtype, copied only when the dtype differs
+    return np.asarray(array).astype(complex_dtype(precision), copy=False)
+
+
+def zero_tolerance(precision=DEFAULT_PRECISION):
+    complex_dtype(precision)
+    return ZERO_TOLERANCE[precision]
@@ -0,0 +1,332 @@
+"""
+qasm.py
+OpenQASM 2 / 3 import and export for gate sequences.
+The parser streams over the source statement by statement (any iterable of lines, e.g.
+an open or uploaded file) and maps gates straight to (name, params) tuples of
+gate_sequence, without building a QuantumCircuit per line. Only the app's gate set is
+supported, plus mid-circuit measurement, reset and X / Z conditioned on one classical bit.
+Classical bit k must hold qubit k (the app's convention); measurements no later operation
+depends on are dropped since the app measures every qubit at the end. Barriers are skipped.
+"""
+
+import re
+
+from macros import MACRO_GATES
+
+
+
+
+class QasmError(ValueError):
+    pass
+
+
+# qasm gate name -> gate_sequence name (both qelib1.inc and stdgates.inc spellings)
+QASM_GATES = {
+    'h': 'H', 'x': 'X', 'y': 'Y', 'z': 'Z', 's': 'S', 't': 'T',
+    'cx': 'CNOT', 'CX': 'CNOT', 'swap': 'SWAP', 'ccx': 'Toffoli'
+}
+EXPORT_NAMES = {'H': 'h', 'X': 'x', 'Y': 'y', 'Z': 'z', 'S': 's', 'T': 't',
+                'CNOT': 'cx', 'SWAP': 'swap', 'Toffoli': 'ccx'}
+GATE_ARITY = {'H': 1, 'X': 1, 'Y': 1, 'Z': 1, 'S': 1, 'T': 1, 'CNOT': 2, 'SWAP': 2, 'Toffoli': 3}
+# gates allowed under a classical condition -> conditioned gate_sequence name
+CONDITIONED_GATES = {'x': 'CondX', 'z': 'CondZ'}
+EXPORT_CONDITIONED = {name: gate for gate, name in CONDITIONED_GATES.items()}
+
+# statements that do not change the circuit. gate definitions are skipped too: calling a
+# gate outside the supported set is reported where it is used
+_SKIPPED = {'barrier', 'include', 'OPENQASM', 'gate', 'opaque'}
+
+# qelib1.inc predates swap, so qasm 2 exports define it
+_QASM2_SWAP_DEFINITION = 'gate swap a, b { cx a, b; cx b, a; cx a, b; }'
+
+_COMMENT = re.compile(r'//.*?$|/\*.*?\*/', re.DOTALL | re.MULTILINE)
+_QREG_2 = re.compile(r'qreg\s+(\w+)\s*\[\s*(\d+)\s*\]$')
+_QREG_3 = re.compile(r'qubit(?:\s*\[\s*(\d+)\s*\])?\s+(\w+)$')
+_GATE = re.compile(r'(\w+)\s+(.+)$', re.DOTALL)
+_OPERAND = re.compile(r'\s*(\w+)\s*(?:\[\s*(\d+)\s*\])?\s*$')
+_DELIMITER = re.compile(r'([;{}])')
+# fast path for the common 'cx q[0], q[1]' form (indexed operands, no broadcasting)
+_INDEXED_GATE = re.compile(r'([a-zA-Z]+) (\w+)\[(\d+)\](?: ?, ?(\w+)\[(\d+)\])?(?: ?, ?(\w+)\[(\d+)\])?$')
+_CREG_2 = re.compile(r'creg\s+(\w+)\s*\[\s*(\d+)\s*\]$')
+_CREG_3 = re.compile(r'bit(?:\s*\[\s*(\d+)\s*\])?\s+(\w+)$')
+# measure q[0] -> c[0] (qasm 2), c[0] = measure q[0] or a bare measure q[0] (qasm 3)
+_MEASURE_2 = re.compile(r'measure\s+(.+?)\s*->\s*(.+)$')
+_MEASURE_3 = re.compile(r'(?:(.+?)\s*=\s*)?measure\s+(.+)$')
+# if (c[0]) x q[1], if (c[0] == 1) { x q[1]; } or if(c==1) x q[1] for a one bit register
+_IF = re.compile(r'if\s*\(\s*(\w+)\s*(?:\[\s*(\d+)\s*\])?\s*(?:==\s*(\w+)\s*)?\)\s*(.+)$', re.DOTALL)
+
+
+
+
+
+def iter_statements(lines):
+    # yields (line number, statement) one statement at a time, comments removed. statements
+    # end at ';', gate definitions ('gate name a, b { ... }') at their closing brace
+    buffer = ''
+    start_line = None
+    depth = 0
+    in_block_comment = False
+
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+
+        # block comments spanning lines
+        if in_block_comment:
+            end = line.find('*/')
+            if end < 0:
+                continue
+            line = line[end + 2:]
+            in_block_comment = False
+        line = _COMMENT.sub('', line)
+        if '/*' in line:
+            line, in_block_comment = line[:line.index('/*')], True
+
+        for token in _DELIMITER.split(line):
+            if not token:
+                continue
+            if start_line is None and token.strip():
+                start_line = line_number
+            buffer += token
+
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+            if token not in (';', '}') or depth > 0:
+                continue
+
+            statement = ' '.join(buffer.rstrip(';').split())
+            if statement:
+                yield start_line, statement
+            buffer = ''
+            start_line = None
+
+    if buffer.strip():
+        raise QasmError(f"Line {start_line}: statement is missing its ';'")
+
+
+def parse_qasm(source):
+    # OpenQASM 2 or 3 text (or any iterable of lines) -> (num_qubits, gate_sequence)
+    lines = source.splitlines() if isinstance(source, str) else source
+    registers = {}  # name -> (offset, size)
+    num_qubits = 0
+    clbits = {}     # classical registers, same layout
+    num_clbits = 0
+    gate_sequence = []
+
+    for line_number, statement in iter_statements(lines):
+        indexed = _INDEXED_GATE.match(statement)
+        if indexed and indexed.group(1) in QASM_GATES:
+            gate_name = QASM_GATES[indexed.group(1)]
+            qubits = []
+            for register, index in zip(indexed.group(2, 4, 6), indexed.group(3, 5, 7)):
+                if register is not None:
+                    offset, size = registers.get(register, (0, 0))
+                    qubits.append(offset + int(index) if int(index) < size else None)
+            if (len(qubits) == GATE_ARITY[gate_name] and None not in qubits
+                    and len(set(qubits)) == len(qubits)):
+                gate_sequence.append((gate_name, qubits[0] if len(qubits) == 1 else tuple(qubits)))
+                continue
+            # anything unusual goes through the full path below for a proper error message
+
+        keyword = statement.split(None, 1)[0].split('[', 1)[0].split('(', 1)[0]
+
+        if keyword in _SKIPPED:
+            continue
+
+        # classical registers (qasm 2: creg c[3]; qasm 3: bit[3] c; or bit c;)
+        if keyword in ('creg', 'bit'):
+            declaration = _CREG_2.match(statement) if keyword == 'creg' else _CREG_3.match(statement)
+            if not declaration:
+                raise QasmError(f"Line {line_number}: can not parse '{statement}'")
+            name, size = ((declaration.group(1), int(declaration.group(2))) if keyword == 'creg'
+                          else (declaration.group(2), int(declaration.group(1) or 1)))
+            if name in clbits or name in registers:
+                raise QasmError(f"Line {line_number}: register '{name}' is declared twice")
+            clbits[name] = (num_clbits, size)
+            num_clbits += size
+            continue
+
+        measure = _MEASURE_2.match(statement) or _MEASURE_3.match(statement)
+        if measure:
+            gate_sequence.extend(_parse_measure(measure, statement, registers, clbits, line_number))
+            continue
+
+        if keyword == 'reset':
+            for qubit in _resolve_operand(statement.split(None, 1)[1], registers, line_number):
+                gate_sequence.append(('Reset', qubit))
+            continue
+
+        if keyword == 'if':
+            gate_sequence.extend(_parse_condition(statement, registers, clbits, line_number))
+            continue
+
+        # register declarations (qasm 2: qreg q[3]; qasm 3: qubit[3] q; or qubit q;)
+        declaration = _QREG_2.match(statement)
+        if declaration:
+            name, size = declaration.group(1), int(declaration.group(2))
+        elif keyword == 'qubit':
+            declaration = _QREG_3.match(statement)
+            if not declaration:
+                raise QasmError(f"Line {line_number}: can not parse '{statement}'")
+            size, name = int(declaration.group(1) or 1), declaration.group(2)
+        if declaration:
+            if name in registers:
+                raise QasmError(f"Line {line_number}: register '{name}' is declared twice")
+            registers[name] = (num_qubits, size)
+            num_qubits += size
+            continue
+
+        gate = _GATE.match(statement)
+        if not gate or gate.group(1) not in QASM_GATES:
+            raise QasmError(f"Line {line_number}: unsupported statement '{statement}' "
+                            f"(supported gates: {', '.join(sorted(set(QASM_GATES) - {'CX'}))})")
+
+        gate_name = QASM_GATES[gate.group(1)]
+        operands = [_resolve_operand(operand, registers, line_number) for operand in gate.group(2).split(',')]
+        if len(operands) != GATE_ARITY[gate_name]:
+            raise QasmError(f"Line {line_number}: {gate.group(1)} takes {GATE_ARITY[gate_name]} "
+                            f"operand(s), got {len(operands)}")
+
+        # whole registers broadcast element wise (h q; cx a, b;)
+        widths = {len(qubits) for qubits in operands if len(qubits) > 1}
+        if len(widths) > 1:
+            raise QasmError(f"Line {line_number}: registers of different sizes in '{statement}'")
+        width = widths.pop() if widths else 1
+        for i in range(width):
+            qubits = tuple(q[i] if len(q) > 1 else q[0] for q in operands)
+            if len(set(qubits)) != len(qubits):
+                raise QasmError(f"Line {line_number}: {gate.group(1)} needs distinct qubits in '{statement}'")
+            gate_sequence.append((gate_name, qubits[0] if len(qubits) == 1 else qubits))
+
+    if num_qubits == 0:
+        raise QasmError("No qubit register declared")
+    for gate_name, params in gate_sequence:
+        if gate_name in EXPORT_CONDITIONED and params[0] >= num_qubits:
+            raise QasmError(f"Classical bit {params[0]} has no qubit of the same index to be measured from")
+    return num_qubits, _drop_final_measurements(gate_sequence)
+
+
+def _parse_measure(measure, statement, registers, clbits, line_number):
+    # Measure entries; classical bit k has to be the one qubit k is measured into
+    if measure.re is _MEASURE_2:
+        qubit_operand, bit_operand = measure.group(1), measure.group(2)
+    else:
+        bit_operand, qubit_operand = measure.group(1), measure.group(2)
+    qubits = _resolve_operand(qubit_operand, registers, line_number)
+    if bit_operand is None:
+        return [('Measure', qubit) for qubit in qubits]
+
+    bits = _resolve_operand(bit_operand, clbits, line_number, kind='bit')
+    if len(bits) != len(qubits):
+        raise QasmError(f"Line {line_number}: registers of different sizes in '{statement}'")
+    if bits != qubits:
+        raise QasmError(f"Line {line_number}: '{statement}' measures into another bit index, "
+                        f"this app keeps qubit k in classical bit k")
+    return [('Measure', qubit) for qubit in qubits]
+
+
+def _parse_condition(statement, registers, clbits, line_number):
+    # CondX / CondZ entries for a gate (or block of gates) conditioned on one bit being 1
+    condition = _IF.match(statement)
+    if not condition or condition.group(1) not in clbits:
+        raise QasmError(f"Line {line_number}: unsupported condition in '{statement}'")
+    offset, size = clbits[condition.group(1)]
+    if condition.group(2) is None and size != 1:
+        raise QasmError(f"Line {line_number}: '{statement}' tests a whole register, "
+                        f"only single bit conditions are supported")
+    index = int(condition.group(2) or 0)
+    if index >= size or condition.group(3) not in (None, '1', 'true'):
+        raise QasmError(f"Line {line_number}: unsupported condition in '{statement}'")
+
+    body = condition.group(4).strip()
+    if body.startswith('{') and body.endswith('}'):
+        body = body[1:-1]
+    conditioned = []
+    for gate_statement in filter(None, (part.strip() for part in body.split(';'))):
+        gate = _GATE.match(gate_statement)
+        if not gate or gate.group(1) not in CONDITIONED_GATES:
+            raise QasmError(f"Line {line_number}: only {' and '.join(CONDITIONED_GATES)} can be "
+                            f"conditioned, got '{gate_statement}'")
+        for target in _resolve_operand(gate.group(2), registers, line_number):
+            conditioned.append((CONDITIONED_GATES[gate.group(1)], (offset + index, target)))
+    return conditioned
+
+
+def _drop_final_measurements(gate_sequence):
+    # measurements of qubits nothing acts on afterwards (and whose bit no condition reads)
+    # are what the app does at the end anyway, so they are left out
+    later_qubits, later_bits = set(), set()
+    kept = []
+    for gate_name, params in reversed(gate_sequence):
+        if gate_name == 'Measure' and params not in later_qubits and params not in later_bits:
+            continue
+        kept.append((gate_name, params))
+        if gate_name in EXPORT_CONDITIONED:
+            later_bits.add(params[0])
+            later_qubits.add(params[1])
+        else:
+            later_qubits.update(params if isinstance(params, tuple) else (params,))
+    return kept[::-1]
+
+
+def _resolve_operand(operand, registers, line_number, kind='qubit'):
+    # 'q[2]' -> [offset + 2], 'q' -> every qubit (or bit) of the register
+    match = _OPERAND.match(operand)
+    if not match or match.group(1) not in registers:
+        raise QasmError(f"Line {line_number}: unknown {kind} '{operand.strip()}'")
+    offset, size = registers[match.group(1)]
+    if match.group(2) is None:
+        return list(range(offset, offset + size))
+    index = int(match.group(2))
+    if index >= size:
+        raise QasmError(f"Line {line_number}: {operand.strip()} is out of range (register size {size})")
+    return [offset + index]
+
+
+
+
+
+def export_qasm(num_qubits, gate_sequence, version=2):
+    # gate_sequence -> OpenQASM 2.0 or 3.0 source with a single register q (and a classical
+    # register c, bit k for qubit k, if anything is measured or conditioned)
+    gate_names = {gate_name for gate_name, _ in gate_sequence}
+    classical = bool(gate_names & ({'Measure'} | set(EXPORT_CONDITIONED)))
+    if version == 2:
+        if gate_names & set(EXPORT_CONDITIONED):
+            raise ValueError("Gates conditioned on a single bit need OpenQASM 3 "
+                             "(OpenQASM 2 can only test a whole register)")
+        lines = ['OPENQASM 2.0;', 'include "qelib1.inc";']
+        if 'SWAP' in gate_names:
+            lines.append(_QASM2_SWAP_DEFINITION)
+        lines.append(f'qreg q[{num_qubits}];')
+        if classical:
+            lines.append(f'creg c[{num_qubits}];')
+    elif version == 3:
+        lines = ['OPENQASM 3.0;', 'include "stdgates.inc";', f'qubit[{num_qubits}] q;']
+        if classical:
+            lines.append(f'bit[{num_qubits}] c;')
+    else:
+        raise ValueError(f"Unsupported OpenQASM version {version}")
+
+    for gate_name, params in gate_sequence:
+        if gate_name in MACRO_GATES:
+            raise ValueError(f"{gate_name} is a macro gate, which has no standard OpenQASM gate")
+        if gate_name == 'Measure':
+            lines.append(f"measure q[{params}] -> c[{params}];" if version == 2
+                         else f"c[{params}] = measure q[{params}];")
+            continue
+        if gate_name == 'Reset':
+            lines.append(f"reset q[{params}];")
+            continue
+        if gate_name in EXPORT_CONDITIONED:
+            bit, target = params
+            lines.append(f"if (c[{bit}]) {EXPORT_CONDITIONED[gate_name]} q[{target}];")
+            continue
+        if gate_name not in EXPORT_NAMES:
+            raise ValueError(f"Unknown gate '{gate_name}'")
+        qubits = params if isinstance(params, (tuple, list)) else (params,)
+        lines.append(f"{EXPORT_NAMES[gate_name]} {', '.join(f'q[{q}]' for q in qubits)};")
+
+    return '\n'.join(lines) + '\n'
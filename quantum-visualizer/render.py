@@ -0,0 +1,153 @@
+"""
+render.py
+Render scheduler for the figures shown by app.py.
+Independent figures are built concurrently in a thread pool and streamed into
+Streamlit placeholders as they finish, so the first visual shows up while the
+rest of the page is still being built.
+"""
+
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import matplotlib.pyplot as plt
+
+# streamlit imports its dataframe libraries lazily on the script thread (st.dataframe)
+# while plotly's validators probe sys.modules for them from the render threads.
+# importing them up front keeps workers from seeing a half initialized module
+import pandas  # noqa: F401
+import pyarrow  # noqa: F401
+
+from utils import (
+    plot_bloch_sphere_plotly,
+    plot_state_city_plotly,
+    plot_histogram_plotly,
+    plot_correlation_heatmap_plotly
+)
+
+
+
+
+MAX_RENDER_WORKERS = min(8, (os.cpu_count() or 1) + 2)
+
+# pyplot keeps global state (current figure, figure manager) and is not thread safe.
+# builders that have to go through pyplot (qiskit's circuit drawer) hold this lock
+_PYPLOT_LOCK = threading.Lock()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+
+
+
+def get_render_executor():
+    # one pool per process, shared by every session and rerun
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_RENDER_WORKERS,
+                                           thread_name_prefix='render')
+    return _executor
+
+
+def figure_to_png(fig, dpi=100):
+    # rasterize in the worker thread instead of inside st.pyplot on the script thread
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def _pyplot_figure_to_png(draw):
+    with _PYPLOT_LOCK:
+        fig = draw()
+    try:
+        return figure_to_png(fig)
+    finally:
+        with _PYPLOT_LOCK:
+            plt.close(fig)
+
+
+
+
+
+# figure builders (run in worker threads, must not touch streamlit)
+def build_circuit_diagram(circuit):
+    return _pyplot_figure_to_png(lambda: circuit.draw(output='mpl', style='iqp'))
+
+
+def build_histogram(counts, title="Measurement Results", error_bars=False):
+    return plot_histogram_plotly(counts, title=title, error_bars=error_bars)
+
+
+def build_state_city(statevector, num_qubits, title="State City"):
+    return plot_state_city_plotly(statevector, num_qubits, title=title)
+
+
+def build_bloch_sphere(bloch_vector, title="Bloch Sphere"):
+    return plot_bloch_sphere_plotly(bloch_vector, title=title)
+
+
+
+
+
+def build_correlation_heatmap(correlations, title="Pauli Correlations", pauli='Z'):
+    return plot_correlation_heatmap_plotly(correlations, title=title, pauli=pauli)
+
+
+def build_cached(store, key, build, *args, **kwargs):
+    # figure from the persistent result store, built and stored on a miss
+    if store is None:
+        return build(*args, **kwargs)
+    figure = store.get_figure(key)
+    if figure is None:
+        figure = build(*args, **kwargs)
+        store.put_figure(key, figure)
+    return figure
+
+
+
+
+
+# renderers (run on the script thread)
+def render_png(placeholder, png):
+    placeholder.image(png)
+
+
+def render_plotly(placeholder, fig):
+    placeholder.plotly_chart(fig, use_container_width=True)
+
+
+
+
+
+class RenderScheduler:
+    def __init__(self, executor=None):
+        self._executor = executor or get_render_executor()
+        self._jobs = {}
+
+    def submit(self, placeholder, build, render, *args, **kwargs):
+        # start building right away, the placeholder keeps the figure's spot on the page
+        future = self._executor.submit(build, *args, **kwargs)
+        self._jobs[future] = (placeholder, render)
+        return future
+
+    def draw_ready(self):
+        # non blocking: draws the figures finished so far, the rest stay queued
+        for future in [f for f in self._jobs if f.done()]:
+            placeholder, render = self._jobs.pop(future)
+            render(placeholder, future.result())
+
+    def stream(self):
+        # streamlit calls need the script thread's context, so only the builds are
+        # parallel; each finished figure is drawn here as soon as it is ready. called
+        # again after more submits, it waits for those
+        try:
+            for future in as_completed(list(self._jobs)):
+                placeholder, render = self._jobs.pop(future)
+                render(placeholder, future.result())
+        finally:
+            for future in self._jobs:
+                future.cancel()
+            self._jobs.clear()
@@ -0,0 +1,298 @@
+"""
+result_store.py
+Persistent, content addressed cache for simulation results and rendered figures.
+Entries are indexed in SQLite and their payloads kept as blob files (.npy for arrays,
+.json for counts, .plotly for Plotly figures, .png for images), keyed by circuit fingerprint and
+backend options. The store survives restarts, can be shared by several processes
+(replicas) through one directory and is kept under a size budget by LRU eviction.
+"""
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+import plotly.io as pio
+from qiskit.circuit import Clbit, ClassicalRegister, QuantumCircuit
+
+from counts import Counts
+
+
+
+
+# directory of the shared store; set it to an empty string to disable the store
+CACHE_DIR_ENV = 'QUBITLAB_CACHE_DIR'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'qubitlab')
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+# seconds a process waits for another one holding the database lock
+SQLITE_TIMEOUT = 30.0
+# a full or read only disk, or a database locked past SQLITE_TIMEOUT, only costs the cache:
+# reads become misses and writes are skipped
+_STORE_ERRORS = (OSError, sqlite3.Error)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+"""
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+
+
+
+def circuit_fingerprint(circuit):
+    # content hash of a QuantumCircuit (instruction names, qubit indices, parameters),
+    # for library callers of run_circuit that have no CompactCircuit
+    digest = hashlib.blake2b(digest_size=16)
+    _update_digest(digest, circuit)
+    return digest.hexdigest()
+
+
+def _update_digest(digest, circuit):
+    # control flow blocks (if_test bodies) are QuantumCircuit params whose repr holds an
+    # object address: they are hashed recursively, their condition as (clbit index, value)
+    digest.update(f"{circuit.num_qubits}:{circuit.num_clbits}".encode())
+    for instruction in circuit.data:
+        operation = instruction.operation
+        qubits = [circuit.find_bit(q).index for q in instruction.qubits]
+        blocks = [p for p in operation.params if isinstance(p, QuantumCircuit)]
+        params = ['block' if isinstance(p, QuantumCircuit) else repr(p) for p in operation.params]
+        digest.update(f"|{operation.name}{qubits}{params}".encode())
+        if instruction.clbits:
+            digest.update(f"->{[circuit.find_bit(c).index for c in instruction.clbits]}".encode())
+        condition = getattr(operation, 'condition', None)
+        if condition is not None:
+            digest.update(f"?{_condition_key(circuit, condition)}".encode())
+        for block in blocks:
+            digest.update(b"{")
+            _update_digest(digest, block)
+            digest.update(b"}")
+
+
+def _condition_key(circuit, condition):
+    target, value = condition if isinstance(condition, tuple) else (condition, None)
+    if isinstance(target, Clbit):
+        return ('bit', circuit.find_bit(target).index, value)
+    if isinstance(target, ClassicalRegister):
+        return ('register', target.name, target.size, value)
+    return (str(target), value)  # classical expression
+
+
+def result_key(fingerprint, **options):
+    # one key per circuit and backend option combination (method, shots, what is stored, ...)
+    payload = json.dumps([fingerprint, sorted(options.items())], default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+
+def get_result_store():
+    # process wide store in CACHE_DIR_ENV (or the default directory), None when disabled
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            root = os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+            if not root:
+                return None
+            try:
+                _default_store = ResultStore(root)
+            except _STORE_ERRORS:
+                # a read only or full disk only costs the cache, never the app
+                return None
+    return _default_store
+
+
+
+
+
+class ResultStore:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._blob_dir = os.path.join(self.root, 'blobs')
+        os.makedirs(self._blob_dir, exist_ok=True)
+        # sqlite connections can not be shared between threads, keep one per thread
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(os.path.join(self.root, 'index.sqlite3'),
+                                         timeout=SQLITE_TIMEOUT, isolation_level=None)
+            # WAL lets readers in other processes proceed while one process writes
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _path(self, key, kind):
+        return os.path.join(self._blob_dir, key[:2], f"{key}.{kind}")
+
+    # raw entries
+    def put_bytes(self, key, data, kind='bin'):
+        # False when the entry could not be stored (see _STORE_ERRORS)
+        try:
+            self._put_bytes(key, data, kind)
+        except _STORE_ERRORS:
+            return False
+        return True
+
+    def _put_bytes(self, key, data, kind):
+        path = self._path(key, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write to a temporary file and rename it into place, so readers in other
+        # processes never see a partial blob (same key means same content, last wins)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO entries (key, kind, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, kind, len(data), now, now)
+        )
+        self._evict()
+
+    def get_bytes(self, key, kind='bin'):
+        try:
+            return self._get_bytes(key, kind)
+        except _STORE_ERRORS:
+            return None
+
+    def _get_bytes(self, key, kind):
+        connection = self._connection()
+        row = connection.execute("SELECT kind FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] != kind:
+            return None
+
+        try:
+            with open(self._path(key, kind), 'rb') as f:
+                data = f.read()
+        except OSError:
+            # evicted by another process between the lookup and the read
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+
+        connection.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return data
+
+    # typed entries
+    def put_array(self, key, array):
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(array), allow_pickle=False)
+        self.put_bytes(key, buffer.getvalue(), kind='npy')
+
+    def get_array(self, key):
+        data = self.get_bytes(key, kind='npy')
+        if data is None:
+            return None
+        return np.load(io.BytesIO(data), allow_pickle=False)
+
+    def put_json(self, key, value):
+        self.put_bytes(key, json.dumps(value).encode(), kind='json')
+
+    def get_json(self, key):
+        data = self.get_bytes(key, kind='json')
+        return None if data is None else json.loads(data)
+
+    def put_counts(self, key, counts):
+        counts = Counts.from_dict(counts)
+        self.put_json(key, {'num_qubits': counts.num_qubits, 'indices': counts.indices.tolist(),
+                            'counts': counts.counts.tolist()})
+
+    def get_counts(self, key):
+        data = self.get_json(key)
+        if data is None:
+            return None
+        if 'num_qubits' not in data:
+            return Counts.from_dict(data)  # label dict written by older versions
+        return Counts(data['num_qubits'], data['indices'], data['counts'])
+
+    def put_figure(self, key, figure):
+        # PNG bytes (matplotlib / circuit diagrams) or a Plotly figure
+        if isinstance(figure, (bytes, bytearray)):
+            self.put_bytes(key, bytes(figure), kind='png')
+        else:
+            self.put_bytes(key, pio.to_json(figure).encode(), kind='plotly')
+
+    def get_figure(self, key):
+        data = self.get_bytes(key, kind='png')
+        if data is not None:
+            return data
+        data = self.get_bytes(key, kind='plotly')
+        return None if data is None else pio.from_json(data.decode())
+
+    # maintenance
+    def evict(self):
+        # number of entries dropped, 0 when the database is unavailable (see _STORE_ERRORS)
+        try:
+            return self._evict()
+        except _STORE_ERRORS:
+            return 0
+
+    def _evict(self):
+        # drop least recently used entries until the store fits max_bytes. BEGIN IMMEDIATE
+        # takes the write lock up front, so two processes never evict the same rows
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            removed = []
+            if total > self.max_bytes:
+                for key, kind, size in connection.execute(
+                        "SELECT key, kind, size FROM entries ORDER BY last_access"):
+                    removed.append((key, kind))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+                connection.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in removed])
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+
+        for key, kind in removed:
+            try:
+                os.remove(self._path(key, kind))
+            except OSError:
+                pass
+        return len(removed)
+
+    def clear(self):
+        connection = self._connection()
+        rows = connection.execute("SELECT key, kind FROM entries").fetchall()
+        connection.execute("DELETE FROM entries")
+        for key, kind in rows:
+            try:
+                os.remove(self._path(key, kind))
+            except OSError:
+                pass
+
+    def stats(self):
+        entries, total = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {'entries': entries, 'bytes': total, 'max_bytes': self.max_bytes}
+
+    def __contains__(self, key):
+        return self._connection().execute(
+            "SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
@@ -0,0 +1,59 @@
+"""
+sandbox.py
+In-browser circuit sandbox for 1-3 qubit circuits (a custom Streamlit component).
+The frontend (frontend/sandbox, plain JavaScript, no build step) keeps its own
+statevector, applies the AVAILABLE_GATES gates in the browser and redraws the Bloch
+spheres and probabilities on every click, so trying out gates costs the server nothing.
+Only "Commit" sends the gate sequence back, and the app simulates it like any sidebar edit.
+Measurements, resets and conditioned gates need the server's trajectory simulation and
+are left out of the sandbox.
+"""
+
+import os
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from gates import AVAILABLE_GATES, DYNAMIC_GATES
+
+
+
+
+MAX_SANDBOX_QUBITS = max(AVAILABLE_GATES)
+# the unitary gates the browser simulates, per qubit count
+SANDBOX_GATES = {n: [g for g in gates if g not in DYNAMIC_GATES] for n, gates in AVAILABLE_GATES.items()}
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend', 'sandbox')
+_component = components.declare_component('circuit_sandbox', path=_FRONTEND_DIR)
+
+
+
+
+
+def circuit_sandbox(num_qubits, gate_sequence, key='circuit_sandbox'):
+    # gate sequence committed in the browser since the last call, None otherwise.
+    # the component starts from gate_sequence and resets to it whenever it changes
+    if not 1 <= num_qubits <= MAX_SANDBOX_QUBITS:
+        raise ValueError(f"The sandbox supports 1 to {MAX_SANDBOX_QUBITS} qubits, got {num_qubits}")
+
+    value = _component(
+        num_qubits=num_qubits,
+        gates=SANDBOX_GATES[num_qubits],
+        gate_sequence=[[gate, list(params) if isinstance(params, (tuple, list)) else params]
+                       for gate, params in gate_sequence],
+        key=key,
+        default=None
+    )
+
+    # streamlit hands back the last value on every rerun, the commit id tells new ones apart
+    last_commit = f'{key}_last_commit'
+    if not value or value.get('commit') == st.session_state.get(last_commit):
+        return None
+    st.session_state[last_commit] = value['commit']
+
+    committed = []
+    for gate, params in value['gate_sequence']:
+        if gate not in SANDBOX_GATES[num_qubits]:
+            raise ValueError(f"Gate '{gate}' is not available for {num_qubits} qubit(s)")
+        committed.append((gate, tuple(params) if isinstance(params, list) else params))
+    return committed
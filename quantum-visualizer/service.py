@@ -0,0 +1,463 @@
+"""
+service.py
+Local HTTP simulation service for tools that want the simulator without Streamlit.
+A plain ASGI application (serve it with any ASGI server, e.g. uvicorn) with JSON
+endpoints over the existing simulation and analysis functions:
+    POST /simulate   statevector of a circuit (little-endian, like run_circuit)
+    POST /sample     measurement counts, in the Z basis or any per-qubit X/Y/Z basis
+    POST /analyze    Bloch vectors, most likely states and Pauli expectation values
+    GET  /stats      request, coalescing and batching counters
+Circuits are sent as {"num_qubits": 2, "gate_sequence": [["H", 0], ["CNOT", [0, 1]]]} or
+as {"qasm": "..."}. Every endpoint works from the statevector, which is computed once
+per circuit fingerprint: identical requests in flight share one simulation, and small
+circuits arriving within BATCH_WINDOW of each other run as a single Aer job on the
+bounded simulation pool. Dynamic circuits (mid-circuit measurement, reset) have no single
+statevector and are only sampled, by measurement history (trajectories.py).
+
+Usage:
+    python service.py --port 8765
+    python service.py --benchmark http://127.0.0.1:8765 --clients 16 --requests 500
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from functools import partial
+
+import numpy as np
+
+from circuit_ir import CompactCircuit
+from gates import AVAILABLE_GATES
+from jobs import get_simulation_executor
+from kernels import bloch_vectors
+from observables import expectation_values
+from planner import plan_simulation, MemoryBudgetExceeded, DEFAULT_MEMORY_BUDGET
+from precision import complex_dtype, DEFAULT_PRECISION
+from qasm import parse_qasm, QasmError
+from sparse_sim import SparseStatevector
+from trajectories import run_trajectories
+from utils import run_circuit, run_circuits, sample_basis_counts, top_k_amplitudes
+
+
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# small circuits arriving within this many seconds of each other share one aer job
+BATCH_WINDOW = 0.005
+MAX_BATCH = 64
+# wider circuits are simulated on their own
+MAX_BATCH_QUBITS = 12
+MAX_SHOTS = 1_000_000
+DEFAULT_TOP_K = 16
+# request bodies beyond this are refused before parsing
+MAX_BODY_BYTES = 4 * 1024 ** 2
+
+
+
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_circuit(body):
+    # request body -> (CompactCircuit, precision); ValueError for anything malformed
+    if 'qasm' in body:
+        num_qubits, gate_sequence = parse_qasm(str(body['qasm']))
+    else:
+        try:
+            num_qubits = int(body['num_qubits'])
+            gate_sequence = [(gate, tuple(params) if isinstance(params, list) else params)
+                             for gate, params in body.get('gate_sequence', [])]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Expected 'num_qubits' and 'gate_sequence' or 'qasm' ({e})") from e
+
+    precision = body.get('precision', DEFAULT_PRECISION)
+    complex_dtype(precision)
+    return CompactCircuit.from_gate_sequence(num_qubits, gate_sequence), precision
+
+
+
+
+
+def _simulate_batch(circuits, precision):
+    # one aer job for the whole batch
+    statevectors = run_circuits([c.to_circuit() for c in circuits], precision=precision)
+    return [np.asarray(sv) for sv in statevectors]
+
+
+def _simulate_one(circuit_ir, method, precision):
+    # a batch of one for circuits too wide to share an aer job
+    if method == 'sparse':
+        return [SparseStatevector.from_gate_sequence(circuit_ir.num_qubits, circuit_ir.to_gate_sequence(),
+                                                     precision=precision).to_dense()]
+    return [np.asarray(run_circuit(circuit_ir.to_circuit(), shots=1, method=method,
+                                   precision=precision)['statevector'])]
+
+
+def _resolve(futures, work):
+    # hand the outcome of one executor job to every request waiting on it
+    for index, future in enumerate(futures):
+        if future.done():
+            continue
+        if work.exception() is not None:
+            future.set_exception(work.exception())
+        else:
+            future.set_result(work.result()[index])
+
+
+
+
+
+class SimulationService:
+    # the ASGI application; all bookkeeping happens on the event loop, simulations and
+    # numpy work on the bounded simulation pool
+    def __init__(self, executor=None, batch_window=BATCH_WINDOW, max_batch=MAX_BATCH,
+                 budget=DEFAULT_MEMORY_BUDGET):
+        self._executor = executor or get_simulation_executor()
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.budget = budget
+        self._in_flight = {}  # (fingerprint, precision) -> future of the statevector
+        self._pending = []    # (circuit, precision, future) waiting for the next batch
+        self._flush_handle = None
+        self.stats = {'requests': 0, 'simulations': 0, 'coalesced': 0, 'batches': 0, 'batched_circuits': 0}
+        self._routes = {
+            ('POST', '/simulate'): self.simulate,
+            ('POST', '/sample'): self.sample,
+            ('POST', '/analyze'): self.analyze,
+            ('GET', '/stats'): self.get_stats
+        }
+
+    # statevectors (coalesced and batched)
+    async def statevector(self, circuit_ir, precision):
+        if circuit_ir.is_dynamic():
+            raise ValueError("Circuits with measurements or resets have no single statevector, use /sample")
+        key = (circuit_ir.fingerprint, precision)
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+
+        # refused before anything is queued when it does not fit the budget
+        method = plan_simulation(circuit_ir.num_qubits, circuit_ir.to_gate_sequence(), budget=self.budget,
+                                 needs=('amplitudes',), methods=('statevector', 'sparse'),
+                                 precision=precision)['method']
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._in_flight[key] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        self.stats['simulations'] += 1
+
+        # small circuits share an aer job whatever the planner picked: a batch costs about
+        # as much as one aer run, which is what a sparse run saves on its own
+        if circuit_ir.num_qubits <= MAX_BATCH_QUBITS:
+            self._enqueue(circuit_ir, precision, future)
+        else:
+            work = loop.run_in_executor(self._executor, _simulate_one, circuit_ir, method, precision)
+            work.add_done_callback(partial(_resolve, [future]))
+        # shielded: a client disconnecting does not cancel the simulation others wait for
+        return await asyncio.shield(future)
+
+    def _enqueue(self, circuit_ir, precision, future):
+        self._pending.append((circuit_ir, precision, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+
+        # one aer job per precision
+        groups = {}
+        for circuit_ir, precision, future in pending:
+            groups.setdefault(precision, []).append((circuit_ir, future))
+
+        loop = asyncio.get_running_loop()
+        for precision, items in groups.items():
+            self.stats['batches'] += 1
+            self.stats['batched_circuits'] += len(items)
+            work = loop.run_in_executor(self._executor, _simulate_batch, [c for c, _ in items], precision)
+            work.add_done_callback(partial(_resolve, [f for _, f in items]))
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # endpoints
+    async def simulate(self, body):
+        circuit_ir, precision = parse_circuit(body)
+        sv = await self.statevector(circuit_ir, precision)
+        return {
+            'fingerprint': circuit_ir.fingerprint,
+            'num_qubits': circuit_ir.num_qubits,
+            'precision': precision,
+            'basis_order': 'little-endian',
+            'real': sv.real.tolist(),
+            'imag': sv.imag.tolist()
+        }
+
+    async def sample(self, body):
+        circuit_ir, precision = parse_circuit(body)
+        shots = int(body.get('shots', 1024))
+        if not 1 <= shots <= MAX_SHOTS:
+            raise ValueError(f"shots must be between 1 and {MAX_SHOTS}")
+        bases = str(body.get('bases', 'Z' * circuit_ir.num_qubits))
+
+        if circuit_ir.is_dynamic():
+            return await self._sample_trajectories(circuit_ir, shots, bases, precision, body.get('seed'))
+
+        sv = await self.statevector(circuit_ir, precision)
+        counts = await self._run(sample_basis_counts, sv, bases, shots, body.get('seed'))
+        return {
+            'fingerprint': circuit_ir.fingerprint,
+            'shots': shots,
+            'bases': bases.upper(),
+            'counts': counts.to_dict()
+        }
+
+    async def _sample_trajectories(self, circuit_ir, shots, bases, precision, seed):
+        # shots grouped by measurement history, not coalesced (every request draws its own shots)
+        if bases.upper() != 'Z' * circuit_ir.num_qubits:
+            raise ValueError("Circuits with measurements or resets are sampled in the Z basis only")
+        plan_simulation(circuit_ir.num_qubits, circuit_ir.to_gate_sequence(), budget=self.budget,
+                        needs=('counts',), methods=('trajectories',), precision=precision, shots=shots)
+        self.stats['simulations'] += 1
+        result = await self._run(partial(run_trajectories, circuit_ir, shots, seed=seed, precision=precision))
+        return {
+            'fingerprint': circuit_ir.fingerprint,
+            'shots': shots,
+            'bases': bases.upper(),
+            'counts': result['counts'].to_dict(),
+            'histories': result['histories'].to_dict()
+        }
+
+    async def analyze(self, body):
+        circuit_ir, precision = parse_circuit(body)
+        num_qubits = circuit_ir.num_qubits
+        paulis = list(body.get('paulis', []))
+        top_k = int(body.get('top_k', DEFAULT_TOP_K))
+
+        sv = await self.statevector(circuit_ir, precision)
+
+        def analysis():
+            return {
+                'bloch_vectors': bloch_vectors(sv, num_qubits).tolist(),
+                'top_states': [
+                    {'state': label, 'amplitude': [float(a.real), float(a.imag)], 'probability': float(p)}
+                    for label, a, p in top_k_amplitudes(sv, k=top_k)
+                ],
+                'expectation_values': dict(zip(paulis, expectation_values(sv, paulis, num_qubits).tolist()))
+            }
+
+        return {'fingerprint': circuit_ir.fingerprint, **await self._run(analysis)}
+
+    async def get_stats(self, body):
+        return {**self.stats, 'in_flight': len(self._in_flight), 'queued': len(self._pending)}
+
+    # ASGI
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+
+        self.stats['requests'] += 1
+        try:
+            handler = self._routes.get((scope['method'], scope['path']))
+            if handler is None:
+                raise ServiceError(404, f"No endpoint {scope['method']} {scope['path']}")
+            status, response = 200, await handler(await _read_json(receive))
+        except ServiceError as e:
+            status, response = e.status, {'error': str(e)}
+        except MemoryBudgetExceeded as e:
+            status, response = 413, {'error': str(e)}
+        except (ValueError, TypeError, QasmError) as e:
+            # TypeError: fields of the wrong type, e.g. "shots": null
+            status, response = 400, {'error': str(e)}
+        except Exception as e:
+            # simulator failures still answer with JSON instead of dropping the connection
+            status, response = 500, {'error': f"{type(e).__name__}: {e}"}
+        await _send_json(send, status, response)
+
+
+async def _read_json(receive):
+    chunks = []
+    size = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ServiceError(413, f"Request body is larger than {MAX_BODY_BYTES} bytes")
+        chunks.append(chunk)
+        more_body = message.get('more_body', False)
+
+    data = b''.join(chunks)
+    try:
+        body = json.loads(data) if data else {}
+    except ValueError as e:
+        raise ServiceError(400, f"Request body is not valid JSON: {e}") from e
+    if not isinstance(body, dict):
+        raise ServiceError(400, "Request body must be a JSON object")
+    return body
+
+
+async def _send_json(send, status, payload):
+    data = json.dumps(payload).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(data)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': data})
+
+
+# `uvicorn service:app`
+app = SimulationService()
+
+
+
+
+
+def run_throughput_benchmark(url, clients=8, requests=200, num_qubits=3, length=20, unique=0.25, seed=0):
+    # closed loop load against a running service: every client sends its next request as
+    # soon as the previous one returns. only a fraction `unique` of the circuits differ,
+    # so identical requests overlap and get coalesced
+    from benchmark import random_gate_sequence
+
+    rng = random.Random(seed)
+    pool = [random_gate_sequence(num_qubits, length, seed=s) for s in range(max(1, int(requests * unique)))]
+    endpoints = ['/simulate', '/sample', '/analyze']
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def post(path, body):
+        request = urllib.request.Request(url.rstrip('/') + path, data=json.dumps(body).encode(),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def client(count, client_seed):
+        client_rng = random.Random(client_seed)
+        for _ in range(count):
+            body = {
+                'num_qubits': num_qubits,
+                'gate_sequence': [[g, list(p) if isinstance(p, tuple) else p] for g, p in client_rng.choice(pool)],
+                'shots': 1024
+            }
+            start = time.perf_counter()
+            try:
+                post(client_rng.choice(endpoints), body)
+            except (urllib.error.URLError, OSError) as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    def stats():
+        with urllib.request.urlopen(url.rstrip('/') + '/stats') as response:
+            return json.loads(response.read())
+
+    before = stats()
+    threads = [threading.Thread(target=client, args=(requests // clients + (i < requests % clients), rng.random()))
+               for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    after = stats()
+
+    latencies_ms = np.array(latencies) * 1e3
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': float(np.percentile(latencies_ms, 50)) if len(latencies) else None,
+        'p95_ms': float(np.percentile(latencies_ms, 95)) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies_ms, 99)) if len(latencies) else None,
+        'mean_ms': statistics.mean(latencies_ms) if len(latencies) else None,
+        # what the service saved: requests served without their own simulation / aer job
+        'simulations': after['simulations'] - before['simulations'],
+        'coalesced': after['coalesced'] - before['coalesced'],
+        'batches': after['batches'] - before['batches'],
+        'batched_circuits': after['batched_circuits'] - before['batched_circuits']
+    }
+
+
+def print_benchmark(summary):
+    print(f"{summary['requests']} requests in {summary['seconds']:.2f} s "
+          f"({summary['throughput']:.1f} req/s), {summary['errors']} errors")
+    if summary['requests']:
+        print(f"latency p50 {summary['p50_ms']:.1f} ms   p95 {summary['p95_ms']:.1f} ms   "
+              f"p99 {summary['p99_ms']:.1f} ms")
+    print(f"{summary['simulations']} simulations, {summary['coalesced']} coalesced requests, "
+          f"{summary['batched_circuits']} circuits in {summary['batches']} aer batches")
+    if summary['simulations'] and not summary['batches']:
+        print("warning: no simulation was batched")
+
+
+
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the simulator over HTTP, or benchmark a running service.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--benchmark', metavar='URL', help="run the throughput benchmark against URL")
+    parser.add_argument('--clients', type=int, default=8, help="concurrent benchmark clients")
+    parser.add_argument('--requests', type=int, default=200, help="benchmark requests in total")
+    parser.add_argument('--qubits', type=int, default=3, choices=sorted(AVAILABLE_GATES),
+                        help="benchmark circuit width")
+    parser.add_argument('--unique', type=float, default=0.25,
+                        help="fraction of distinct circuits among the benchmark requests")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.benchmark:
+        summary = run_throughput_benchmark(args.benchmark, clients=args.clients, requests=args.requests,
+                                           num_qubits=args.qubits, unique=args.unique)
+        print_benchmark(summary)
+        # circuits this narrow always go through the batcher
+        unbatched = args.qubits <= MAX_BATCH_QUBITS and summary['simulations'] and not summary['batches']
+        return 1 if summary['errors'] or unbatched else 0
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("Serving needs an ASGI server: pip install uvicorn (or run `<server> service:app`)")
+        return 1
+    uvicorn.run(app, host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+sparse_sim.py
+Sparse statevector engine for mostly classical circuits.
+Only nonzero amplitudes are tracked (sorted index array + amplitude array), so
+reversible logic (X, CNOT, SWAP, Toffoli) on 30+ qubits costs as much as the number
+of basis states actually occupied. Past a fill threshold the state switches to a
+dense array in Qiskit's little-endian order, the format the plots expect.
+Macro gates run as one kernel each: MCX / MCZ / Oracle stay sparse, QFT and the
+diffuser spread over their whole register and switch to the dense array first.
+Amplitudes are complex128 or complex64 depending on the precision setting.
+"""
+
+import numpy as np
+
+from counts import Counts, reverse_bits
+from precision import complex_dtype, DEFAULT_PRECISION
+from macros import apply_macro, validate_macro, register_width, _select, MACRO_GATES, BRANCHING_MACROS
+
+
+
+
+# switch to dense once this fraction of all basis states is occupied
+DEFAULT_FILL_THRESHOLD = 0.125
+# never densify beyond this (2^26 complex128 amplitudes = 1 GiB)
+MAX_DENSE_QUBITS = 26
+# largest qubit count the int64 index array can address
+MAX_SPARSE_QUBITS = 62
+# amplitudes smaller than this after interference are dropped. single precision
+# leaves rounding residues around 1e-8 where amplitudes cancel
+PRUNE_TOLERANCE = {
+    'double': 1e-12,
+    'single': 1e-6
+}
+
+_SQRT1_2 = 1 / np.sqrt(2)
+
+# phase applied to the |1> component
+_PHASES = {
+    'Z': -1,
+    'S': 1j,
+    'T': np.exp(1j * np.pi / 4)
+}
+
+
+
+
+
+class SparseStatevector:
+    def __init__(self, num_qubits, fill_threshold=DEFAULT_FILL_THRESHOLD, precision=DEFAULT_PRECISION):
+        if not 1 <= num_qubits <= MAX_SPARSE_QUBITS:
+            raise ValueError(f"Sparse engine supports 1 to {MAX_SPARSE_QUBITS} qubits, got {num_qubits}")
+
+        self.num_qubits = num_qubits
+        self.fill_threshold = fill_threshold
+        self.dtype = complex_dtype(precision)
+        self.prune_tolerance = PRUNE_TOLERANCE[precision]
+        # |0...0>
+        self.indices = np.zeros(1, dtype=np.int64)
+        self.amplitudes = np.ones(1, dtype=self.dtype)
+        self.dense = None  # little-endian dense array once past the fill threshold
+
+    @classmethod
+    def from_gate_sequence(cls, num_qubits, gate_sequence, fill_threshold=DEFAULT_FILL_THRESHOLD,
+                           precision=DEFAULT_PRECISION):
+        state = cls(num_qubits, fill_threshold=fill_threshold, precision=precision)
+        state.apply_sequence(gate_sequence)
+        return state
+
+    @property
+    def is_dense(self):
+        return self.dense is not None
+
+    @property
+    def dim(self):
+        return 2 ** self.num_qubits
+
+    @property
+    def nnz(self):
+        if self.is_dense:
+            return int(np.count_nonzero(np.abs(self.dense) > self.prune_tolerance))
+        return len(self.indices)
+
+    def apply_sequence(self, gate_sequence):
+        for gate_name, params in gate_sequence:
+            qubits = tuple(params) if isinstance(params, (tuple, list)) else (params,)
+            self.apply(gate_name, qubits)
+        return self
+
+    def apply(self, gate_name, qubits):
+        if gate_name in MACRO_GATES:
+            validate_macro(gate_name, qubits, self.num_qubits)
+        elif any(not 0 <= q < self.num_qubits for q in qubits):
+            raise ValueError(f"{gate_name} on {qubits} is out of range for {self.num_qubits} qubit(s)")
+
+        if gate_name in BRANCHING_MACROS and not self.is_dense:
+            # the register ends up fully occupied, the dense kernel is cheaper than branching
+            self.dense = self.to_dense()
+            self.indices = self.amplitudes = None
+
+        if self.is_dense:
+            _apply_dense(self.dense.reshape((2,) * self.num_qubits), self.num_qubits, gate_name, qubits)
+            return
+
+        indices, amplitudes = _apply_sparse(self.indices, self.amplitudes, gate_name, qubits,
+                                            self.prune_tolerance)
+        # phases and the interference sums are computed in double precision
+        self.indices, self.amplitudes = indices, amplitudes.astype(self.dtype, copy=False)
+        if (len(self.indices) > self.fill_threshold * self.dim
+                and self.num_qubits <= MAX_DENSE_QUBITS):
+            self.dense = self.to_dense()
+            self.indices = self.amplitudes = None
+
+    # conversions
+    def to_dense(self):
+        if self.is_dense:
+            return self.dense.copy()
+        if self.num_qubits > MAX_DENSE_QUBITS:
+            raise ValueError(f"A dense {self.num_qubits}-qubit statevector would not fit in memory")
+
+        dense = np.zeros(self.dim, dtype=self.dtype)
+        dense[self.indices] = self.amplitudes
+        return dense
+
+    def nonzero(self):
+        # (little-endian indices, amplitudes) of the occupied basis states
+        if self.is_dense:
+            indices = np.flatnonzero(np.abs(self.dense) > self.prune_tolerance)
+            return indices, self.dense[indices]
+        return self.indices, self.amplitudes
+
+    def probabilities(self):
+        # big-endian label -> probability, nonzero states only (like calculate_probabilities)
+        indices, amplitudes = self.nonzero()
+        probabilities = np.abs(amplitudes) ** 2
+        return {
+            format(i, f'0{self.num_qubits}b')[::-1]: p
+            for i, p in zip(indices.tolist(), probabilities.tolist())
+        }
+
+    def sample_counts(self, shots=1024, seed=None):
+        # big-endian counts like get_measurement_counts, one multinomial draw for all shots
+        indices, amplitudes = self.nonzero()
+        # float64 so the normalized probabilities sum to 1 within multinomial's tolerance
+        probabilities = np.abs(amplitudes).astype(np.float64) ** 2
+        draws = np.random.default_rng(seed).multinomial(shots, probabilities / probabilities.sum())
+        hit = np.flatnonzero(draws)
+        return Counts(self.num_qubits, reverse_bits(indices[hit], self.num_qubits), draws[hit])
+
+
+
+
+
+def _bit(indices, qubit):
+    return (indices >> qubit) & 1
+
+
+def _register_mask(qubits):
+    first, last = qubits[:2]
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+def _apply_sparse(indices, amplitudes, gate_name, qubits, prune_tolerance=PRUNE_TOLERANCE['double']):
+    # permutation and phase gates keep the number of nonzero entries,
+    # only H can branch (and interfere)
+    if gate_name == 'X':
+        return indices ^ (1 << qubits[0]), amplitudes
+
+    if gate_name == 'Y':
+        # Y|0> = i|1>, Y|1> = -i|0>
+        phase = np.where(_bit(indices, qubits[0]) == 1, -1j, 1j)
+        return indices ^ (1 << qubits[0]), amplitudes * phase
+
+    if gate_name in _PHASES:
+        phase = np.where(_bit(indices, qubits[0]) == 1, _PHASES[gate_name], 1)
+        return indices, amplitudes * phase
+
+    if gate_name == 'CNOT':
+        control, target = qubits
+        return indices ^ (_bit(indices, control) << target), amplitudes
+
+    if gate_name == 'Toffoli':
+        control1, control2, target = qubits
+        flip = _bit(indices, control1) & _bit(indices, control2)
+        return indices ^ (flip << target), amplitudes
+
+    if gate_name == 'SWAP':
+        qubit1, qubit2 = qubits
+        differ = _bit(indices, qubit1) ^ _bit(indices, qubit2)
+        return indices ^ ((differ << qubit1) | (differ << qubit2)), amplitudes
+
+    if gate_name == 'MCX':
+        mask = _register_mask(qubits)
+        flip = ((indices & mask) == mask).astype(np.int64)
+        return indices ^ (flip << qubits[2]), amplitudes
+
+    if gate_name == 'MCZ':
+        mask = _register_mask(qubits)
+        return indices, np.where((indices & mask) == mask, -amplitudes, amplitudes)
+
+    if gate_name == 'Oracle':
+        first = qubits[0]
+        value = (indices >> first) & ((1 << register_width(qubits)) - 1)
+        return indices, np.where(value == qubits[2], -amplitudes, amplitudes)
+
+    if gate_name == 'H':
+        mask = np.int64(1) << qubits[0]
+        bit = _bit(indices, qubits[0])
+        # |b> -> (|0> + (-1)^b |1>) / sqrt(2)
+        branched_indices = np.concatenate([indices & ~mask, indices | mask])
+        branched_amplitudes = np.concatenate([amplitudes, np.where(bit == 1, -amplitudes, amplitudes)])
+        return _combine(branched_indices, branched_amplitudes * _SQRT1_2, prune_tolerance)
+
+    raise ValueError(f"Unknown gate '{gate_name}'")
+
+
+def _combine(indices, amplitudes, prune_tolerance=PRUNE_TOLERANCE['double']):
+    # sum amplitudes landing on the same basis state, drop the ones that cancel
+    unique_indices, inverse = np.unique(indices, return_inverse=True)
+    combined = (np.bincount(inverse, weights=amplitudes.real, minlength=len(unique_indices))
+                + 1j * np.bincount(inverse, weights=amplitudes.imag, minlength=len(unique_indices)))
+    keep = np.abs(combined) > prune_tolerance
+    return unique_indices[keep], combined[keep]
+
+
+def _swap_slices(tensor, first, second):
+    saved = tensor[first].copy()
+    tensor[first] = tensor[second]
+    tensor[second] = saved
+
+
+def _apply_dense(tensor, num_qubits, gate_name, qubits):
+    # in place on the tensor view, touching only the affected half/quarter of the state
+    if gate_name == 'X':
+        _swap_slices(tensor, _select(num_qubits, {qubits[0]: 0}), _select(num_qubits, {qubits[0]: 1}))
+    elif gate_name == 'Y':
+        zero, one = _select(num_qubits, {qubits[0]: 0}), _select(num_qubits, {qubits[0]: 1})
+        saved = tensor[zero].copy()
+        tensor[zero] = -1j * tensor[one]
+        tensor[one] = 1j * saved
+    elif gate_name in _PHASES:
+        tensor[_select(num_qubits, {qubits[0]: 1})] *= _PHASES[gate_name]
+    elif gate_name == 'H':
+        zero, one = _select(num_qubits, {qubits[0]: 0}), _select(num_qubits, {qubits[0]: 1})
+        a0 = tensor[zero].copy()
+        a1 = tensor[one].copy()
+        tensor[zero] = (a0 + a1) * _SQRT1_2
+        tensor[one] = (a0 - a1) * _SQRT1_2
+    elif gate_name in ('CNOT', 'Toffoli'):
+        *controls, target = qubits
+        fixed = {c: 1 for c in controls}
+        _swap_slices(tensor, _select(num_qubits, {**fixed, target: 0}),
+                     _select(num_qubits, {**fixed, target: 1}))
+    elif gate_name == 'SWAP':
+        qubit1, qubit2 = qubits
+        _swap_slices(tensor, _select(num_qubits, {qubit1: 0, qubit2: 1}),
+                     _select(num_qubits, {qubit1: 1, qubit2: 0}))
+    elif gate_name in MACRO_GATES:
+        apply_macro(tensor.reshape(-1), num_qubits, gate_name, qubits)
+    else:
+        raise ValueError(f"Unknown gate '{gate_name}'")
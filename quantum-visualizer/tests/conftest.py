@@ -0,0 +1,9 @@
+"""
+conftest.py
+Puts the app's flat modules (circuit_ir, unitary, ...) on the import path of the tests.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
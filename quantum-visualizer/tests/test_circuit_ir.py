@@ -0,0 +1,40 @@
+"""
+test_circuit_ir.py
+Serialized circuits and share tokens round trip, and crafted ones are rejected when
+they are loaded instead of failing later in a simulator.
+"""
+
+import numpy as np
+import pytest
+
+from circuit_ir import CompactCircuit, GATE_DTYPE, OPCODES, NO_QUBIT
+
+
+
+
+def _crafted(num_qubits, gates):
+    # bypasses from_gate_sequence, like a hand-edited token
+    return CompactCircuit(num_qubits, np.array(gates, dtype=GATE_DTYPE)).to_url_token()
+
+
+
+
+
+def test_round_trip():
+    circuit = CompactCircuit.from_gate_sequence(3, [('H', 0), ('CNOT', (0, 1)), ('QFT', (0, 2)),
+                                                    ('Measure', 1), ('CondX', (1, 1))])
+    assert CompactCircuit.from_url_token(circuit.to_url_token()) == circuit
+    assert CompactCircuit.from_bytes(circuit.to_bytes()) == circuit
+
+
+@pytest.mark.parametrize('num_qubits, gates', [
+    (2, [(OPCODES['CNOT'], (0, 200, NO_QUBIT))]),
+    (2, [(OPCODES['CNOT'], (1, 1, NO_QUBIT))]),
+    (2, [(OPCODES['X'], (0, 1, NO_QUBIT))]),
+    (1, [(OPCODES['CNOT'], (0, 1, NO_QUBIT))]),
+    (3, [(OPCODES['QFT'], (2, 0, NO_QUBIT))]),
+    (0, [])
+])
+def test_crafted_tokens_are_rejected(num_qubits, gates):
+    with pytest.raises(ValueError):
+        CompactCircuit.from_url_token(_crafted(num_qubits, gates))
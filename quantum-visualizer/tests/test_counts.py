@@ -0,0 +1,59 @@
+"""
+test_counts.py
+Array backed counts: marginals pick and order bits like qiskit's marginal_counts, and
+merged runs add up per outcome.
+"""
+
+import pytest
+from qiskit.result import marginal_counts
+
+from counts import Counts
+
+
+
+
+COUNTS = {'000': 5, '011': 7, '101': 11, '110': 13, '111': 17}
+
+
+
+
+
+@pytest.mark.parametrize('qubits', [[0], [2], [0, 2], [2, 0], [1, 2, 0]])
+def test_marginal(qubits):
+    marginal = Counts.from_dict(COUNTS).marginal(qubits)
+    assert marginal.num_qubits == len(qubits)
+    assert marginal.shots == sum(COUNTS.values())
+    # qiskit labels are little-endian (clbit 0 rightmost) and its result bits are in
+    # ascending index order, so only the sorted case maps straight over
+    if qubits == sorted(qubits):
+        little_endian = {label[::-1]: count for label, count in COUNTS.items()}
+        expected = marginal_counts(little_endian, indices=qubits)
+        assert marginal.to_dict() == {label[::-1]: count for label, count in expected.items()}
+    expected = {}
+    for label, count in COUNTS.items():
+        key = ''.join(label[q] for q in qubits)
+        expected[key] = expected.get(key, 0) + count
+    assert marginal.to_dict() == expected
+
+
+def test_marginal_out_of_range():
+    with pytest.raises(ValueError):
+        Counts.from_dict(COUNTS).marginal([3])
+
+
+def test_merge():
+    first = Counts.from_dict({'00': 3, '01': 1})
+    second = Counts.from_dict({'01': 2, '11': 4})
+    merged = first.merge(second, Counts.from_dict({'00': 1}))
+    assert merged.to_dict() == {'00': 4, '01': 3, '11': 4}
+    assert (first + second).to_dict() == {'00': 3, '01': 3, '11': 4}
+    assert first.to_dict() == {'00': 3, '01': 1}
+    with pytest.raises(ValueError):
+        first.merge(Counts.from_dict({'000': 1}))
+
+
+def test_from_qiskit_matches_labels():
+    # raw hex keys of little-endian indices and get_counts() bitstrings give the same counts
+    raw = {hex(int(label[::-1], 2)): count for label, count in COUNTS.items()}
+    assert Counts.from_qiskit(raw, 3).to_dict() == COUNTS
+    assert Counts.from_qiskit({label[::-1]: count for label, count in COUNTS.items()}, 3) == COUNTS
@@ -0,0 +1,89 @@
+"""
+test_precision.py
+Single precision (complex64) results stay within fixed bounds of double precision:
+Bloch vectors and probabilities of the sparse engine and of Aer, for random circuits
+of the app's gates.
+"""
+
+import numpy as np
+import pytest
+
+from gates import create_circuit
+from observables import single_qubit_bloch_vectors
+from sparse_sim import SparseStatevector
+from utils import calculate_probabilities, run_circuit
+
+
+
+
+# documented in precision.py: components and probabilities within ~1e-6 of double
+BLOCH_ATOL = 1e-6
+PROBABILITY_ATOL = 1e-6
+NUM_QUBITS = 4
+NUM_GATES = 60
+SEEDS = range(5)
+
+SINGLE_GATES = ('H', 'X', 'Y', 'Z', 'S', 'T')
+TWO_QUBIT_GATES = ('CNOT', 'SWAP')
+
+
+
+
+
+def _random_sequence(seed, num_qubits=NUM_QUBITS, num_gates=NUM_GATES):
+    rng = np.random.default_rng(seed)
+    sequence = []
+    for _ in range(num_gates):
+        if rng.random() < 0.7:
+            sequence.append((str(rng.choice(SINGLE_GATES)), int(rng.integers(num_qubits))))
+        else:
+            a, b = rng.choice(num_qubits, size=2, replace=False).tolist()
+            sequence.append((str(rng.choice(TWO_QUBIT_GATES)), (a, b)))
+    return sequence
+
+
+def _sparse_statevector(sequence, precision):
+    return SparseStatevector.from_gate_sequence(NUM_QUBITS, sequence, precision=precision).to_dense()
+
+
+def _aer_statevector(sequence, precision):
+    circuit = create_circuit(NUM_QUBITS, sequence)
+    return np.asarray(run_circuit(circuit, shots=1, precision=precision)['statevector'])
+
+
+def _probability_error(single, double):
+    single = calculate_probabilities(single)
+    double = calculate_probabilities(double)
+    assert single.keys() == double.keys()
+    return max(abs(float(single[label]) - float(double[label])) for label in double)
+
+
+ENGINES = {'sparse': _sparse_statevector, 'aer': _aer_statevector}
+
+
+
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_single_precision_dtype(engine, seed):
+    sequence = _random_sequence(seed)
+    assert ENGINES[engine](sequence, 'single').dtype == np.complex64
+    assert ENGINES[engine](sequence, 'double').dtype == np.complex128
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_bloch_vectors_within_bound(engine, seed):
+    sequence = _random_sequence(seed)
+    single = single_qubit_bloch_vectors(ENGINES[engine](sequence, 'single'), NUM_QUBITS)
+    double = single_qubit_bloch_vectors(ENGINES[engine](sequence, 'double'), NUM_QUBITS)
+    np.testing.assert_allclose(single, double, rtol=0, atol=BLOCH_ATOL)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_probabilities_within_bound(engine, seed):
+    sequence = _random_sequence(seed)
+    error = _probability_error(ENGINES[engine](sequence, 'single'), ENGINES[engine](sequence, 'double'))
+    assert error <= PROBABILITY_ATOL
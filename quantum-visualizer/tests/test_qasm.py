@@ -0,0 +1,84 @@
+"""
+test_qasm.py
+The streaming OpenQASM parser: single bit conditions, dropped final measurements, and
+exports that qiskit reads back as the same circuit (and that come back from qiskit).
+"""
+
+import numpy as np
+import pytest
+import qiskit.qasm2
+from qiskit.quantum_info import Statevector
+
+from qasm import parse_qasm, export_qasm, QasmError
+from sparse_sim import SparseStatevector
+
+
+
+
+NUM_QUBITS = 3
+SEQUENCE = [('H', 0), ('CNOT', (0, 1)), ('T', 2), ('SWAP', (1, 2)), ('S', 0), ('Y', 1),
+            ('Toffoli', (0, 1, 2)), ('Z', 2), ('X', 0)]
+
+TELEPORT = """OPENQASM 3.0;
+include "stdgates.inc";
+qubit[3] q;
+bit[3] c;
+h q[1];
+cx q[1], q[2];
+cx q[0], q[1];
+h q[0];
+c[0] = measure q[0];
+c[1] = measure q[1];
+if (c[1]) x q[2];
+if (c[0] == 1) { z q[2]; }
+"""
+
+
+
+
+
+def test_conditions():
+    num_qubits, sequence = parse_qasm(TELEPORT)
+    assert num_qubits == 3
+    assert sequence == [('H', 1), ('CNOT', (1, 2)), ('CNOT', (0, 1)), ('H', 0), ('Measure', 0),
+                        ('Measure', 1), ('CondX', (1, 2)), ('CondZ', (0, 2))]
+
+
+def test_one_bit_register_condition():
+    source = 'OPENQASM 2.0;\nqreg q[2];\ncreg c0[1];\nh q[0];\nmeasure q[0] -> c0[0];\nif(c0==1) x q[1];\n'
+    assert parse_qasm(source)[1] == [('H', 0), ('Measure', 0), ('CondX', (0, 1))]
+
+
+@pytest.mark.parametrize('statement', [
+    'if (c == 1) x q[1];',       # whole register
+    'if (c[0] == 0) x q[1];',    # only a bit being 1 is supported
+    'if (c[0]) h q[1];',         # only x and z can be conditioned
+    'measure q[0] -> c[1];'      # bit k holds qubit k
+])
+def test_unsupported_classical_statements(statement):
+    with pytest.raises(QasmError):
+        parse_qasm(f'OPENQASM 2.0;\nqreg q[2];\ncreg c[2];\n{statement}\n')
+
+
+def test_final_measurements_are_dropped():
+    source = ('OPENQASM 2.0;\nqreg q[3];\ncreg c[3];\nh q[0];\nmeasure q[0] -> c[0];\n'
+              'measure q[1] -> c[1];\nx q[1];\nmeasure q[2] -> c[2];\nif (c[2] == 1) z q[1];\n'
+              'measure q;\n')
+    # nothing acts on q[0] after its measurement, q[1] is acted on and bit 2 is read later
+    assert parse_qasm(source)[1] == [('H', 0), ('Measure', 1), ('X', 1), ('Measure', 2), ('CondZ', (2, 1))]
+
+
+def test_export_round_trip():
+    for version in (2, 3):
+        assert parse_qasm(export_qasm(NUM_QUBITS, SEQUENCE, version=version)) == (NUM_QUBITS, SEQUENCE)
+    num_qubits, sequence = parse_qasm(TELEPORT)
+    assert parse_qasm(export_qasm(num_qubits, sequence, version=3))[1] == sequence
+
+
+def test_export_matches_qiskit():
+    expected = SparseStatevector.from_gate_sequence(NUM_QUBITS, SEQUENCE).to_dense()
+    loaded = qiskit.qasm2.loads(export_qasm(NUM_QUBITS, SEQUENCE),
+                                custom_instructions=qiskit.qasm2.LEGACY_CUSTOM_INSTRUCTIONS)
+    assert np.allclose(Statevector(loaded).data, expected)
+    # and qiskit's own export parses back to the same sequence
+    assert parse_qasm(qiskit.qasm2.dumps(loaded)) == (NUM_QUBITS, SEQUENCE)
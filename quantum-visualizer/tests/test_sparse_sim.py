@@ -0,0 +1,78 @@
+"""
+test_sparse_sim.py
+The sparse engine gives the same statevector as qiskit's dense Statevector, on the
+sparse path and after switching to a dense array, including macro gates.
+"""
+
+import numpy as np
+import pytest
+from qiskit.quantum_info import Statevector
+
+from circuit_ir import CompactCircuit
+from gates import expand_macros
+from sparse_sim import SparseStatevector
+
+
+
+
+NUM_QUBITS = 4
+# never and always past the fill threshold, so both representations are checked
+FILL_THRESHOLDS = (2.0, 0.0)
+
+CASES = [
+    [('X', 0), ('CNOT', (0, 1)), ('Toffoli', (0, 1, 3)), ('SWAP', (1, 2))],
+    [('H', 0), ('CNOT', (0, 1)), ('CNOT', (1, 2)), ('CNOT', (2, 3))],
+    [('H', 1), ('S', 1), ('T', 2), ('Y', 3), ('Z', 1), ('CNOT', (1, 3)), ('H', 2)],
+    [('X', 0), ('QFT', (0, 2)), ('T', 3), ('IQFT', (1, 3))],
+    [('Diffuser', (0, 3)), ('Oracle', (0, 2, 5)), ('Diffuser', (0, 2))],
+    [('H', 0), ('MCX', (0, 1, 3)), ('MCZ', (1, 3)), ('H', 2), ('QFT', (1, 2))]
+]
+SINGLE_GATES = ('H', 'X', 'Y', 'Z', 'S', 'T')
+TWO_QUBIT_GATES = ('CNOT', 'SWAP')
+SEEDS = range(5)
+
+
+
+
+
+def _random_sequence(seed, num_gates=30):
+    rng = np.random.default_rng(seed)
+    sequence = []
+    for _ in range(num_gates):
+        if rng.random() < 0.6:
+            sequence.append((str(rng.choice(SINGLE_GATES)), int(rng.integers(NUM_QUBITS))))
+        else:
+            a, b, c = rng.choice(NUM_QUBITS, size=3, replace=False).tolist()
+            gate = str(rng.choice(TWO_QUBIT_GATES + ('Toffoli',)))
+            sequence.append((gate, (a, b, c) if gate == 'Toffoli' else (a, b)))
+    return sequence
+
+
+def _dense_statevector(sequence):
+    circuit = CompactCircuit.from_gate_sequence(NUM_QUBITS, sequence).to_circuit(save_statevector=False)
+    return Statevector(expand_macros(circuit)).data
+
+
+def _check(sequence):
+    expected = _dense_statevector(sequence)
+    for fill_threshold in FILL_THRESHOLDS:
+        state = SparseStatevector.from_gate_sequence(NUM_QUBITS, sequence, fill_threshold=fill_threshold)
+        assert np.allclose(state.to_dense(), expected)
+
+
+@pytest.mark.parametrize('sequence', CASES)
+def test_matches_statevector(sequence):
+    _check(sequence)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_random_circuits_match_statevector(seed):
+    _check(_random_sequence(seed))
+
+
+def test_sample_counts():
+    ghz = SparseStatevector.from_gate_sequence(NUM_QUBITS, CASES[1])
+    counts = ghz.sample_counts(shots=1000, seed=1)
+    assert set(counts) == {'0000', '1111'} and counts.shots == 1000
+    # big-endian labels: q0 is the leftmost bit
+    assert SparseStatevector.from_gate_sequence(NUM_QUBITS, [('X', 0)]).sample_counts(10).to_dict() == {'1000': 10}
@@ -0,0 +1,81 @@
+"""
+test_trajectories.py
+The measurement history ensemble: measurements split branches, resets merge them back
+(to MERGE_DECIMALS), and teleportation gives the same counts as Aer shot by shot.
+"""
+
+import numpy as np
+
+from circuit_ir import CompactCircuit
+from gates import create_circuit
+from trajectories import TrajectoryEnsemble, run_trajectories, MERGE_DECIMALS
+from utils import get_measurement_counts
+
+
+
+
+SHOTS = 20000
+SEED = 11
+# both samplers are within a few standard deviations (~0.004 at SHOTS) of the exact values
+PROBABILITY_ATOL = 0.03
+
+# teleports H T H |0> from q0 to q2: P(q2 = 0) = cos^2(pi / 8)
+TELEPORT = [('H', 0), ('T', 0), ('H', 0), ('H', 1), ('CNOT', (1, 2)), ('CNOT', (0, 1)), ('H', 0),
+            ('Measure', 0), ('Measure', 1), ('CondX', (1, 2)), ('CondZ', (0, 2))]
+TELEPORTED_P0 = np.cos(np.pi / 8) ** 2
+
+
+
+
+
+def _ensemble(num_qubits, sequence, shots=SHOTS):
+    return TrajectoryEnsemble.from_circuit(CompactCircuit.from_gate_sequence(num_qubits, sequence),
+                                           shots=shots, seed=SEED)
+
+
+def test_measure_splits_branches():
+    ensemble = _ensemble(1, [('H', 0), ('Measure', 0)])
+    assert ensemble.num_branches == 2
+    assert ensemble.shots.sum() == SHOTS
+    for state, bit in zip(ensemble.states.T, ensemble.clbits):
+        # each branch is the projected, renormalized state of its outcome
+        assert np.allclose(np.abs(state), np.eye(2)[bit])
+
+    # a certain outcome keeps a single branch
+    assert _ensemble(2, [('X', 1), ('Measure', 0), ('Measure', 1)]).num_branches == 1
+
+
+def test_reset_merges_branches():
+    ensemble = _ensemble(2, [('H', 0), ('H', 1), ('Reset', 0)])
+    assert ensemble.num_branches == 1
+    assert ensemble.shots.tolist() == [SHOTS]
+    assert np.allclose(ensemble.states[:, 0], [np.sqrt(0.5), 0, np.sqrt(0.5), 0])
+
+    # the halves differ by a global phase of i
+    assert _ensemble(2, [('H', 0), ('S', 0), ('H', 1), ('Reset', 0)]).num_branches == 1
+
+    # an entangled partner keeps the two halves apart
+    assert _ensemble(2, [('H', 0), ('CNOT', (0, 1)), ('Reset', 0)]).num_branches == 2
+
+
+def test_merge_tolerance():
+    ensemble = TrajectoryEnsemble(1, shots=3)
+    below, above = 10.0 ** -(MERGE_DECIMALS + 2), 10.0 ** -(MERGE_DECIMALS - 2)
+    # the same state up to a global phase, then rounding noise, then a different state
+    ensemble.states = np.array([[1, 1j, 1 + below], [0, 0, above]], dtype=np.complex128)
+    ensemble.shots = np.array([1, 1, 1])
+    ensemble.clbits = np.zeros(3, dtype=np.int64)
+    ensemble._merge_identical()
+    assert sorted(ensemble.shots.tolist()) == [1, 2]
+
+
+def test_teleportation_matches_aer():
+    result = run_trajectories(CompactCircuit.from_gate_sequence(3, TELEPORT), shots=SHOTS, seed=SEED)
+    assert result['branches'] == 4
+    assert result['counts'].shots == SHOTS
+
+    aer = get_measurement_counts(create_circuit(3, TELEPORT), shots=SHOTS)
+    trajectories = result['counts'].to_dense() / SHOTS
+    assert np.abs(trajectories - aer.to_dense() / SHOTS).max() < PROBABILITY_ATOL
+    for counts in (result['counts'], aer):
+        assert abs(counts.marginal([2]).get('0', 0) / SHOTS - TELEPORTED_P0) < PROBABILITY_ATOL
@@ -0,0 +1,45 @@
+"""
+test_unitary.py
+Equivalence checks agree between the exact unitary method and the random states method,
+including macro gates whose kernels write into the state in place.
+"""
+
+import numpy as np
+import pytest
+
+from circuit_ir import CompactCircuit
+from unitary import apply_circuit, circuits_equivalent, random_states
+
+
+
+
+NUM_QUBITS = 3
+
+# (a, b, equivalent up to global phase)
+CASES = [
+    ([('QFT', (0, 2))], [], False),
+    ([('Diffuser', (0, 2))], [('QFT', (0, 2))], False),
+    ([('QFT', (0, 2)), ('IQFT', (0, 2))], [], True),
+    ([('MCZ', (0, 2))], [('H', 2), ('Toffoli', (0, 1, 2)), ('H', 2)], True),
+    ([('H', 0), ('QFT', (0, 2))], [('QFT', (0, 2)), ('H', 0)], False)
+]
+
+
+
+
+
+@pytest.mark.parametrize('a, b, expected', CASES)
+def test_random_states_matches_unitary(a, b, expected):
+    a = CompactCircuit.from_gate_sequence(NUM_QUBITS, a)
+    b = CompactCircuit.from_gate_sequence(NUM_QUBITS, b)
+    assert circuits_equivalent(a, b, method='unitary') is expected
+    assert circuits_equivalent(a, b, method='random_states', seed=7) is expected
+
+
+def test_apply_circuit_leaves_input_untouched():
+    states = random_states(NUM_QUBITS, seed=3)
+    before = states.copy()
+    circuit = CompactCircuit.from_gate_sequence(NUM_QUBITS, [('QFT', (0, 2))])
+    out = apply_circuit(circuit, states)
+    assert np.array_equal(states, before)
+    assert not np.shares_memory(out, states)
@@ -0,0 +1,183 @@
+"""
+trajectories.py
+Shot simulation of dynamic circuits (mid-circuit measurement, reset, classically
+conditioned gates) by measurement history instead of shot by shot.
+Shots that saw the same outcomes so far share one statevector: the ensemble is a
+(2^n, branches) array with the number of shots and the classical bits of every branch.
+Unitary stretches run on all branches at once, a measurement or reset splits each branch
+with one binomial draw per branch (vectorized over branches), and the final measurement of
+every qubit is one multinomial draw per branch. Teleportation or error correction rounds
+therefore cost a handful of branches, not thousands of shot-by-shot simulations.
+"""
+
+import numpy as np
+
+from circuit_ir import CompactCircuit, GATE_NAMES, GATE_ARITY, DYNAMIC_OPCODES
+from unitary import apply_circuit
+from counts import Counts, reverse_bits
+from precision import complex_dtype, DEFAULT_PRECISION
+from sparse_sim import MAX_DENSE_QUBITS
+
+
+
+
+# measurement outcomes at or below this probability are never drawn (rounding residue)
+OUTCOME_TOLERANCE = 1e-12
+# decimals two branch states have to agree to after a reset to be merged
+MERGE_DECIMALS = 6
+# gate applied to a branch whose classical bit is 1
+_CONDITIONED = {'CondX': 'X', 'CondZ': 'Z'}
+
+
+
+
+
+class TrajectoryEnsemble:
+    def __init__(self, num_qubits, shots=1024, seed=None, precision=DEFAULT_PRECISION):
+        if not 1 <= num_qubits <= MAX_DENSE_QUBITS:
+            raise ValueError(f"Trajectory simulation supports 1 to {MAX_DENSE_QUBITS} qubits, got {num_qubits}")
+        if shots < 1:
+            raise ValueError(f"shots must be positive, got {shots}")
+
+        self.num_qubits = num_qubits
+        self.dtype = complex_dtype(precision)
+        self.rng = np.random.default_rng(seed)
+        # one branch holding every shot in |0...0> (little-endian columns)
+        self.states = np.zeros((2 ** num_qubits, 1), dtype=self.dtype)
+        self.states[0, 0] = 1
+        self.shots = np.array([shots], dtype=np.int64)
+        # bit k of a branch's value is the latest measurement of qubit k
+        self.clbits = np.zeros(1, dtype=np.int64)
+
+    @classmethod
+    def from_circuit(cls, circuit_ir, shots=1024, seed=None, precision=DEFAULT_PRECISION):
+        ensemble = cls(circuit_ir.num_qubits, shots=shots, seed=seed, precision=precision)
+        ensemble.apply_circuit(circuit_ir)
+        return ensemble
+
+    @property
+    def num_branches(self):
+        return len(self.shots)
+
+    def apply_circuit(self, circuit_ir):
+        # unitary stretches between two dynamic operations run as one batched pass
+        gates = circuit_ir.gates
+        dynamic = np.flatnonzero(np.isin(gates['op'], DYNAMIC_OPCODES)).tolist()
+        start = 0
+        for position in dynamic + [len(gates)]:
+            if position > start:
+                self.apply_unitary(CompactCircuit(self.num_qubits, gates[start:position]))
+            if position < len(gates):
+                opcode, qubits = int(gates['op'][position]), gates['qubits'][position].tolist()
+                self.apply(GATE_NAMES[opcode], qubits[:GATE_ARITY[opcode]])
+            start = position + 1
+
+    def apply(self, gate_name, qubits):
+        if any(not 0 <= q < self.num_qubits for q in qubits):
+            raise ValueError(f"{gate_name} on {qubits} is out of range for {self.num_qubits} qubit(s)")
+        if gate_name == 'Measure':
+            self.measure(qubits[0])
+        elif gate_name == 'Reset':
+            self.measure(qubits[0], reset=True)
+        elif gate_name in _CONDITIONED:
+            bit, target = qubits
+            self.apply_conditioned(_CONDITIONED[gate_name], bit, target)
+        else:
+            self.apply_unitary(CompactCircuit.from_gate_sequence(self.num_qubits, [(gate_name, tuple(qubits))]))
+
+    def apply_unitary(self, circuit_ir, columns=slice(None)):
+        # the same gates on every selected branch, one tensor contraction per gate
+        states = self.states[:, columns]
+        tensor = states.reshape((2,) * self.num_qubits + (states.shape[1],))
+        evolved = apply_circuit(circuit_ir, tensor)
+        self.states[:, columns] = evolved.reshape(states.shape)
+
+    def apply_conditioned(self, gate_name, bit, target):
+        columns = np.flatnonzero((self.clbits >> bit) & 1)
+        if len(columns):
+            gate = CompactCircuit.from_gate_sequence(self.num_qubits, [(gate_name, target)])
+            self.apply_unitary(gate, columns)
+
+    def measure(self, qubit, reset=False):
+        # every branch splits into (up to) two: outcome 0 and outcome 1, each projected and
+        # renormalized and holding a binomial share of the branch's shots. a reset is a
+        # measurement whose outcome is flipped back to |0> and not recorded
+        num_branches = self.num_branches
+        view = self.states.reshape(2 ** (self.num_qubits - 1 - qubit), 2, 2 ** qubit, num_branches)
+        weights = (np.abs(view) ** 2).sum(axis=(0, 2), dtype=np.float64)
+        p1 = weights[1] / weights.sum(axis=0)
+        p1 = np.where(p1 <= OUTCOME_TOLERANCE, 0.0, np.where(p1 >= 1 - OUTCOME_TOLERANCE, 1.0, p1))
+
+        ones = self.rng.binomial(self.shots, p1)
+        outcome_shots = np.stack([self.shots - ones, ones])
+        outcome, branch = np.nonzero(outcome_shots)
+
+        split = view[..., branch]
+        split[:, 1, :, outcome == 0] = 0
+        split[:, 0, :, outcome == 1] = 0
+        split /= np.sqrt(weights[outcome, branch]).astype(split.real.dtype)
+        if reset:
+            flipped = outcome == 1
+            split[:, 0, :, flipped] = split[:, 1, :, flipped]
+            split[:, 1, :, flipped] = 0
+            self.clbits = self.clbits[branch]
+        else:
+            self.clbits = (self.clbits[branch] & ~(1 << qubit)) | (outcome.astype(np.int64) << qubit)
+
+        self.states = split.reshape(2 ** self.num_qubits, len(branch))
+        self.shots = outcome_shots[outcome, branch]
+        if reset:
+            self._merge_identical()
+
+    def _merge_identical(self):
+        # a reset does not record its outcome, so both halves of a branch keep the same
+        # classical bits and (unless the qubit was entangled) end up in the same state up to
+        # a global phase: those become one branch again. states are compared with the phase
+        # of their first clearly nonzero amplitude divided out
+        states = np.ascontiguousarray(self.states.T, dtype=np.complex128)
+        pivot = np.argmax(np.abs(states) > 10.0 ** -(MERGE_DECIMALS // 2), axis=1)
+        phases = states[np.arange(len(states)), pivot]
+        states *= (np.abs(phases) / phases)[:, None]
+        rounded = np.round(states.view(np.float64), MERGE_DECIMALS) + 0.0
+        keys = np.column_stack([self.clbits.astype(np.float64), rounded])
+        _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        if len(first) == self.num_branches:
+            return
+        self.shots = np.bincount(inverse.reshape(-1), weights=self.shots, minlength=len(first)).astype(np.int64)
+        self.states = self.states[:, first]
+        self.clbits = self.clbits[first]
+
+    # results
+    def sample_counts(self):
+        # big-endian counts of a final measurement of every qubit, one multinomial per branch
+        probabilities = np.abs(self.states.T).astype(np.float64) ** 2
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        draws = self.rng.multinomial(self.shots, probabilities).sum(axis=0)
+        hit = np.flatnonzero(draws)
+        return Counts(self.num_qubits, reverse_bits(hit, self.num_qubits), draws[hit])
+
+    def history_counts(self):
+        # shots per value of the classical bits, big-endian (bit 0 leftmost, like q0)
+        return Counts(self.num_qubits, reverse_bits(self.clbits, self.num_qubits), self.shots)
+
+    def most_likely_branch(self):
+        # (little-endian statevector, big-endian classical bits label) of the branch most shots took
+        branch = int(np.argmax(self.shots))
+        label = format(int(reverse_bits(self.clbits[branch], self.num_qubits)), f'0{self.num_qubits}b')
+        return self.states[:, branch].copy(), label
+
+
+
+
+
+def run_trajectories(circuit_ir, shots=1024, seed=None, precision=DEFAULT_PRECISION):
+    # statevector of the most common measurement history, final counts and history counts
+    ensemble = TrajectoryEnsemble.from_circuit(circuit_ir, shots=shots, seed=seed, precision=precision)
+    statevector, history = ensemble.most_likely_branch()
+    return {
+        'statevector': statevector,
+        'history': history,
+        'counts': ensemble.sample_counts(),
+        'histories': ensemble.history_counts(),
+        'branches': ensemble.num_branches
+    }
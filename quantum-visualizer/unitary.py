@@ -0,0 +1,191 @@
+"""
+unitary.py
+Unitary extraction and circuit equivalence checks.
+The 2^n x 2^n operator of a circuit is built by contracting each gate into the output
+legs of a tensor that starts as the identity, and cached per circuit fingerprint (in
+memory, and optionally in a ResultStore). Equivalence up to global phase is a single
+trace overlap of two unitaries, or for wider circuits a check on a batch of random
+states pushed through both circuits, which never builds the full matrix.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from circuit_ir import CompactCircuit, GATE_NAMES, GATE_ARITY
+from result_store import result_key
+from macros import apply_macro, MACRO_GATES
+from gates import DYNAMIC_GATES
+
+
+
+
+# 4^12 complex128 entries = 256 MiB
+MAX_UNITARY_QUBITS = 12
+# above this many qubits equivalence is checked on random states instead of unitaries
+EXACT_CHECK_MAX_QUBITS = 10
+DEFAULT_NUM_STATES = 8
+DEFAULT_ATOL = 1e-9
+UNITARY_CACHE_SIZE = 32
+
+_SQRT1_2 = 1 / np.sqrt(2)
+
+# gate matrices indexed by opcode, the first operand is the most significant bit
+_CNOT = np.eye(4, dtype=complex)[[0, 1, 3, 2]]
+_SWAP = np.eye(4, dtype=complex)[[0, 2, 1, 3]]
+_TOFFOLI = np.eye(8, dtype=complex)[[0, 1, 2, 3, 4, 5, 7, 6]]
+_MATRICES = {
+    'H': np.array([[1, 1], [1, -1]], dtype=complex) * _SQRT1_2,
+    'X': np.array([[0, 1], [1, 0]], dtype=complex),
+    'Y': np.array([[0, -1j], [1j, 0]], dtype=complex),
+    'Z': np.array([[1, 0], [0, -1]], dtype=complex),
+    'S': np.array([[1, 0], [0, 1j]], dtype=complex),
+    'T': np.array([[1, 0], [0, np.exp(1j * np.pi / 4)]], dtype=complex),
+    'CNOT': _CNOT,
+    'SWAP': _SWAP,
+    'Toffoli': _TOFFOLI
+}
+# reshaped to (2,) * 2k tensors: k output legs, then k input legs (macros run their own
+# kernel, measurements and resets have no matrix)
+_GATE_TENSORS = tuple(
+    None if name in MACRO_GATES or name in DYNAMIC_GATES
+    else _MATRICES[name].reshape((2,) * (2 * GATE_ARITY[opcode]))
+    for opcode, name in enumerate(GATE_NAMES)
+)
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+
+
+
+def _as_compact(circuit, num_qubits=None):
+    if isinstance(circuit, CompactCircuit):
+        return circuit
+    if num_qubits is None:
+        raise ValueError("num_qubits is required for a gate sequence")
+    return CompactCircuit.from_gate_sequence(num_qubits, circuit)
+
+
+def apply_circuit(circuit_ir, tensor):
+    # tensor has shape (2,) * n + (batch,), qubit q is axis n - 1 - q (qiskit's little-endian
+    # index order). each gate contracts its input legs with the tensor's legs for its qubits
+    num_qubits = circuit_ir.num_qubits
+    if circuit_ir.is_dynamic():
+        raise ValueError("Circuits with measurements, resets or conditioned gates are not unitary")
+    # macro kernels write in place: the caller's tensor is copied before the first one
+    owned = False
+    for opcode, qubits in zip(circuit_ir.gates['op'].tolist(), circuit_ir.gates['qubits'].tolist()):
+        arity = GATE_ARITY[opcode]
+        if _GATE_TENSORS[opcode] is None:
+            # macro kernels work on the flat (2^n, batch) view of the same tensor
+            if not owned:
+                tensor = np.array(tensor, order='C', copy=True)
+                owned = True
+            else:
+                tensor = np.ascontiguousarray(tensor)
+            apply_macro(tensor.reshape(2 ** num_qubits, -1), num_qubits, GATE_NAMES[opcode], qubits[:arity])
+            continue
+        axes = [num_qubits - 1 - q for q in qubits[:arity]]
+        contracted = np.tensordot(_GATE_TENSORS[opcode], tensor, axes=(list(range(arity, 2 * arity)), axes))
+        # tensordot puts the gate's output legs first, move them back to the qubits' axes
+        tensor = np.moveaxis(contracted, list(range(arity)), axes)
+    return tensor
+
+
+def compute_unitary(circuit_ir):
+    # uncached: little-endian 2^n x 2^n operator, same convention as qiskit's Operator
+    num_qubits = circuit_ir.num_qubits
+    if num_qubits > MAX_UNITARY_QUBITS:
+        raise ValueError(f"A {num_qubits}-qubit unitary would not fit in memory "
+                         f"(limit {MAX_UNITARY_QUBITS} qubits)")
+
+    dim = 2 ** num_qubits
+    identity = np.eye(dim, dtype=complex).reshape((2,) * num_qubits + (dim,))
+    return np.ascontiguousarray(apply_circuit(circuit_ir, identity).reshape(dim, dim))
+
+
+def get_unitary(circuit, num_qubits=None, store=None):
+    # cached unitary of a CompactCircuit (or gate sequence), computed once per fingerprint.
+    # the returned array is shared between callers and therefore read only
+    circuit_ir = _as_compact(circuit, num_qubits)
+    with _cache_lock:
+        unitary = _cache.get(circuit_ir)
+        if unitary is not None:
+            _cache.move_to_end(circuit_ir)
+            return unitary
+
+    key = result_key(circuit_ir.fingerprint, data='unitary')
+    unitary = store.get_array(key) if store is not None else None
+    if unitary is None:
+        unitary = compute_unitary(circuit_ir)
+        if store is not None:
+            store.put_array(key, unitary)
+    unitary.setflags(write=False)
+
+    with _cache_lock:
+        _cache[circuit_ir] = unitary
+        while len(_cache) > UNITARY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return unitary
+
+
+def big_endian_unitary(unitary, num_qubits):
+    # reorder rows and columns to the app's big-endian labels (q0 is the leftmost bit)
+    tensor = np.asarray(unitary).reshape((2,) * (2 * num_qubits))
+    order = list(range(num_qubits))[::-1]
+    return tensor.transpose(order + [num_qubits + a for a in order]).reshape(unitary.shape)
+
+
+
+
+
+def unitaries_equivalent(u, v, atol=DEFAULT_ATOL):
+    # U = e^{i phi} V  <=>  |tr(U^dagger V)| = dim, one pass over both matrices
+    u = np.asarray(u)
+    v = np.asarray(v)
+    if u.shape != v.shape:
+        return False
+    return bool(abs(abs(np.vdot(u, v)) / u.shape[0] - 1) <= atol)
+
+
+def random_states(num_qubits, num_states=DEFAULT_NUM_STATES, seed=None):
+    # (2,) * n + (num_states,) tensor of Haar random states (normalized complex gaussians)
+    rng = np.random.default_rng(seed)
+    shape = (2 ** num_qubits, num_states)
+    states = rng.standard_normal(shape) + 1j * rng.standard_normal(shape)
+    states /= np.linalg.norm(states, axis=0)
+    return states.reshape((2,) * num_qubits + (num_states,))
+
+
+def states_equivalent(a, b, num_states=DEFAULT_NUM_STATES, seed=None, atol=DEFAULT_ATOL):
+    # randomized check: equivalent circuits map every state to the same output up to one
+    # common phase. different circuits pass only with probability zero for random inputs
+    states = random_states(a.num_qubits, num_states, seed)
+    out_a = apply_circuit(a, states).reshape(-1, num_states)
+    out_b = apply_circuit(b, states).reshape(-1, num_states)
+
+    overlaps = np.einsum('ij,ij->j', out_a.conj(), out_b)
+    return bool(np.all(np.abs(np.abs(overlaps) - 1) <= atol)
+                and np.all(np.abs(overlaps - overlaps[0]) <= atol))
+
+
+def circuits_equivalent(a, b, num_qubits=None, method='automatic', num_states=DEFAULT_NUM_STATES,
+                        seed=None, atol=DEFAULT_ATOL, store=None):
+    # equivalence up to global phase; method is 'unitary', 'random_states' or 'automatic'
+    a = _as_compact(a, num_qubits)
+    b = _as_compact(b, num_qubits)
+    if a.num_qubits != b.num_qubits:
+        return False
+    if a == b:
+        return True
+
+    if method == 'automatic':
+        method = 'unitary' if a.num_qubits <= EXACT_CHECK_MAX_QUBITS else 'random_states'
+    if method == 'unitary':
+        return unitaries_equivalent(get_unitary(a, store=store), get_unitary(b, store=store), atol)
+    if method == 'random_states':
+        return states_equivalent(a, b, num_states, seed, atol)
+    raise ValueError(f"Unknown equivalence check method '{method}'")
@@ -3,13 +3,24 @@ utils.py
 Utility functions for quantum circuit simulation and result processing.
 Handles statevector extraction, probability calculations, and formatting.
 Includes conversion from Qiskit's little-endian to intuitive big-endian format.
+Simulations take a precision ('double' or 'single', see precision.py); the analysis
+routines keep the dtype of the amplitudes they are given.
 """
 
 import numpy as np
 from qiskit_aer import Aer
+from qiskit.quantum_info import Statevector
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from mpl_toolkits.mplot3d import Axes3D   # for lane 598
 
+from planner import plan_simulation, check_memory, density_matrix_bytes, DEFAULT_MEMORY_BUDGET
+from result_store import circuit_fingerprint, result_key
+from counts import Counts, reverse_bits
+from precision import as_precision, precision_of, zero_tolerance, DEFAULT_PRECISION
+from kernels import amplitude_probabilities, to_big_endian, resolve_layout, reduced_density_matrices
+from gates import expand_macros
+
 
 
 
@@ -30,19 +41,77 @@ def convert_probs_to_big_endian(probabilities):
 
 
 
-def run_circuit(circuit, shots=1024):
+def strip_save_instructions(circuit):
+    stripped = circuit.copy_empty_like()
+    for instruction in circuit.data:
+        if not instruction.operation.name.startswith('save_'):
+            stripped.append(instruction)
+    return stripped
+
+
+# aer methods run_circuit can save a state with, and the ones that can sample counts
+STATE_METHODS = ('statevector', 'matrix_product_state')
+COUNTS_METHODS = ('statevector', 'matrix_product_state', 'stabilizer')
+
+
+def resolve_simulation_method(circuit, method, needs=('state',), methods=STATE_METHODS, budget=None,
+                              precision=DEFAULT_PRECISION):
+    # 'automatic' -> cheapest method the planner finds (e.g. MPS for wide, low entanglement
+    # circuits). with a budget an explicit method is checked too and MemoryBudgetExceeded
+    # is raised before anything is allocated
+    if method != 'automatic' and budget is None:
+        return method
+    candidates = methods if method == 'automatic' else (method,)
+    return plan_simulation(circuit.num_qubits, circuit, budget=budget, needs=needs, methods=candidates,
+                           precision=precision)['method']
+
+
+
+
+
+def run_circuit(circuit, shots=1024, method='statevector', store=None, budget=None, precision=DEFAULT_PRECISION):
+    method = resolve_simulation_method(circuit, method, budget=budget, precision=precision)
+    
+    # statevectors from a persistent ResultStore skip the simulation entirely
+    store_key = None
+    if store is not None and method == 'statevector':
+        store_key = result_key(circuit_fingerprint(circuit), method=method, data='statevector',
+                               precision=precision)
+        cached = store.get_array(store_key)
+        if cached is not None:
+            return {
+                'statevector': _wrap_statevector(cached, precision),
+                'matrix_product_state': None,
+                'method': method,
+                'result': None
+            }
+    
+    if method == 'matrix_product_state':
+        # saving the statevector would materialize all 2^n amplitudes, keep the MPS instead
+        circuit = strip_save_instructions(circuit)
+        circuit.save_matrix_product_state()
+    
     # aer simulator backend (new api)
     backend = Aer.get_backend('aer_simulator')
     
-    # run the circuit (new api: backend.run() instead of execute())
-    job = backend.run(circuit, shots=shots)
+    # run the circuit (new api: backend.run() instead of execute()); aer only knows
+    # the primitive gates behind macro boxes
+    job = backend.run(expand_macros(circuit), shots=shots, method=method, precision=precision)
     
     #results
     result = job.result()
-    statevector = result.data()['statevector']
+    data = result.data()
+    
+    statevector = data.get('statevector')
+    if statevector is not None:
+        statevector = _wrap_statevector(statevector, precision)
+        if store_key is not None:
+            store.put_array(store_key, np.asarray(statevector))
     
     return {
         'statevector': statevector,
+        'matrix_product_state': data.get('matrix_product_state'),
+        'method': method,
         'result': result
     }
 
@@ -50,17 +119,41 @@ def run_circuit(circuit, shots=1024):
 
 
 
+def run_circuits(circuits, precision=DEFAULT_PRECISION):
+    # statevectors of several (small) circuits from a single aer job: one backend call and
+    # one result instead of a job per circuit. every circuit must save its statevector
+    if not circuits:
+        return []
+    backend = Aer.get_backend('aer_simulator')
+    result = backend.run([expand_macros(c) for c in circuits], shots=1, method='statevector',
+                         precision=precision).result()
+    return [_wrap_statevector(result.data(i)['statevector'], precision) for i in range(len(circuits))]
+
+
+
+
+
+def _wrap_statevector(data, precision):
+    # qiskit's Statevector always holds complex128, so single precision results stay
+    # plain complex64 arrays (everything downstream goes through np.asarray anyway)
+    if precision == 'double':
+        return data if isinstance(data, Statevector) else Statevector(data)
+    return as_precision(data, precision)
+
+
+
+
+
 def calculate_probabilities(statevector):
     probabilities = {}
     num_qubits = int(np.log2(len(statevector)))
     
-    for i, amplitude in enumerate(statevector):
+    # probability is magnitude squared of amplitude (computed for all states at once, threaded)
+    for i, probability in enumerate(amplitude_probabilities(statevector)):
         # convert index to binary string (basis state) - this is little endian from Qiskit
         basis_state_little_endian = format(i, f'0{num_qubits}b')
         # convert to big endian 
         basis_state_big_endian = reverse_bitstring(basis_state_little_endian)
-        # probability is magnitude squared of amplitude
-        probability = abs(amplitude) ** 2
         probabilities[basis_state_big_endian] = probability
     
     return probabilities
@@ -69,18 +162,25 @@ def calculate_probabilities(statevector):
 
 
 
-def format_statevector(statevector, threshold=1e-10):
+def _zero_threshold(sv, threshold):
+    # amplitudes at or below this are treated as zero; by default it follows the precision
+    return zero_tolerance(precision_of(sv)) if threshold is None else threshold
+
+
+def format_statevector(statevector, threshold=None):
     formatted = []
-    num_qubits = int(np.log2(len(statevector)))
-    
-    for i, amplitude in enumerate(statevector):
-        # only include non negligible amplitudes
-        if abs(amplitude) > threshold:
-            # qiskit uses little endian, convert to big endian
-            basis_state_little_endian = format(i, f'0{num_qubits}b')
-            basis_state_big_endian = reverse_bitstring(basis_state_little_endian)
-            probability = abs(amplitude) ** 2
-            formatted.append((basis_state_big_endian, amplitude, probability))
+    sv = np.asarray(statevector)
+    num_qubits = int(np.log2(len(sv)))
+    threshold = _zero_threshold(sv, threshold)
+    
+    # only include non negligible amplitudes (found vectorized, no per amplitude python work)
+    for i in np.flatnonzero(np.abs(sv) > threshold):
+        amplitude = sv[i]
+        # qiskit uses little endian, convert to big endian
+        basis_state_little_endian = format(i, f'0{num_qubits}b')
+        basis_state_big_endian = reverse_bitstring(basis_state_little_endian)
+        probability = abs(amplitude) ** 2
+        formatted.append((basis_state_big_endian, amplitude, probability))
     
     return formatted
 
@@ -88,20 +188,156 @@ def format_statevector(statevector, threshold=1e-10):
 
 
 
-def get_measurement_counts(circuit, shots=1024):
-    measured_circuit = circuit.copy()
+def top_k_amplitudes(statevector, k=32, threshold=None):
+    # the k most likely basis states as (big endian label, amplitude, probability),
+    # most likely first. O(2^n) vectorized work plus O(k log k) for the sort
+    sv = np.asarray(statevector)
+    threshold = _zero_threshold(sv, threshold)
+    num_qubits = int(np.log2(len(sv)))
+    probabilities = amplitude_probabilities(sv)
+    
+    if k < len(sv):
+        candidates = np.argpartition(probabilities, -k)[-k:]
+    else:
+        candidates = np.arange(len(sv))
+    candidates = candidates[np.argsort(probabilities[candidates])[::-1]]
+    candidates = candidates[np.abs(sv[candidates]) > threshold]
+    
+    return [
+        (reverse_bitstring(format(i, f'0{num_qubits}b')), sv[i], probabilities[i])
+        for i in candidates
+    ]
+
+
+def count_nonzero_amplitudes(statevector, threshold=None):
+    sv = np.asarray(statevector)
+    return int(np.count_nonzero(np.abs(sv) > _zero_threshold(sv, threshold)))
+
+
+def iter_statevector_chunks(statevector, chunk_size=256):
+    # pages of the statevector in big endian basis order, for paginated tables.
+    # yields (labels, amplitudes, probabilities); only one page of labels exists at a time
+    sv = np.asarray(statevector)
+    num_qubits = int(np.log2(len(sv)))
+    
+    for start in range(0, len(sv), chunk_size):
+        big_endian_indices = np.arange(start, min(start + chunk_size, len(sv)))
+        amplitudes = sv[reverse_bits(big_endian_indices, num_qubits)]
+        labels = [format(i, f'0{num_qubits}b') for i in big_endian_indices]
+        yield labels, amplitudes, np.abs(amplitudes) ** 2
+
+
+
+
+
+def get_measurement_counts(circuit, shots=1024, method='statevector', store=None, budget=None,
+                           precision=DEFAULT_PRECISION):
+    method = resolve_simulation_method(circuit, method, needs=('counts',), methods=COUNTS_METHODS,
+                                       budget=budget, precision=precision)
+    
+    store_key = None
+    if store is not None:
+        store_key = result_key(circuit_fingerprint(circuit), method=method, shots=shots, data='counts',
+                               precision=precision)
+        cached = store.get_counts(store_key)
+        if cached is not None:
+            return cached
+    
+    # the counts never need the saved state, and with MPS saving it would be dense
+    measured_circuit = expand_macros(strip_save_instructions(circuit))
+    # mid-circuit measurements already fill the first clbits, measure_all appends its own
+    mid_circuit_bits = measured_circuit.num_clbits
     measured_circuit.measure_all()
     
-    # run on simulator
+    # run on simulator (MPS samples straight from the tensors)
     backend = Aer.get_backend('aer_simulator')
-    job = backend.run(measured_circuit, shots=shots)
+    job = backend.run(measured_circuit, shots=shots, method=method, precision=precision)
     result = job.result()
     
-    # counts (these are in little endian format from Qiskit)
-    counts_little_endian = result.get_counts()
-    counts_big_endian = convert_counts_to_big_endian(counts_little_endian)
+    # raw counts are keyed by little-endian indices (hex), turned into big-endian
+    # index arrays in one vectorized step instead of reversing every bitstring
+    counts = Counts.from_qiskit(result.data()['counts'], measured_circuit.num_clbits)
+    if mid_circuit_bits:
+        counts = counts.marginal(range(mid_circuit_bits, measured_circuit.num_clbits))
     
-    return counts_big_endian
+    if store_key is not None:
+        store.put_counts(store_key, counts)
+    
+    return counts
+
+
+
+
+
+# basis change applied before a Z measurement: H for X, H S^dagger for Y
+_BASIS_CHANGE = {
+    'X': np.array([[1, 1], [1, -1]], dtype=complex) / np.sqrt(2),
+    'Y': np.array([[1, -1j], [1, 1j]], dtype=complex) / np.sqrt(2)
+}
+
+
+def rotate_to_measurement_basis(statevector, bases):
+    # bases is one of X/Y/Z per qubit, q0 first (e.g. 'XZY'); only the rotated
+    # qubits are touched, each as a 2x2 contraction on its axis of the (2,)*n view
+    sv = np.asarray(statevector)
+    num_qubits = int(np.log2(len(sv)))
+    bases = bases.upper()
+    if len(bases) != num_qubits or set(bases) - set('XYZ'):
+        raise ValueError(f"'{bases}' is not one of X/Y/Z for each of {num_qubits} qubit(s)")
+    
+    tensor = sv.reshape((2,) * num_qubits)
+    dtype = np.result_type(sv, np.complex64)  # complex64 stays complex64
+    for qubit, basis in enumerate(bases):
+        if basis == 'Z':
+            continue
+        axis = num_qubits - 1 - qubit  # little endian: qubit 0 is the last axis
+        rotation = _BASIS_CHANGE[basis].astype(dtype, copy=False)
+        tensor = np.moveaxis(np.tensordot(rotation, tensor, axes=([1], [axis])), 0, axis)
+    return tensor.reshape(-1)
+
+
+def sample_basis_counts(statevector, bases, shots=1024, seed=None):
+    # big-endian counts for a measurement in the given bases, sampled from the existing
+    # state (no new simulation). outcome 0/1 is +/- for X, +i/-i for Y
+    # float64 so the normalized probabilities sum to 1 within multinomial's tolerance
+    probabilities = np.abs(rotate_to_measurement_basis(statevector, bases)).astype(np.float64) ** 2
+    draws = np.random.default_rng(seed).multinomial(shots, probabilities / probabilities.sum())
+    hit = np.flatnonzero(draws)
+    num_qubits = len(bases)
+    return Counts(num_qubits, reverse_bits(hit, num_qubits), draws[hit])
+
+
+# progressive sampling: size of the first batch and the factor each next batch grows by
+PROGRESSIVE_FIRST_BATCH = 100
+PROGRESSIVE_GROWTH = 2
+
+
+def progressive_batches(shots, first_batch=PROGRESSIVE_FIRST_BATCH, growth=PROGRESSIVE_GROWTH):
+    # geometrically growing batch sizes summing to shots (100, 200, 400, ... for the defaults)
+    batch = max(int(first_batch), 1)
+    while shots > 0:
+        batch = min(batch, shots)
+        yield batch
+        shots -= batch
+        batch *= growth
+
+
+def iter_basis_counts(statevector, bases, shots=1024, first_batch=PROGRESSIVE_FIRST_BATCH,
+                      growth=PROGRESSIVE_GROWTH, seed=None):
+    # cumulative big-endian Counts after each of progressive_batches(shots), for histograms
+    # that converge while the user watches. the distribution is inverted once (cumsum), then
+    # each batch is a searchsorted of uniform draws, so small batches stay cheap on wide states
+    probabilities = np.abs(rotate_to_measurement_basis(statevector, bases)).astype(np.float64) ** 2
+    cdf = np.cumsum(probabilities)
+    cdf /= cdf[-1]
+    rng = np.random.default_rng(seed)
+    num_qubits = len(bases)
+    counts = Counts(num_qubits)
+    for batch in progressive_batches(shots, first_batch, growth):
+        # side='right' never picks an index whose probability is zero
+        hit = np.minimum(np.searchsorted(cdf, rng.random(batch), side='right'), len(cdf) - 1)
+        counts = counts + Counts.from_samples(num_qubits, reverse_bits(hit, num_qubits))
+        yield counts
 
 
 
@@ -128,7 +364,8 @@ def format_complex_number(complex_num):
 
 
 def normalize_counts(counts, shots):
-    return {state: count / shots for state, count in counts.items()}
+    counts = Counts.from_dict(counts)
+    return dict(zip(counts.labels(), (counts.counts / shots).tolist()))
 
 
 
@@ -153,8 +390,12 @@ def get_circuit_stats(circuit):
 
 
 
-def statevector_to_density_matrix(statevector):
-    sv = np.array(statevector).reshape(-1, 1)
+def statevector_to_density_matrix(statevector, budget=None):
+    # same precision as the statevector. pass a budget (bytes) to refuse matrices that would not fit
+    sv = np.asarray(statevector).reshape(-1, 1)
+    if budget is not None:
+        check_memory(density_matrix_bytes(int(np.log2(len(sv))), precision_of(sv)), budget,
+                     "The full density matrix")
     return sv @ sv.conj().T
 
 
@@ -162,45 +403,24 @@ def statevector_to_density_matrix(statevector):
 
 
 def partial_trace(density_matrix, keep_qubit, num_qubits):
-    dim = 2 ** num_qubits
-    
-    # reshape density matrix for partial trace
-    # we need to trace out all qubits except the one we want to keep
-    reduced_dm = np.zeros((2, 2), dtype=complex)
-    
-    for i in range(dim):
-        for j in range(dim):
-            # extract bit values for each qubit
-            bits_i = [(i >> q) & 1 for q in range(num_qubits)]
-            bits_j = [(j >> q) & 1 for q in range(num_qubits)]
-            
-            # check if all qubits except keep_qubit match
-            trace_match = all(
-                bits_i[q] == bits_j[q] 
-                for q in range(num_qubits) 
-                if q != keep_qubit
-            )
-            
-            if trace_match:
-                reduced_dm[bits_i[keep_qubit], bits_j[keep_qubit]] += density_matrix[i, j]
-    
-    return reduced_dm
+    # view the matrix as a tensor with one row and one column axis per qubit (qubit q is
+    # axis num_qubits - 1 - q, little endian), move the kept pair to the front and trace
+    # out the rest in one call instead of looping over all 4^n entries
+    dtype = np.result_type(density_matrix, np.complex64)
+    tensor = np.asarray(density_matrix).reshape((2,) * (2 * num_qubits))
+    axis = num_qubits - 1 - keep_qubit
+    tensor = np.moveaxis(tensor, (axis, num_qubits + axis), (0, 1))
+    rest = 2 ** (num_qubits - 1)
+    return np.trace(tensor.reshape(2, 2, rest, rest), axis1=2, axis2=3).astype(dtype, copy=False)
 
 
 
 
 
 def get_single_qubit_density_matrices(statevector, num_qubits):
-    # convert stqtevector to full density matrix
-    full_dm = statevector_to_density_matrix(statevector)
-    
-    # reduced density matrix for each qubit
-    reduced_dms = []
-    for qubit_idx in range(num_qubits):
-        reduced_dm = partial_trace(full_dm, qubit_idx, num_qubits)
-        reduced_dms.append(reduced_dm)
-    
-    return reduced_dms
+    # reduced density matrix for each qubit, straight from the statevector in threaded
+    # blocks. the full density matrix is never built, so no memory budget applies
+    return list(reduced_density_matrices(statevector, num_qubits))
 
 
 
@@ -575,17 +795,14 @@ def plot_bloch_sphere_plotly(bloch_vector, title="Bloch Sphere"):
     # return fig
 
 
-def reorder_statevector_to_big_endian(statevector, num_qubits):
-    dim = 2 ** num_qubits
-    reordered = np.zeros(dim, dtype=complex)
-    
-    for i in range(dim):
-        bits_little = format(i, f'0{num_qubits}b')
-        bits_big = bits_little[::-1]
-        j = int(bits_big, 2)
-        reordered[j] = statevector[i]
-    
-    return reordered
+def reorder_statevector_to_big_endian(statevector, num_qubits, layout=None):
+    # vectorized bit reversal permutation, gathered in parallel blocks. a state simulated
+    # with lazy SWAPs passes its layout, which is folded into the same single permutation
+    sv = np.asarray(statevector)
+    sv = sv.astype(np.result_type(sv, np.complex64), copy=False)
+    if layout is not None:
+        return resolve_layout(sv, layout, big_endian=True)
+    return to_big_endian(sv, num_qubits)
 
 
 
@@ -600,7 +817,8 @@ def plot_state_city_big_endian(statevector, num_qubits, title="State City"):
     
     real_parts = np.real(sv_big_endian)
     imag_parts = np.imag(sv_big_endian)
-    fig = plt.figure(figsize=(14, 7))
+    # object oriented Figure (not pyplot) so it can be built off the script thread
+    fig = Figure(figsize=(14, 7))
     labels = [format(i, f'0{num_qubits}b') for i in range(dim)]
     
     x_pos = np.arange(dim)
@@ -651,6 +869,196 @@ def plot_state_city_big_endian(statevector, num_qubits, title="State City"):
     ]
     ax.legend(handles=legend_elements, loc='upper right', fontsize=9)
     
-    plt.tight_layout()
+    fig.tight_layout()
+    
+    return fig
+
+
+
+
+
+def _bar_mesh(x_centers, y_start, heights, width, depth):
+    # vertices and triangles of one box per bar, built as flat arrays for a single Mesh3d
+    num_bars = len(x_centers)
+    x0 = np.asarray(x_centers, dtype=float) - width / 2
+    x1 = x0 + width
+    y0 = np.full(num_bars, float(y_start))
+    y1 = y0 + depth
+    z0 = np.zeros(num_bars)
+    z1 = np.asarray(heights, dtype=float)
+
+    # corner order: bottom face (0-3) then top face (4-7)
+    xs = np.stack([x0, x1, x1, x0, x0, x1, x1, x0], axis=1).ravel()
+    ys = np.stack([y0, y0, y1, y1, y0, y0, y1, y1], axis=1).ravel()
+    zs = np.stack([z0, z0, z0, z0, z1, z1, z1, z1], axis=1).ravel()
+
+    # 12 triangles per box (two per face)
+    faces = np.array([
+        [0, 1, 2], [0, 2, 3],  # bottom
+        [4, 5, 6], [4, 6, 7],  # top
+        [0, 1, 5], [0, 5, 4],  # front
+        [3, 2, 6], [3, 6, 7],  # back
+        [0, 3, 7], [0, 7, 4],  # left
+        [1, 2, 6], [1, 6, 5]   # right
+    ])
+    offsets = (np.arange(num_bars) * 8)[:, None, None]
+    triangles = (faces[None, :, :] + offsets).reshape(-1, 3)
+
+    return xs, ys, zs, triangles[:, 0], triangles[:, 1], triangles[:, 2]
+
+
+def _basis_labels(indices, num_qubits):
+    return [format(int(i), f'0{num_qubits}b') for i in indices]
+
+
+
+
+# ====================================================================================================================================================================
+def plot_state_city_plotly(statevector, num_qubits, title="State City", max_states=64, threshold=None):
+    import plotly.graph_objects as go
+    
+    sv_big_endian = reorder_statevector_to_big_endian(statevector, num_qubits)
+    threshold = _zero_threshold(sv_big_endian, threshold)
+    dim = 2 ** num_qubits
+    
+    # every basis state gets a spot on the axis; above max_states only the max_states
+    # largest nonzero amplitudes are kept (decimation)
+    magnitudes = np.abs(sv_big_endian)
+    indices = np.arange(dim)
+    num_nonzero = None
+    if dim > max_states:
+        indices = np.flatnonzero(magnitudes > threshold)
+        num_nonzero = len(indices)
+        if num_nonzero > max_states:
+            top = np.argpartition(magnitudes[indices], -max_states)[-max_states:]
+            indices = np.sort(indices[top])
+    
+    real_parts = np.real(sv_big_endian[indices])
+    imag_parts = np.imag(sv_big_endian[indices])
+    x_pos = np.arange(len(indices))
+    width = 0.35
+    
+    fig = go.Figure()
+    
+    # one mesh per component and sign instead of one object per bar
+    groups = [
+        ('Real (positive)', 'red', 0, real_parts, real_parts > threshold),
+        ('Real (negative)', 'darkred', 0, real_parts, real_parts < -threshold),
+        ('Imaginary (positive)', 'blue', 1, imag_parts, imag_parts > threshold),
+        ('Imaginary (negative)', 'darkblue', 1, imag_parts, imag_parts < -threshold)
+    ]
+    for name, color, y_start, values, mask in groups:
+        if not np.any(mask):
+            continue
+        xs, ys, zs, i, j, k = _bar_mesh(x_pos[mask], y_start, values[mask], width, 0.5)
+        fig.add_trace(go.Mesh3d(
+            x=xs, y=ys, z=zs, i=i, j=j, k=k,
+            color=color,
+            opacity=0.8,
+            flatshading=True,
+            name=name,
+            showlegend=True,
+            hoverinfo='name+z'
+        ))
+    
+    if num_nonzero is not None and len(indices) < num_nonzero:
+        title = f"{title} (largest {len(indices)} of {num_nonzero} nonzero states)"
+    
+    fig.update_layout(
+        title=dict(text=title, font=dict(size=18)),
+        scene=dict(
+            xaxis=dict(
+                title='Basis State (Big-Endian)',
+                tickvals=x_pos,
+                ticktext=_basis_labels(indices, num_qubits)
+            ),
+            yaxis=dict(title='Component', tickvals=[0.25, 1.25], ticktext=['Real', 'Imag'],
+                       range=[-0.25, 1.75]),
+            zaxis=dict(title='Amplitude'),
+            camera=dict(eye=dict(x=1.5, y=-1.5, z=1.0))
+        ),
+        legend=dict(x=0.8, y=0.9),
+        height=600,
+        margin=dict(l=0, r=0, t=40, b=0)
+    )
+    
+    return fig
+
+
+
+
+# ====================================================================================================================================================================
+def plot_histogram_plotly(counts, title="Measurement Results", max_states=64, color='#6366f1',
+                          error_bars=False):
+    import plotly.graph_objects as go
+    
+    counts = Counts.from_dict(counts)
+    
+    # decimation: keep the most frequent outcomes, everything else goes into one 'rest' bar
+    top = counts.top_k(max_states)
+    rest = counts.shots - top.shots
+    
+    # big-endian index order is label order, like qiskit's plot_histogram
+    labels = list(top.labels())
+    values = top.counts
+    if rest:
+        labels.append('rest')
+        values = np.append(values, rest)
+    
+    total = max(int(values.sum()), 1)
+    # one standard error of each count, sqrt(N p (1 - p)), shrinks like 1/sqrt(N) relative to it
+    error_y = None
+    if error_bars:
+        frequencies = values / total
+        error_y = dict(type='data', array=np.sqrt(total * frequencies * (1 - frequencies)), visible=True)
+    fig = go.Figure(go.Bar(
+        x=labels,
+        y=values,
+        marker_color=color,
+        error_y=error_y,
+        text=np.round(values / total, 3),
+        textposition='outside',
+        hovertemplate='%{x}: %{y}<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title=dict(text=title, font=dict(size=18)),
+        xaxis=dict(title='Basis State (Big-Endian)', type='category', tickangle=-45),
+        yaxis=dict(title='Count'),
+        height=500,
+        margin=dict(l=0, r=0, t=40, b=0)
+    )
+    
+    return fig
+
+
+
+
+
+def plot_correlation_heatmap_plotly(correlations, title="Pauli Correlations", pauli='Z'):
+    import plotly.graph_objects as go
+    
+    correlations = np.asarray(correlations)
+    labels = [f"q{i}" for i in range(len(correlations))]
+    
+    fig = go.Figure(go.Heatmap(
+        z=correlations,
+        x=labels,
+        y=labels,
+        zmin=-1,
+        zmax=1,
+        colorscale='RdBu',
+        reversescale=True,
+        text=np.round(correlations, 3),
+        texttemplate='%{text}',
+        hovertemplate=f'⟨{pauli}_%{{y}} {pauli}_%{{x}}⟩ = %{{z:.4f}}<extra></extra>'
+    ))
+    
+    fig.update_layout(
+        title=dict(text=title, font=dict(size=18)),
+        yaxis=dict(autorange='reversed', scaleanchor='x'),
+        height=450,
+        margin=dict(l=0, r=0, t=40, b=0)
+    )
     
     return fig